@@ -0,0 +1,132 @@
+"""Load test of concurrent update processing and of the order of each user's updates.
+
+Many users each press "search again" and immediately type a search term, a
+few times over, against a fake Bot API that takes a while to answer. The same
+stream of updates is handled one update at a time, concurrently with no
+ordering, and concurrently one at a time per user and chat, the bot's default.
+
+Reports the throughput of each mode and the users whose replies show their
+updates raced: a typed term handled before the button press that set the
+search, finding the wrong kind of entity or falling back to the main menu.
+
+Run from the repository root: ``python -m benchmarks.bench_concurrency``.
+"""
+import argparse
+import asyncio
+import logging
+import time
+import warnings
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from telegram.warnings import PTBUserWarning
+
+from config.settings import CONCURRENT_UPDATES
+from src.bot.application import create_application
+from src.bot.callback_data import SPELL, RULE, POWER, decode_entity
+from src.bot.update_processor import KeyedUpdateProcessor
+from .fake_bot_api import FakeBotAPI, RecordingRequest, callback_update, message_update
+
+# The searches the users alternate between: search state, entity kind of the results and a term
+SEARCHES = (
+    ("searching_spells", SPELL, "bola"),
+    ("searching_rules", RULE, "ataque"),
+    ("searching_powers_combate", POWER, "ataque"),
+)
+KINDS_BY_STATE = {state: kind for state, kind, _ in SEARCHES}
+
+class UnorderedUpdateProcessor(KeyedUpdateProcessor):
+    """The same limits without the per-user and per-chat locks."""
+
+    @staticmethod
+    def get_keys(update: object) -> List[int]:
+        return []
+
+def build_updates(users: int, rounds: int) -> Tuple[List[Dict[str, Any]], Dict[int, List[str]]]:
+    """Get the updates, every user's rounds interleaved with the others', and the kinds each user should get."""
+    updates = []
+    expected: Dict[int, List[str]] = {}
+    for round_number in range(rounds):
+        for user in range(users):
+            chat_id = 100000 + user
+            state, kind, term = SEARCHES[(user + round_number) % len(SEARCHES)]
+            updates.append(callback_update(chat_id, f"search_again_{state}"))
+            updates.append(message_update(chat_id, term))
+            expected.setdefault(chat_id, []).append(kind)
+    return [dict(update, update_id=update_id) for update_id, update in enumerate(updates)], expected
+
+def classify_reply(reply_markup: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Get the entity kind a search reply is about, "menu" for the main menu, or None for a prompt."""
+    for row in (reply_markup or {}).get("inline_keyboard", []):
+        for button in row:
+            data = button.get("callback_data", "")
+            entity = decode_entity(data)
+            if entity is not None:
+                return entity[0]
+            if data.startswith("search_again_"):
+                return KINDS_BY_STATE.get(data[len("search_again_"):])
+            if data == "magias_menu":
+                return "menu"
+    return None
+
+def count_raced_users(api: FakeBotAPI, expected: Dict[int, List[str]]) -> int:
+    """Count the users whose search replies, in the order they were sent, don't match their searches."""
+    observed: Dict[int, List[str]] = {chat_id: [] for chat_id in expected}
+    for call in api.calls:
+        if call.method == "sendMessage":
+            kind = classify_reply(call.params.get("reply_markup"))
+            if kind is not None:
+                observed[call.params["chat_id"]].append(kind)
+    return sum(1 for chat_id, kinds in expected.items() if observed[chat_id] != kinds)
+
+async def run_mode(concurrent_updates: Union[int, BaseUpdateProcessor], updates: List[Dict[str, Any]],
+                   expected: Dict[int, List[str]], latency: float) -> Tuple[float, int]:
+    """Handle the updates through the update queue, returning the seconds it took and the raced users."""
+    api = FakeBotAPI(latency=latency)
+    application = create_application(token=api.token, hot_reload=False, request=RecordingRequest(api),
+                                      persist_state=False, rate_limit=False, edit_in_place=False,
+                                      concurrent_updates=concurrent_updates)
+    await application.initialize()
+    await application.start()
+    start = time.perf_counter()
+    for update in updates:
+        await application.update_queue.put(Update.de_json(update, application.bot))
+    # Stopping handles every queued update first, and post_stop waits for the ones still running
+    await application.stop()
+    await application.post_stop(application)
+    elapsed = time.perf_counter() - start
+    await application.shutdown()
+    return elapsed, count_raced_users(api, expected)
+
+async def run(users: int, rounds: int, latency: float, concurrency: int) -> List[str]:
+    updates, expected = build_updates(users, rounds)
+    modes = (
+        ("sequential", 1),
+        ("concurrent, unordered", UnorderedUpdateProcessor(concurrency)),
+        ("concurrent, per user", KeyedUpdateProcessor(concurrency)),
+    )
+    lines = [f"{len(updates)} updates from {users} users, Bot API latency {latency * 1000:.0f} ms, "
+             f"up to {concurrency} updates at once"]
+    for name, concurrent_updates in modes:
+        elapsed, raced = await run_mode(concurrent_updates, updates, expected, latency)
+        lines.append(f"  {name:22} {len(updates) / elapsed:8.0f} updates/s, {raced:4} of {users} users raced")
+    return lines
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per Bot API call")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENT_UPDATES)
+    args = parser.parse_args()
+
+    # The raced updates of the unordered mode fail in the handlers, which is what this test shows
+    logging.disable(logging.CRITICAL)
+    # Stopping with updates still queued, on purpose
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    for line in asyncio.run(run(args.users, args.rounds, args.latency, args.concurrency)):
+        print(line)
+
+if __name__ == "__main__":
+    main()
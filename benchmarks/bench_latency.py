@@ -0,0 +1,118 @@
+"""Measure update-to-reply latency in polling and webhook mode against the fake Bot API.
+
+Virtual users walk through the menus, a search and a detail view. The latency
+of an update is the time from handing it to the fake Bot API until the bot
+sends or edits the reply, so it includes getUpdates long polling or the webhook
+request, the handler and the reply request.
+
+Run from the repository root with ``python -m benchmarks.bench_latency``.
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from src.bot.application import create_application
+from src.bot.callback_data import decode_entity
+from .fake_bot_api import FakeBotAPI, message_update, callback_update
+
+WEBHOOK_SECRET_TOKEN = "benchmark-secret"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def user_session() -> List[Callable[[FakeBotAPI, int], Dict]]:
+    """The updates one virtual user sends, each built from the bot's last message in the chat."""
+    def text(value: str) -> Callable[[FakeBotAPI, int], Dict]:
+        return lambda api, chat_id: message_update(chat_id, value)
+
+    def press(data: str) -> Callable[[FakeBotAPI, int], Dict]:
+        return lambda api, chat_id: callback_update(chat_id, data, api.last_message(chat_id))
+
+    def press_first_entity(api: FakeBotAPI, chat_id: int) -> Dict:
+        # Entity ids come from the data, so open the first spell or power the last message lists
+        message = api.last_message(chat_id)
+        buttons = [button for row in message["reply_markup"]["inline_keyboard"] for button in row]
+        data = next(button["callback_data"] for button in buttons if decode_entity(button["callback_data"]))
+        return callback_update(chat_id, data, message)
+
+    return [
+        text("/start"),
+        press("magias_menu"),
+        press("search_spells"),
+        text("bola"),
+        press_first_entity,
+        press("back_to_main"),
+        press("poderes_menu"),
+        press("powers_combate"),
+        press_first_entity,
+    ]
+
+async def _run_user(api: FakeBotAPI, chat_id: int, rounds: int, latencies: List[float]) -> None:
+    for _ in range(rounds):
+        for build_update in user_session():
+            reply = api.wait_for_reply(chat_id)
+            start = time.perf_counter()
+            await api.push_update(build_update(api, chat_id))
+            await asyncio.wait_for(reply, 10)
+            latencies.append(time.perf_counter() - start)
+
+async def measure(mode: str, users: int, rounds: int) -> List[str]:
+    """Run the virtual users against the bot in one mode and return the report lines."""
+    api = FakeBotAPI()
+    await api.start()
+    application = create_application(token=api.token, base_url=api.base_url, hot_reload=False, persist_state=False,
+                                     rate_limit=False)
+    await application.initialize()
+    if mode == "webhook":
+        port = _free_port()
+        await application.updater.start_webhook(
+            listen="127.0.0.1",
+            port=port,
+            url_path="telegram",
+            webhook_url=f"http://127.0.0.1:{port}/telegram",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+        )
+    else:
+        await application.updater.start_polling(poll_interval=0, timeout=10)
+    await application.start()
+
+    latencies: List[float] = []
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(_run_user(api, 1000 + user, rounds, latencies) for user in range(users)))
+    finally:
+        elapsed = time.perf_counter() - start
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await api.stop()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return [
+        f"{mode:>8}: {len(latencies)} updates, {len(latencies) / elapsed:7.1f} updates/s, "
+        f"p50 {statistics.median(latencies) * 1000:6.2f} ms, p95 {p95 * 1000:6.2f} ms, "
+        f"max {latencies[-1] * 1000:6.2f} ms"
+    ]
+
+def run(users: int = 10, rounds: int = 5) -> List[str]:
+    """Measure both modes and return the report lines."""
+    logging.disable(logging.WARNING)
+    lines = []
+    for mode in ("polling", "webhook"):
+        lines.extend(asyncio.run(measure(mode, users, rounds)))
+    return lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    for line in run(args.users, args.rounds):
+        print(line)
@@ -0,0 +1,64 @@
+"""Report the memory footprint of each repository with tracemalloc.
+
+For every repository, reports the memory it keeps once built from the JSON
+files, once loaded from a pickle as the snapshot is, and the part of the
+latter taken by the model objects alone: the spells, rules and powers with
+the strings and enhancements they hold.
+
+Run from the repository root: ``python -m benchmarks.bench_memory``.
+"""
+import argparse
+import gc
+import logging
+import pickle
+import tracemalloc
+from typing import Any, Callable, List
+
+from config.settings import SPELLS_FILE, RULES_FILE
+from src.data.data_loader import load_json_data, POWER_FILES
+from src.data.repositories import SpellRepository, RuleRepository, PowerRepository
+
+def retained(function: Callable[[], Any]) -> int:
+    """Get the bytes still allocated by a call once everything but its result is freed."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+def _load_powers() -> PowerRepository:
+    return PowerRepository(*(load_json_data(file_path) for file_path in POWER_FILES))
+
+def run() -> List[str]:
+    builders = (
+        ("spells", lambda: SpellRepository(load_json_data(SPELLS_FILE)), lambda repo: repo.get_all()),
+        ("rules", lambda: RuleRepository(load_json_data(RULES_FILE)), lambda repo: repo.get_all()),
+        ("powers", _load_powers, lambda repo: repo.powers),
+    )
+    lines = [f"{'':10}{'entities':>10}{'from JSON':>12}{'snapshot':>12}{'models':>12}"]
+    totals = [0, 0, 0]
+    for name, build, get_entities in builders:
+        repository = build()
+        entities = get_entities(repository)
+        repository_pickle = pickle.dumps(repository, protocol=pickle.HIGHEST_PROTOCOL)
+        entities_pickle = pickle.dumps(entities, protocol=pickle.HIGHEST_PROTOCOL)
+        sizes = (retained(build), retained(lambda: pickle.loads(repository_pickle)),
+                 retained(lambda: pickle.loads(entities_pickle)))
+        totals = [total + size for total, size in zip(totals, sizes)]
+        lines.append(f"{name:10}{len(entities):10}" + "".join(f"{size / 1024:9.0f} KB" for size in sizes))
+    lines.append(f"{'total':10}{'':10}" + "".join(f"{size / 1024:9.0f} KB" for size in totals))
+    return lines
+
+def main() -> None:
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+    logging.disable(logging.WARNING)
+    for line in run():
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Count the Bot API calls of a browsing session with and without edit-in-place navigation.
+
+Replays the same scripted session, a user going through the menus, lists,
+pages, details and a typed search, once with the screens edited in place and
+once sending a new message for each, and reports the calls per method and the
+messages left in the chat.
+
+Run from the repository root: ``python -m benchmarks.bench_navigation``.
+"""
+import argparse
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+
+from src.bot.application import create_application
+from src.bot.callback_data import decode_entity
+from .fake_bot_api import FakeBotAPI, RecordingRequest, callback_update, message_update
+
+CHAT_ID = 100000
+
+# Steps as in load_test: ("text", message), ("press", callback data), ("press_prefix", callback data prefix)
+# or ("press_entity", None), the last two pressing the first matching button of the last screen
+SESSION = [
+    ("text", "/start"), ("press", "magias_menu"), ("press", "list_magias_options"), ("press", "list_spells"),
+    ("press_prefix", "level_"), ("press_entity", None), ("press", "magias_menu"),
+    ("press", "list_magias_options"), ("press", "list_spells_by_type"), ("press_prefix", "spell_type_"),
+    ("press_entity", None), ("press", "back_to_main"),
+    ("press", "poderes_menu"), ("press", "powers_class_list"), ("press_prefix", "powers_class_"),
+    ("press_prefix", "page_"), ("press_entity", None), ("press", "poderes_menu"),
+    ("press", "powers_race_list"), ("press_prefix", "powers_race_"), ("press_entity", None),
+    ("press", "back_to_main"),
+    ("press", "regras_menu"), ("press", "list_rules"), ("press_entity", None), ("press", "back_to_main"),
+    ("press", "magias_menu"), ("press", "search_spells"), ("text", "bola"), ("press_entity", None),
+    ("press", "back_to_main"),
+]
+
+def _buttons(message: Optional[Dict[str, Any]]) -> List[str]:
+    keyboard = (message or {}).get("reply_markup") or {}
+    return [button["callback_data"] for row in keyboard.get("inline_keyboard", []) for button in row
+            if "callback_data" in button]
+
+async def run_session(edit_in_place: bool) -> Dict[str, Any]:
+    """Replay the session and return the calls per method, the screens shown and the messages left."""
+    api = FakeBotAPI()
+    application = create_application(token=api.token, hot_reload=False, request=RecordingRequest(api),
+                                      persist_state=False, rate_limit=False, edit_in_place=edit_in_place)
+    await application.initialize()
+    message = None
+    screens = 0
+    for update_id, (action, argument) in enumerate(SESSION):
+        if action == "text":
+            update = message_update(CHAT_ID, argument)
+        else:
+            buttons = _buttons(message)
+            if action == "press_prefix":
+                buttons = [data for data in buttons if data.startswith(argument)]
+            elif action == "press_entity":
+                buttons = [data for data in buttons if decode_entity(data) is not None]
+            else:
+                buttons = [argument]
+            if not buttons:
+                raise RuntimeError(f"No button for step {update_id} {action} {argument}")
+            update = callback_update(CHAT_ID, buttons[0], message)
+
+        first_call = len(api.calls)
+        await application.process_update(Update.de_json(dict(update, update_id=update_id), application.bot))
+        # Follow the last message sent or edited, to press its buttons next
+        for call in api.calls[first_call:]:
+            if call.method == "sendMessage":
+                message = api.last_message(CHAT_ID)
+            elif call.method.startswith("edit"):
+                message = api.get_message(CHAT_ID, call.params.get("message_id"))
+        screens += 1
+    await application.shutdown()
+
+    return {
+        "calls": Counter(call.method for call in api.calls if call.method != "getMe"),
+        "screens": screens,
+        "messages": api.count_calls("sendMessage"),
+    }
+
+async def run() -> List[str]:
+    results = {"send": await run_session(False), "edit": await run_session(True)}
+    methods = sorted(set(results["send"]["calls"]) | set(results["edit"]["calls"]))
+    lines = [f"Session of {results['edit']['screens']} steps", f"  {'':24}{'send':>8}{'edit':>8}"]
+    for method in methods:
+        lines.append(f"  {method:24}{results['send']['calls'][method]:8}{results['edit']['calls'][method]:8}")
+    totals = {mode: sum(result["calls"].values()) for mode, result in results.items()}
+    lines.append(f"  {'total calls':24}{totals['send']:8}{totals['edit']:8}")
+    lines.append(f"  {'messages in the chat':24}{results['send']['messages']:8}{results['edit']['messages']:8}")
+    return lines
+
+def main() -> None:
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+    logging.disable(logging.WARNING)
+    for line in asyncio.run(run()):
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Measure the per-update cost of persisting the users' search state.
+
+Processes the same stream of updates, from many users starting and finishing
+searches, with and without the SQLite persistence, and reports the mean time
+per update of each. Also times saving the state of many users at once: the
+part that runs on the event loop and the batched write in a worker thread.
+
+Run from the repository root: ``python -m benchmarks.bench_persistence``.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from telegram import Update
+
+from src.bot.application import create_application
+from src.bot.persistence import SQLiteStatePersistence
+from .fake_bot_api import FakeBotAPI, RecordingRequest, callback_update, message_update
+
+# Runs of each setup
+REPEAT = 3
+
+def build_updates(users: int, rounds: int) -> List[Dict[str, Any]]:
+    """Every user starts a spell search and sends the spell name, once per round."""
+    updates = []
+    for _ in range(rounds):
+        for user in range(users):
+            chat_id = 100000 + user
+            updates.append(callback_update(chat_id, "search_again_searching_spells"))
+            updates.append(message_update(chat_id, "bola"))
+    return [dict(update, update_id=update_id) for update_id, update in enumerate(updates)]
+
+async def time_updates(updates: List[Dict[str, Any]], persist_state: bool, state_file: str) -> float:
+    """Process the updates and return the mean seconds per update."""
+    api = FakeBotAPI()
+    application = create_application(token=api.token, hot_reload=False, request=RecordingRequest(api),
+                                     persist_state=persist_state, state_file=state_file, rate_limit=False)
+    await application.initialize()
+    # Starting the application also starts the periodic persistence updates
+    await application.start()
+    start = time.perf_counter()
+    for update in updates:
+        await application.process_update(Update.de_json(update, application.bot))
+    elapsed = time.perf_counter() - start
+    await application.stop()
+    await application.shutdown()
+    return elapsed / len(updates)
+
+async def time_flush(users: int, state_file: str) -> Dict[str, float]:
+    """Save a new state for many users at once, timing the event loop part and the write."""
+    persistence = SQLiteStatePersistence(state_file)
+    await persistence.get_user_data()
+    start = time.perf_counter()
+    for user in range(users):
+        await persistence.update_user_data(100000 + user, {"state": "searching_powers_combate"})
+    scheduled = time.perf_counter()
+    await persistence.flush()
+    written = time.perf_counter()
+    return {"loop": scheduled - start, "write": written - scheduled}
+
+async def run(users: int, rounds: int, flush_users: int) -> List[str]:
+    updates = build_updates(users, rounds)
+    lines = []
+    with tempfile.TemporaryDirectory() as directory:
+        state_file = os.path.join(directory, "state.db")
+        # Alternate the two setups and keep the best run of each, so first-use costs and noise cancel out
+        without = with_state = float("inf")
+        for _ in range(REPEAT):
+            without = min(without, await time_updates(updates, False, state_file))
+            with_state = min(with_state, await time_updates(updates, True, state_file))
+        lines.append(f"{len(updates)} updates from {users} users")
+        lines.append(f"  without persistence: {without * 1e6:8.1f} us/update")
+        lines.append(f"  with persistence:    {with_state * 1e6:8.1f} us/update "
+                     f"({(with_state - without) * 1e6:+.1f} us)")
+
+        flush = await time_flush(flush_users, state_file)
+        lines.append(f"Saving the state of {flush_users} users")
+        lines.append(f"  on the event loop:   {flush['loop'] * 1000:8.1f} ms")
+        lines.append(f"  batched write:       {flush['write'] * 1000:8.1f} ms (worker thread)")
+        lines.append(f"  database size:       {os.path.getsize(state_file) / 1024:8.0f} KB")
+    return lines
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--flush-users", type=int, default=10000)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for line in asyncio.run(run(args.users, args.rounds, args.flush_users)):
+        print(line)
+
+if __name__ == "__main__":
+    main()
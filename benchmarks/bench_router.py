@@ -0,0 +1,110 @@
+"""Compare CallbackRouter matching with the if/elif chain it replaced.
+
+Run from the repository root with ``python -m benchmarks.bench_router``.
+"""
+import timeit
+from typing import List, Optional
+
+from src.bot.router import CallbackRouter
+
+# Callback data in the proportions a browsing session produces
+SAMPLE_DATA = [
+    "P1a", "P2r", "S0", "R5", "Pf3",
+    "magias_menu", "regras_menu", "poderes_menu", "back_to_main",
+    "list_magias_options", "list_spells", "list_spells_by_type", "spell_type_Arcana", "level_3",
+    "list_rules", "rules", "list_powers", "list_powers_class",
+    "powers_race_list", "powers_class_list", "powers_race_Anão", "powers_class_Guerreiro", "powers_combate",
+    "page_powers_3_class", "search_again_searching_spells",
+    "spell_Bola de Fogo", "rule_Ataque", "power_combate_Ataque Pesado",
+]
+
+
+def chain_match(data: str) -> Optional[str]:
+    """Classify callback data the way handle_callback did before the router."""
+    if len(data) > 1 and data[0] in "SRP" and data[1:].isalnum():
+        return "entity"
+    elif data == "magias_menu":
+        return data
+    elif data == "regras_menu":
+        return data
+    elif data == "poderes_menu":
+        return data
+    elif data == "search_spells":
+        return data
+    elif data == "list_magias_options":
+        return data
+    elif data == "list_spells":
+        return data
+    elif data == "list_spells_by_type":
+        return data
+    elif data.startswith("spell_type_"):
+        return "spell_type_*"
+    elif data.startswith("level_"):
+        return "level_*"
+    elif data == "list_rules":
+        return data
+    elif data == "rules":
+        return data
+    elif data == "list_powers":
+        return data
+    elif data.startswith("list_powers_"):
+        return "list_powers_*"
+    elif data == "powers_race_list":
+        return data
+    elif data == "powers_class_list":
+        return data
+    elif data.startswith("powers_"):
+        parts = data.split("_")
+        if parts[1] in ("race", "class") and len(parts) > 2:
+            return f"powers_{parts[1]}_*"
+        return "powers_*"
+    elif data.startswith("page_"):
+        return "page_*"
+    elif data.startswith("search_again_"):
+        return "search_again_*"
+    elif data == "back_to_main":
+        return data
+    elif data.startswith("spell_"):
+        return "spell_*"
+    elif data.startswith("rule_"):
+        return "rule_*"
+    elif data.startswith("power_"):
+        return "power_*"
+    return None
+
+
+def create_router() -> CallbackRouter:
+    """Create a router with the same keys and prefixes CallbackHandlers registers."""
+    async def handler(query, context, payload):
+        pass
+
+    router = CallbackRouter()
+    for key in ["magias_menu", "regras_menu", "poderes_menu", "back_to_main", "search_spells",
+                "list_magias_options", "list_spells", "list_spells_by_type", "list_rules", "rules",
+                "list_powers", "powers_race_list", "powers_class_list"]:
+        router.add_exact(key, handler)
+    for prefix in ["S", "R", "P", "spell_type_", "level_", "list_powers_", "powers_race_", "powers_class_",
+                   "powers_", "page_", "search_again_", "spell_", "rule_", "power_"]:
+        router.add_prefix(prefix, handler)
+    return router
+
+
+def run(number: int = 20000) -> List[str]:
+    """Time both matchers over the sample data and return the report lines."""
+    router = create_router()
+    for data in SAMPLE_DATA:
+        assert chain_match(data) is not None and router.resolve(data) is not None, data
+
+    lines = []
+    # The last branch of the chain is its worst case, the router cost does not depend on order
+    for sample_name, samples in (("session mix", SAMPLE_DATA), ("last branch", ["power_combate_Ataque Pesado"])):
+        for label, match in (("if/elif chain", chain_match), ("router", router.resolve)):
+            seconds = min(timeit.repeat(lambda: [match(data) for data in samples], number=number, repeat=5))
+            nanoseconds = seconds / (number * len(samples)) * 1e9
+            lines.append(f"{sample_name:>12} {label:>14}: {nanoseconds:8.1f} ns per callback")
+    return lines
+
+
+if __name__ == "__main__":
+    for line in run():
+        print(line)
@@ -0,0 +1,43 @@
+"""Compare loading the data from JSON with loading the compiled snapshot.
+
+Run from the repository root with ``python -m benchmarks.bench_startup``.
+"""
+import logging
+import os
+import tempfile
+import time
+from typing import Callable, List
+
+from src.data.data_loader import build_repositories
+from src.data.snapshot import build_snapshot, load_snapshot
+
+def best_time(function: Callable[[], object], repeat: int = 5) -> float:
+    """Get the best wall time of several calls, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def run() -> List[str]:
+    """Time both loading paths and return the report lines."""
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "snapshot.bin")
+        build_snapshot(path)
+        snapshot_size = os.path.getsize(path)
+
+        json_seconds = best_time(build_repositories)
+        snapshot_seconds = best_time(lambda: load_snapshot(path))
+        assert load_snapshot(path) is not None
+
+    return [
+        f"JSON files: {json_seconds * 1000:8.1f} ms",
+        f"  snapshot: {snapshot_seconds * 1000:8.1f} ms ({snapshot_size / 1024:.0f} KB, includes the freshness check)",
+        f"   speedup: {json_seconds / snapshot_seconds:8.1f}x",
+    ]
+
+if __name__ == "__main__":
+    for line in run():
+        print(line)
@@ -0,0 +1,116 @@
+"""Time "did you mean" suggestions against an edit distance scan of every name.
+
+Queries are the loaded spell, rule and power names with one random typo each.
+Every query runs once untimed first, so caches and allocator pools are warm.
+Reports the mean, 99th percentile and worst time per query, and how often the
+intended name is the first suggestion. The budget applies to the 99th
+percentile, since a single run's maximum is mostly scheduler noise.
+
+Run from the repository root with ``python -m benchmarks.bench_suggest``.
+"""
+import logging
+import random
+import string
+import time
+from typing import Callable, List, Sequence, Tuple
+
+from src.data.data_loader import build_repositories
+from src.data.repositories import POWER_TYPES
+from src.data.text_index import fold_text
+
+# Latency budget for the 99th percentile of the queries, in seconds
+BUDGET = 0.001
+BUDGET_PERCENTILE = 0.99
+
+def add_typo(name: str, rng: random.Random) -> str:
+    """Delete, replace, insert or swap one character of a name."""
+    position = rng.randrange(len(name))
+    operation = rng.choice("drIs")
+    if operation == "d":
+        return name[:position] + name[position + 1:]
+    if operation == "r":
+        return name[:position] + rng.choice(string.ascii_lowercase) + name[position + 1:]
+    if operation == "I":
+        return name[:position] + rng.choice(string.ascii_lowercase) + name[position:]
+    return name[:position] + name[position + 1:position + 2] + name[position:position + 1] + name[position + 2:]
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance, for the brute-force baseline."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def percentile(timings: Sequence[float], fraction: float) -> float:
+    """Get the value below which the given fraction of the timings fall."""
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def time_queries(suggest: Callable[[str], List[str]],
+                 queries: Sequence[Tuple[str, str]]) -> Tuple[float, float, float, float]:
+    """Get the mean, high percentile and worst seconds per query and the share answered with the intended name first."""
+    for query, _ in queries:
+        suggest(query)
+    timings = []
+    hits = 0
+    for query, expected in queries:
+        start = time.perf_counter()
+        suggestions = suggest(query)
+        timings.append(time.perf_counter() - start)
+        hits += bool(suggestions) and suggestions[0] == expected
+    return sum(timings) / len(timings), percentile(timings, BUDGET_PERCENTILE), max(timings), hits / len(queries)
+
+def run() -> List[str]:
+    """Time both approaches and return the report lines."""
+    logging.disable(logging.WARNING)
+    spell_repo, rule_repo, power_repo = build_repositories()
+    rng = random.Random(0)
+
+    groups = [
+        ("spells", [s.name for s in spell_repo.get_all()], lambda q: [s.name for s in spell_repo.suggest_by_name(q, 5)]),
+        ("rules", [r.name for r in rule_repo.get_all()], lambda q: [r.name for r in rule_repo.suggest_by_name(q, 5)]),
+    ]
+    for power_type in POWER_TYPES:
+        names = [p.name for p in power_repo.get_all_by_type(power_type)]
+        groups.append((
+            f"powers/{power_type}",
+            names,
+            lambda q, t=power_type: [p.name for p in power_repo.suggest_by_type_and_name(t, q, 5)],
+        ))
+
+    lines = []
+    worst = 0.0
+    worst_percentile = 0.0
+    for label, names, suggest in groups:
+        if not names:
+            continue
+        queries = [(add_typo(name, rng), name) for name in names if len(name) > 3]
+        folded = [(fold_text(name), name) for name in names]
+
+        def scan(query: str) -> List[str]:
+            query = fold_text(query)
+            return [name for _, name in sorted(folded, key=lambda item: edit_distance(query, item[0]))[:5]]
+
+        mean, high, maximum, accuracy = time_queries(suggest, queries)
+        scan_mean, _, _, scan_accuracy = time_queries(scan, queries[:50])
+        worst = max(worst, maximum)
+        worst_percentile = max(worst_percentile, high)
+        lines.append(
+            f"{label:>18} ({len(names):3d} names): index {mean * 1e6:6.0f} us/query (p99 {high * 1e6:5.0f} us, "
+            f"max {maximum * 1e6:5.0f} us, top-1 {accuracy:4.0%}), "
+            f"edit distance scan {scan_mean * 1e6:7.0f} us/query (top-1 {scan_accuracy:4.0%})"
+        )
+
+    status = "within" if worst_percentile < BUDGET else "OVER"
+    lines.append(
+        f"worst p{BUDGET_PERCENTILE * 100:.0f} {worst_percentile * 1e6:.0f} us, {status} the {BUDGET * 1e6:.0f} us "
+        f"budget (slowest single query {worst * 1e6:.0f} us)"
+    )
+    return lines
+
+if __name__ == "__main__":
+    for line in run():
+        print(line)
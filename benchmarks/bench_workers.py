@@ -0,0 +1,88 @@
+"""Measure how the throughput of the sharded mode scales with the number of workers.
+
+Forks the workers as the sharded mode does, each answering from its own
+in-process fake Bot API, then hands them a stream of power searches and
+detail requests from many chats, the way the ingress process would, and
+times how long they take to handle all of it.
+
+Run from the repository root: ``python -m benchmarks.bench_workers``.
+Scaling stops at the number of cores of the machine.
+"""
+import argparse
+import gc
+import logging
+import multiprocessing
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from telegram import Update
+
+from src.bot.workers import send_update, start_workers
+from src.data.snapshot import load_repositories
+from .fake_bot_api import FakeBotAPI, RecordingRequest, callback_update, message_update
+from .load_test import SEARCH_TERMS
+
+def build_updates(chats: int, count: int, seed: int = 1) -> List[Dict[str, Any]]:
+    """A user of a random chat starts a power search, types a term and opens the first result."""
+    rng = random.Random(seed)
+    power_types = ("combate", "destino", "magia", "concedidas", "tormenta")
+    updates = []
+    while len(updates) < count:
+        chat_id = 100000 + rng.randrange(chats)
+        updates.append(callback_update(chat_id, f"search_again_searching_powers_{rng.choice(power_types)}"))
+        updates.append(message_update(chat_id, rng.choice(SEARCH_TERMS)))
+        updates.append(callback_update(chat_id, "powers_class_list"))
+    return [dict(update, update_id=update_id) for update_id, update in enumerate(updates[:count])]
+
+def time_workers(workers: int, updates: List[Update]) -> float:
+    """Fork the workers, hand them the updates and return the seconds until all were handled."""
+    ready = multiprocessing.get_context("fork").Barrier(workers + 1)
+    gc.disable()
+    repositories = load_repositories()
+    api = FakeBotAPI()
+    processes, connections = start_workers(
+        workers, repositories, on_ready=lambda index: ready.wait(), token=api.token, hot_reload=False,
+        request=RecordingRequest(api), metrics_port=0, persist_state=False, rate_limit=False,
+    )
+    gc.enable()
+    ready.wait()
+
+    start = time.perf_counter()
+    for update in updates:
+        send_update(connections, update)
+    # A worker stops once it handled every update it got and its pipe is closed
+    for connection in connections:
+        connection.close()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    gc.unfreeze()
+    return elapsed
+
+def run(worker_counts: List[int], chats: int, count: int) -> List[str]:
+    updates = [Update.de_json(update, None) for update in build_updates(chats, count)]
+    lines = [f"{count} updates from {chats} chats, {os.cpu_count()} CPU cores"]
+    baseline = None
+    for workers in worker_counts:
+        elapsed = time_workers(workers, updates)
+        throughput = count / elapsed
+        baseline = baseline or throughput
+        lines.append(f"  {workers:3} workers: {throughput:8.0f} updates/s ({throughput / baseline:4.2f}x)")
+    return lines
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--updates", type=int, default=6000)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    worker_counts = [int(workers) for workers in args.workers.split(",")]
+    for line in run(worker_counts, args.chats, args.updates):
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""Local stand-in for the Telegram Bot API.
+
+Answers the Bot API methods the bot uses, so the bot, the benchmarks and any
+handler checks run on one machine without network access. Point the bot at it
+with ``BOT_API_URL=http://127.0.0.1:8081/bot``.
+
+Updates pushed with ``FakeBotAPI.push_update`` are handed out by getUpdates, or
+posted to the webhook once one is set. Every call is recorded, and
+``wait_for_reply`` waits for the next message sent or edited in a chat.
+
+``RecordingRequest`` answers from the same fake in process, without HTTP, for
+benchmarks that should only measure the bot.
+
+Run it standalone with ``python -m benchmarks.fake_bot_api [--port 8081]``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from telegram.request import BaseRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Tormenta Bot", "username": "tormenta_test_bot"}
+
+# Parameters the bot sends as plain strings, every other value is JSON encoded
+STRING_PARAMETERS = {"text", "parse_mode", "callback_query_id", "inline_query_id", "next_offset", "url", "secret_token"}
+
+# Methods that send or edit a message in a chat
+REPLY_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup"}
+
+class Call(NamedTuple):
+    """A recorded Bot API call."""
+    method: str
+    params: Dict[str, Any]
+    time: float
+
+class BotAPIError(Exception):
+    """Raised by a method to answer with ok=false."""
+
+    def __init__(self, error_code: int, description: str):
+        super().__init__(description)
+        self.error_code = error_code
+        self.description = description
+
+def _decode_params(pairs: List[Tuple[str, str]]) -> Dict[str, Any]:
+    params = {}
+    for name, value in pairs:
+        if name in STRING_PARAMETERS:
+            params[name] = value
+            continue
+        try:
+            params[name] = json.loads(value)
+        except ValueError:
+            params[name] = value
+    return params
+
+def message_update(chat_id: int, text: str) -> Dict[str, Any]:
+    """Build the update of a user sending a text message to the bot."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    message = {
+        "message_id": 0,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"message": message}
+
+def callback_update(chat_id: int, data: str, message: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build the update of a user pressing an inline button of a bot message."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    if message is None:
+        message = {"message_id": 1, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER}
+    return {"callback_query": {"id": f"{chat_id}-{time.monotonic_ns()}", "from": user, "chat_instance": str(chat_id),
+                               "message": message, "data": data}}
+
+def inline_query_update(chat_id: int, query: str, offset: str = "") -> Dict[str, Any]:
+    """Build the update of a user typing an inline query for the bot."""
+    user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+    return {"inline_query": {"id": f"{chat_id}-{time.monotonic_ns()}", "from": user, "query": query, "offset": offset}}
+
+class FakeBotAPI:
+    """In-memory Bot API with a minimal HTTP/1.1 front end."""
+
+    def __init__(self, token: str = "123456:TEST", latency: float = 0.0):
+        self.token = token
+        # Seconds every method but getUpdates takes, like a round trip to the real Bot API
+        self.latency = latency
+        self.calls: List[Call] = []
+        self.webhook: Dict[str, Any] = {}
+        self._updates: List[Dict[str, Any]] = []
+        self._next_update_id = 1
+        self._new_updates = asyncio.Event()
+        self._messages: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self._next_message_id = 1
+        self._reply_waiters: Dict[int, List[asyncio.Future]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._webhook_client = None
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        """The value for BOT_API_URL, to append the token to."""
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    # Test and benchmark helpers
+
+    async def push_update(self, update: Dict[str, Any]) -> int:
+        """Deliver an update through the webhook if one is set, else queue it for getUpdates."""
+        update = dict(update, update_id=self._next_update_id)
+        self._next_update_id += 1
+        if self.webhook.get("url"):
+            await self._post_to_webhook(update)
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+        return update["update_id"]
+
+    def wait_for_reply(self, chat_id: int) -> "asyncio.Future[Call]":
+        """Get a future resolved with the next message sent or edited in a chat."""
+        future = asyncio.get_running_loop().create_future()
+        self._reply_waiters.setdefault(chat_id, []).append(future)
+        return future
+
+    def last_message(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Get the last message the bot sent in a chat, as the Bot API would return it."""
+        messages = [message for (chat, _), message in self._messages.items() if chat == chat_id]
+        return messages[-1] if messages else None
+
+    def get_message(self, chat_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """Get a message the bot sent, with any edits applied."""
+        return self._messages.get((chat_id, message_id))
+
+    def count_calls(self, method: Optional[str] = None) -> int:
+        """Count the recorded calls, optionally only those of one method."""
+        return sum(1 for call in self.calls if method is None or call.method == method)
+
+    # Bot API methods
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Any:
+        """Run a Bot API method and return its result."""
+        self.calls.append(Call(method, params, time.perf_counter()))
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            raise BotAPIError(404, "Not Found: method not found")
+        if self.latency and method != "getUpdates":
+            await asyncio.sleep(self.latency)
+        result = await handler(params)
+        if method in REPLY_METHODS:
+            self._notify_reply(params.get("chat_id"), self.calls[-1])
+        return result
+
+    async def _api_getMe(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return BOT_USER
+
+    async def _api_getUpdates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.webhook.get("url"):
+            raise BotAPIError(409, "Conflict: can't use getUpdates method while webhook is active")
+        offset = params.get("offset") or 0
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and params.get("timeout"):
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), params["timeout"])
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:params.get("limit") or 100]
+
+    async def _api_setWebhook(self, params: Dict[str, Any]) -> bool:
+        self.webhook = params
+        return True
+
+    async def _api_deleteWebhook(self, params: Dict[str, Any]) -> bool:
+        self.webhook = {}
+        if params.get("drop_pending_updates"):
+            self._updates.clear()
+        return True
+
+    async def _api_getWebhookInfo(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "url": self.webhook.get("url", ""),
+            "has_custom_certificate": False,
+            "pending_update_count": len(self._updates),
+            "max_connections": self.webhook.get("max_connections", 40),
+        }
+
+    async def _api_sendMessage(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = {
+            "message_id": self._next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": params["chat_id"], "type": "private"},
+            "from": BOT_USER,
+            "text": params["text"],
+        }
+        if "reply_markup" in params:
+            message["reply_markup"] = params["reply_markup"]
+        self._next_message_id += 1
+        self._messages[(params["chat_id"], message["message_id"])] = message
+        return message
+
+    def _get_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = self._messages.get((params.get("chat_id"), params.get("message_id")))
+        if message is None:
+            raise BotAPIError(400, "Bad Request: message to edit not found")
+        return message
+
+    async def _api_editMessageText(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = self._get_message(params)
+        if message["text"] == params["text"] and message.get("reply_markup") == params.get("reply_markup"):
+            raise BotAPIError(400, "Bad Request: message is not modified")
+        message["text"] = params["text"]
+        message.pop("reply_markup", None)
+        if "reply_markup" in params:
+            message["reply_markup"] = params["reply_markup"]
+        return message
+
+    async def _api_editMessageReplyMarkup(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = self._get_message(params)
+        message.pop("reply_markup", None)
+        if "reply_markup" in params:
+            message["reply_markup"] = params["reply_markup"]
+        return message
+
+    async def _api_answerCallbackQuery(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    async def _api_answerInlineQuery(self, params: Dict[str, Any]) -> bool:
+        return True
+
+    def _notify_reply(self, chat_id: Any, call: Call) -> None:
+        for future in self._reply_waiters.pop(chat_id, []):
+            if not future.done():
+                future.set_result(call)
+
+    async def _post_to_webhook(self, update: Dict[str, Any]) -> None:
+        import httpx
+
+        if self._webhook_client is None:
+            self._webhook_client = httpx.AsyncClient()
+        headers = {}
+        if self.webhook.get("secret_token"):
+            headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook["secret_token"]
+        response = await self._webhook_client.post(self.webhook["url"], json=update, headers=headers)
+        if response.status_code != 200:
+            logger.warning(f"Webhook answered update {update['update_id']} with HTTP {response.status_code}")
+
+    # HTTP server
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """Start serving, on a free port unless one is given."""
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop serving and wake up pending getUpdates calls."""
+        self._new_updates.set()
+        if self._webhook_client is not None:
+            await self._webhook_client.aclose()
+            self._webhook_client = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self._handle_request(target, headers.get("content-type", ""), body)
+                content = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(content)}\r\n\r\n".encode() + content
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, target: str, content_type: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        path = urlsplit(target).path
+        prefix = f"/bot{self.token}/"
+        if not path.startswith(prefix):
+            return 401, {"ok": False, "error_code": 401, "description": "Unauthorized"}
+
+        if content_type.startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = _decode_params(parse_qsl(body.decode(), keep_blank_values=True))
+        try:
+            result = await self.call(path[len(prefix):], params)
+        except BotAPIError as e:
+            return e.error_code, {"ok": False, "error_code": e.error_code, "description": e.description}
+        return 200, {"ok": True, "result": result}
+
+class RecordingRequest(BaseRequest):
+    """Bot transport that runs every request on a FakeBotAPI in process."""
+
+    def __init__(self, api: FakeBotAPI):
+        self.api = api
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=BaseRequest.DEFAULT_NONE, write_timeout=BaseRequest.DEFAULT_NONE,
+                         connect_timeout=BaseRequest.DEFAULT_NONE, pool_timeout=BaseRequest.DEFAULT_NONE
+                         ) -> Tuple[int, bytes]:
+        params = request_data.parameters if request_data else {}
+        try:
+            result = await self.api.call(url.rsplit("/", 1)[-1], params)
+        except BotAPIError as e:
+            payload = {"ok": False, "error_code": e.error_code, "description": e.description}
+            return e.error_code, json.dumps(payload).encode()
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+async def _serve(host: str, port: int, token: str) -> None:
+    api = FakeBotAPI(token)
+    await api.start(host, port)
+    logger.info(f"Fake Bot API for token {token} listening on {host}:{api.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--token", default="123456:TEST")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_serve(args.host, args.port, args.token))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,206 @@
+"""Load test with many concurrent virtual users against the fake Bot API.
+
+Each virtual user repeatedly walks one of the realistic paths below, pressing
+buttons taken from the keyboards the bot actually sent and pausing for a
+random think time between steps. Updates reach the bot through getUpdates on
+the fake Bot API, over HTTP by default or in process with ``--transport
+inprocess`` to leave out the HTTP cost.
+
+For every step of users, reports the throughput, the p50/p95/p99 latency from
+handing an update to the fake Bot API until the bot's reply arrives, the
+event-loop lag and the peak RSS. The generator, the fake Bot API and the bot
+share one event loop, so the numbers are a conservative bound.
+
+Run from the repository root, e.g.
+``python -m benchmarks.load_test --users 100,500,1000,2000 --duration 30``.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import resource
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.bot.application import create_application
+from src.bot.callback_data import decode_entity
+from .fake_bot_api import Call, FakeBotAPI, RecordingRequest, message_update, callback_update
+
+# How long to wait for a reply before counting the update as lost
+REPLY_TIMEOUT = 30.0
+
+# How often the event loop lag is sampled, in seconds
+LAG_INTERVAL = 0.05
+
+# A step is ("text", message), ("search", None) for a random search term, ("press", callback data),
+# ("press_prefix", callback data prefix) or ("press_entity", None); the last two pick a random
+# matching button of the last keyboard the user got
+Step = Tuple[str, Optional[str]]
+
+SEARCH_TERMS = ("bola", "fogo", "luz", "cura", "ataque", "escudo", "fúria", "arma", "dano", "bola de foog")
+
+PATHS: List[Tuple[float, List[Step]]] = [
+    (0.35, [("text", "/start"), ("press", "poderes_menu"), ("press", "powers_class_list"),
+            ("press_prefix", "powers_class_"), ("press_entity", None)]),
+    (0.25, [("text", "/start"), ("press", "magias_menu"), ("press", "search_spells"),
+            ("search", None), ("press_entity", None)]),
+    (0.15, [("text", "/start"), ("press", "magias_menu"), ("press", "list_magias_options"),
+            ("press", "list_spells"), ("press_prefix", "level_"), ("press_entity", None)]),
+    (0.15, [("text", "/start"), ("press", "poderes_menu"), ("press", "powers_race_list"),
+            ("press_prefix", "powers_race_"), ("press_prefix", "page_"), ("press_entity", None)]),
+    (0.10, [("text", "/start"), ("press", "regras_menu"), ("press", "rules"),
+            ("search", None), ("press_entity", None)]),
+]
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Get a percentile of already sorted values (nearest rank)."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+class LoadStats:
+    """Latencies and outcomes collected during one step."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.timeouts = 0
+        self.lags: List[float] = []
+
+    def report(self, users: int, elapsed: float) -> str:
+        latencies = sorted(self.latencies)
+        lags = sorted(self.lags)
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return (
+            f"{users:6d} users: {len(latencies) / elapsed:8.1f} updates/s, "
+            f"p50 {percentile(latencies, 0.50) * 1000:7.1f} ms, p95 {percentile(latencies, 0.95) * 1000:7.1f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms, {self.timeouts} timeouts, "
+            f"loop lag p99 {percentile(lags, 0.99) * 1000:6.1f} ms (max {(lags[-1] if lags else 0) * 1000:.1f} ms), "
+            f"peak RSS {peak_rss_mb:.0f} MB"
+        )
+
+class VirtualUser:
+    """A user walking the menu paths in their own private chat."""
+
+    def __init__(self, api: FakeBotAPI, chat_id: int, stats: LoadStats, think_time: float, rng: random.Random):
+        self.api = api
+        self.chat_id = chat_id
+        self.stats = stats
+        self.think_time = think_time
+        self.rng = rng
+        self.message: Optional[Dict[str, Any]] = None
+
+    def _buttons(self, accept: Callable[[str], bool]) -> List[str]:
+        keyboard = (self.message or {}).get("reply_markup") or {}
+        return [button["callback_data"] for row in keyboard.get("inline_keyboard", [])
+                for button in row if "callback_data" in button and accept(button["callback_data"])]
+
+    def _build_update(self, step: Step) -> Optional[Dict[str, Any]]:
+        action, argument = step
+        if action == "text":
+            return message_update(self.chat_id, argument)
+        if action == "search":
+            return message_update(self.chat_id, self.rng.choice(SEARCH_TERMS))
+
+        if action == "press":
+            data = argument
+        else:
+            if action == "press_prefix":
+                buttons = self._buttons(lambda data: data.startswith(argument))
+            else:
+                buttons = self._buttons(lambda data: decode_entity(data) is not None)
+            if not buttons:
+                return None
+            data = self.rng.choice(buttons)
+        return callback_update(self.chat_id, data, self.message)
+
+    def _track(self, call: Call) -> None:
+        """Remember the message the reply sent or edited, to press its buttons next."""
+        if call.method == "sendMessage":
+            self.message = self.api.last_message(self.chat_id)
+        else:
+            self.message = self.api.get_message(self.chat_id, call.params.get("message_id"))
+
+    async def run(self, deadline: float) -> None:
+        weights = [weight for weight, _ in PATHS]
+        while time.monotonic() < deadline:
+            _, path = self.rng.choices(PATHS, weights)[0]
+            for step in path:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+                if time.monotonic() >= deadline:
+                    return
+                update = self._build_update(step)
+                if update is None:
+                    # E.g. a search that found nothing, start another path
+                    break
+
+                reply = self.api.wait_for_reply(self.chat_id)
+                start = time.perf_counter()
+                await self.api.push_update(update)
+                try:
+                    call = await asyncio.wait_for(reply, REPLY_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.stats.timeouts += 1
+                    break
+                self.stats.latencies.append(time.perf_counter() - start)
+                self._track(call)
+
+async def _sample_lag(stats: LoadStats) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        stats.lags.append(time.perf_counter() - start - LAG_INTERVAL)
+
+async def run_step(users: int, duration: float, ramp_up: float, think_time: float, transport: str,
+                   seed: int) -> str:
+    """Run one step of virtual users against a fresh bot and return its report line."""
+    api = FakeBotAPI()
+    await api.start()
+    if transport == "inprocess":
+        application = create_application(token=api.token, hot_reload=False, request=RecordingRequest(api),
+                                         persist_state=False, rate_limit=False)
+    else:
+        application = create_application(token=api.token, base_url=api.base_url, hot_reload=False,
+                                         persist_state=False, rate_limit=False)
+    await application.initialize()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+    await application.start()
+
+    stats = LoadStats()
+    lag_task = asyncio.create_task(_sample_lag(stats))
+    rng = random.Random(seed)
+    start = time.monotonic()
+    deadline = start + ramp_up + duration
+
+    async def start_user(index: int) -> None:
+        # Spread the arrivals over the ramp-up so users do not move in lockstep
+        await asyncio.sleep(ramp_up * index / users)
+        user_rng = random.Random(rng.random())
+        await VirtualUser(api, 100000 + index, stats, think_time, user_rng).run(deadline)
+
+    try:
+        await asyncio.gather(*(start_user(index) for index in range(users)))
+    finally:
+        lag_task.cancel()
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await api.stop()
+    return stats.report(users, time.monotonic() - start)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", default="100,500,1000", help="comma-separated numbers of concurrent users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run after the ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users arrive")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between a user's steps")
+    parser.add_argument("--transport", choices=("http", "inprocess"), default="http")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    for users in (int(value) for value in args.users.split(",")):
+        print(asyncio.run(run_step(users, args.duration, args.ramp_up, args.think_time, args.transport, args.seed)),
+              flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""Micro-benchmark suite for the hot paths of the bot.
+
+Covers loading the data and building the Application, every repository query
+method, the detail formatters, every keyboard builder and full update round
+trips through ``Application.process_update``. Round trips use real ``Update``
+objects and a bot whose requests are answered in process by the fake Bot API,
+so nothing touches the network.
+
+Results are written as JSON. Given a baseline file, the run fails when a
+benchmark got slower than the threshold allows:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --baseline before.json --threshold 0.25
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from telegram import Update
+
+from src.bot import keyboards
+from src.bot.application import create_application
+from src.bot.callback_data import SPELL, RULE, POWER, encode_entity
+from src.bot.messages import format_spell_details, format_rule_details, format_power_details
+from src.data.data_loader import build_repositories
+from src.data.snapshot import load_repositories
+from .fake_bot_api import FakeBotAPI, RecordingRequest, message_update, callback_update
+
+# Minimum seconds a timed batch of calls should take, and how many batches to time
+MIN_BATCH_TIME = 0.02
+REPEAT = 5
+
+# Relative slowdown against the baseline that counts as a regression, and the
+# absolute one below which timer noise on sub-microsecond benchmarks is ignored
+DEFAULT_THRESHOLD = 0.25
+MIN_REGRESSION_NS = 1000
+
+class Benchmark(NamedTuple):
+    """A named function to time, either synchronous or a coroutine function."""
+    name: str
+    function: Callable[[], Any]
+
+def _summarize(timings: List[float], loops: int) -> Dict[str, float]:
+    per_call = [timing / loops for timing in timings]
+    return {
+        "best_ns": min(per_call) * 1e9,
+        "mean_ns": statistics.mean(per_call) * 1e9,
+        "stdev_ns": statistics.stdev(per_call) * 1e9 if len(per_call) > 1 else 0.0,
+        "loops": loops,
+    }
+
+def time_function(function: Callable[[], Any]) -> Dict[str, float]:
+    """Time a function, calling it in batches large enough to measure."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_BATCH_TIME or loops >= 10 ** 6:
+            break
+        loops *= 10
+
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        timings.append(time.perf_counter() - start)
+    return _summarize(timings, loops)
+
+async def time_coroutine_function(function: Callable[[], Awaitable[Any]]) -> Dict[str, float]:
+    """Time a coroutine function on the running event loop, in batches large enough to measure."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            await function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_BATCH_TIME or loops >= 10 ** 5:
+            break
+        loops *= 10
+
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(loops):
+            await function()
+        timings.append(time.perf_counter() - start)
+    return _summarize(timings, loops)
+
+def load_benchmarks() -> List[Benchmark]:
+    """Loading the data the way main.py does."""
+    return [
+        Benchmark("load/json_repositories", build_repositories),
+        Benchmark("load/snapshot_or_json", load_repositories),
+        Benchmark("load/application",
+                  lambda: create_application(hot_reload=False, persist_state=False, rate_limit=False)),
+    ]
+
+def repository_benchmarks(spell_repo, rule_repo, power_repo) -> List[Benchmark]:
+    """Every query method of the repositories."""
+    spell = spell_repo.get_all()[len(spell_repo.get_all()) // 2]
+    rule = rule_repo.get_all()[len(rule_repo.get_all()) // 2]
+    power = power_repo.get_all_by_type("class")[0]
+    benchmarks = [
+        Benchmark("spells/find_by_name", lambda: spell_repo.find_by_name("bola")),
+        Benchmark("spells/find_by_name_short", lambda: spell_repo.find_by_name("ar")),
+        Benchmark("spells/suggest_by_name", lambda: spell_repo.suggest_by_name("bola de foog", 5)),
+        Benchmark("spells/get_by_name", lambda: spell_repo.get_by_name(spell.name)),
+        Benchmark("spells/get_by_id", lambda: spell_repo.get_by_id(spell.id)),
+        Benchmark("spells/get_all", spell_repo.get_all),
+        Benchmark("spells/get_by_type", lambda: spell_repo.get_by_type("Arcana")),
+        Benchmark("spells/get_by_level", lambda: spell_repo.get_by_level(3)),
+        Benchmark("spells/get_by_type_sorted", lambda: spell_repo.get_by_type_sorted("Divina")),
+        Benchmark("spells/get_by_level_sorted", lambda: spell_repo.get_by_level_sorted(3)),
+        Benchmark("spells/get_all_by_level", spell_repo.get_all_by_level),
+        Benchmark("rules/find_by_name_or_description", lambda: rule_repo.find_by_name_or_description("ataque", 20)),
+        Benchmark("rules/suggest_by_name", lambda: rule_repo.suggest_by_name("iniciativva", 5)),
+        Benchmark("rules/get_by_name", lambda: rule_repo.get_by_name(rule.name)),
+        Benchmark("rules/get_by_id", lambda: rule_repo.get_by_id(rule.id)),
+        Benchmark("rules/get_all", rule_repo.get_all),
+        Benchmark("rules/get_all_sorted", rule_repo.get_all_sorted),
+        Benchmark("powers/get_by_type_and_name", lambda: power_repo.get_by_type_and_name("class", power.name)),
+        Benchmark("powers/get_by_id", lambda: power_repo.get_by_id(power.id)),
+        Benchmark("powers/get_powers_by_class", lambda: power_repo.get_powers_by_class("Guerreiro")),
+        Benchmark("powers/get_powers_by_race", lambda: power_repo.get_powers_by_race("Anão")),
+        Benchmark("powers/get_powers_by_race_unindexed", lambda: power_repo.get_powers_by_race("Galokk")),
+    ]
+    for power_type in ("class", "combate"):
+        benchmarks.extend([
+            Benchmark(f"powers/find_by_type_and_text/{power_type}",
+                      lambda t=power_type: power_repo.find_by_type_and_text(t, "ataque", 20)),
+            Benchmark(f"powers/suggest_by_type_and_name/{power_type}",
+                      lambda t=power_type: power_repo.suggest_by_type_and_name(t, "ataqe poderozo", 5)),
+            Benchmark(f"powers/get_all_by_type/{power_type}", lambda t=power_type: power_repo.get_all_by_type(t)),
+            Benchmark(f"powers/get_all_by_type_sorted/{power_type}",
+                      lambda t=power_type: power_repo.get_all_by_type_sorted(t)),
+        ])
+    return benchmarks
+
+def formatter_benchmarks(spell_repo, rule_repo, power_repo) -> List[Benchmark]:
+    """The detail formatters, on the longest entity of each kind."""
+    spell = max(spell_repo.get_all(), key=lambda s: len(s.description) + len(s.enhancements) * 100)
+    rule = max(rule_repo.get_all(), key=lambda r: len(r.description))
+    benchmarks = [
+        Benchmark("format/spell_details", lambda: format_spell_details(spell)),
+        Benchmark("format/rule_details", lambda: format_rule_details(rule)),
+    ]
+    for power_type in ("class", "race", "origin", "tormenta"):
+        power = max(power_repo.get_all_by_type(power_type), key=lambda p: len(p.description))
+        benchmarks.append(Benchmark(f"format/power_details/{power_type}", lambda p=power: format_power_details(p)))
+    return benchmarks
+
+def keyboard_benchmarks(spell_repo, rule_repo, power_repo) -> List[Benchmark]:
+    """Every create_*_keyboard, both served from its cache and built from scratch."""
+    class_powers = power_repo.get_powers_by_class("Guerreiro")
+    arguments: Dict[str, tuple] = {
+        "create_spell_results_keyboard": (spell_repo.find_by_name("a")[:20],),
+        "create_rule_results_keyboard": (rule_repo.get_all(),),
+        "create_power_results_keyboard": (power_repo.find_by_type_and_text("combate", "ataque", 20), "combate"),
+        "create_class_powers_keyboard": (class_powers, "Guerreiro", 1),
+        "create_race_powers_keyboard": (power_repo.get_powers_by_race("Anão"), "Anão", 0),
+        "create_spells_by_level_keyboard": (spell_repo.get_all_by_level(),),
+        "create_spells_for_level_keyboard": (spell_repo.get_by_level_sorted(1), 1, 0),
+        "create_rules_keyboard": (rule_repo.get_all_sorted(), 0),
+        "create_powers_by_type_keyboard": (power_repo.get_all_by_type_sorted("combate"), "combate", 1),
+        "create_spells_by_type_keyboard": (spell_repo.get_by_type_sorted("Arcana"), "Arcana", 0),
+        "create_search_again_keyboard": ("searching_spells",),
+        "create_suggestions_keyboard": (spell_repo.suggest_by_name("bola de foog", 5), SPELL, "searching_spells"),
+    }
+
+    benchmarks = []
+    for name, function in inspect.getmembers(keyboards, inspect.isfunction):
+        if not (name.startswith("create_") and name.endswith("_keyboard")):
+            continue
+        args = arguments.get(name, ())
+        if args == () and inspect.signature(inspect.unwrap(function)).parameters:
+            raise ValueError(f"No benchmark arguments for {name}")
+        benchmarks.append(Benchmark(f"keyboards/{name}", lambda f=function, a=args: f(*a)))
+        benchmarks.append(Benchmark(f"keyboards/{name}/build", lambda f=inspect.unwrap(function), a=args: f(*a)))
+    return benchmarks
+
+class RoundTrips:
+    """Full updates processed by the Application, answered by an in-process fake Bot API."""
+
+    CHAT_ID = 4242
+
+    def __init__(self):
+        self.api = FakeBotAPI()
+        self.repositories = load_repositories()
+        self.application = create_application(
+            token=self.api.token, hot_reload=False, request=RecordingRequest(self.api), persist_state=False,
+            rate_limit=False, repositories=self.repositories,
+        )
+        self.menu: Optional[Dict[str, Any]] = None
+        self.errors: List[BaseException] = []
+        self.application.add_error_handler(self._record_error)
+
+    async def _record_error(self, update: object, context) -> None:
+        self.errors.append(context.error)
+
+    async def start(self) -> None:
+        await self.application.initialize()
+        await self.process(message_update(self.CHAT_ID, "/start"))
+        self.menu = self.api.last_message(self.CHAT_ID)
+
+    async def stop(self) -> None:
+        await self.application.shutdown()
+
+    async def process(self, update: Dict[str, Any]) -> None:
+        update = dict(update, update_id=1)
+        await self.application.process_update(Update.de_json(update, self.application.bot))
+
+    def benchmarks(self) -> List[Benchmark]:
+        chat_id = self.CHAT_ID
+        spell_repo, rule_repo, power_repo = self.repositories
+
+        def press(data: str) -> Callable[[], Awaitable[None]]:
+            return lambda: self.process(callback_update(chat_id, data, self.menu))
+
+        def press_and_back(data: str) -> Callable[[], Awaitable[None]]:
+            # Edits must change the message, so every edit is followed by the one back to the main menu
+            async def round_trip() -> None:
+                await press(data)()
+                await press("back_to_main")()
+            return round_trip
+
+        async def search(state: str, text: str) -> None:
+            await press(f"search_again_{state}")()
+            await self.process(message_update(chat_id, text))
+
+        return [
+            Benchmark("roundtrip/command_start", lambda: self.process(message_update(chat_id, "/start"))),
+            Benchmark("roundtrip/callback_menu_and_back", press_and_back("magias_menu")),
+            Benchmark("roundtrip/callback_page", press("page_powers_1_combate")),
+            Benchmark("roundtrip/callback_spell_detail", press(encode_entity(SPELL, spell_repo.get_all()[40].id))),
+            Benchmark("roundtrip/callback_rule_detail", press(encode_entity(RULE, rule_repo.get_all()[3].id))),
+            Benchmark("roundtrip/callback_power_detail", press(encode_entity(POWER, power_repo.powers[10].id))),
+            Benchmark("roundtrip/callback_class_powers_and_back", press_and_back("powers_class_Guerreiro")),
+            Benchmark("roundtrip/search_spells", lambda: search("searching_spells", "bola")),
+            Benchmark("roundtrip/search_spells_miss", lambda: search("searching_spells", "bola de foog")),
+            Benchmark("roundtrip/search_powers", lambda: search("searching_powers_combate", "ataque")),
+        ]
+
+async def _run_round_trips(selected: Callable[[str], bool]) -> Dict[str, Dict[str, float]]:
+    round_trips = RoundTrips()
+    await round_trips.start()
+    results = {}
+    try:
+        for benchmark in round_trips.benchmarks():
+            if selected(benchmark.name):
+                results[benchmark.name] = await time_coroutine_function(benchmark.function)
+                if round_trips.errors:
+                    raise RuntimeError(f"{benchmark.name} failed: {round_trips.errors[0]!r}")
+                print(f"{benchmark.name:60} {results[benchmark.name]['best_ns'] / 1000:12.2f} us", flush=True)
+    finally:
+        await round_trips.stop()
+    return results
+
+def run(name_filter: str = "") -> Dict[str, Dict[str, float]]:
+    """Run every benchmark whose name contains the filter and return the timings by name."""
+    logging.disable(logging.WARNING)
+
+    def selected(name: str) -> bool:
+        return name_filter in name
+
+    spell_repo, rule_repo, power_repo = build_repositories()
+    benchmarks = (
+        load_benchmarks()
+        + repository_benchmarks(spell_repo, rule_repo, power_repo)
+        + formatter_benchmarks(spell_repo, rule_repo, power_repo)
+        + keyboard_benchmarks(spell_repo, rule_repo, power_repo)
+    )
+    results = {}
+    for benchmark in benchmarks:
+        if selected(benchmark.name):
+            results[benchmark.name] = time_function(benchmark.function)
+            print(f"{benchmark.name:60} {results[benchmark.name]['best_ns'] / 1000:12.2f} us", flush=True)
+    results.update(asyncio.run(_run_round_trips(selected)))
+    return results
+
+def find_regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                     threshold: float) -> List[str]:
+    """Describe the benchmarks whose best time grew by more than the threshold."""
+    regressions = []
+    for name, timing in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = timing["best_ns"] / before["best_ns"]
+        if ratio > 1 + threshold and timing["best_ns"] - before["best_ns"] >= MIN_REGRESSION_NS:
+            regressions.append(
+                f"{name}: {before['best_ns'] / 1000:.2f} us -> {timing['best_ns'] / 1000:.2f} us ({ratio - 1:+.0%})"
+            )
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown, e.g. 0.25 for 25%%")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    args = parser.parse_args()
+
+    results = run(args.filter)
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,25 @@ import os
 # Bot settings
 BOT_TOKEN = os.getenv("BOT_TOKEN", "8159106255:AAGUZ351bbLmgGTTkNIopb5RJDgW0QfbfaM")
 
+# Bot API endpoint, can point to a local server such as benchmarks/fake_bot_api.py
+BOT_API_URL = os.getenv("BOT_API_URL", "https://api.telegram.org/bot")
+
+# Receive updates by "polling" or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# Webhook settings (BOT_MODE=webhook). WEBHOOK_URL is the public URL Telegram posts updates to,
+# usually a reverse proxy or load balancer forwarding to WEBHOOK_LISTEN:WEBHOOK_PORT/WEBHOOK_PATH
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN") or None
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Worker processes. With more than one, this process only receives the updates and hands each to the worker
+# that owns its chat, running the handlers on WORKERS cores (Unix only)
+WORKERS = int(os.getenv("WORKERS", "1"))
+
 # Data paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 SPELLS_FILE = os.path.join(DATA_DIR, "spells", "spells.json")
@@ -17,6 +36,78 @@ MAGIC_POWERS_FILE = os.path.join(DATA_DIR, "powers", "magic_powers.json")
 GRANTED_POWERS_FILE = os.path.join(DATA_DIR, "powers", "granted_powers.json")
 GROUP_POWERS_FILE = os.path.join(DATA_DIR, "powers", "group_powers.json")
 
+# Compiled snapshot of the data files, built with "python -m src.data.snapshot"
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "snapshot.bin")
+
+# Load each power type from JSON on first use, optionally preloading the rest in the background
+LAZY_POWER_LOADING = os.getenv("LAZY_POWER_LOADING", "false").lower() == "true"
+WARM_UP_POWERS = os.getenv("WARM_UP_POWERS", "true").lower() == "true"
+
+# Reload the data files when they change, checking every DATA_RELOAD_INTERVAL seconds
+HOT_RELOAD = os.getenv("HOT_RELOAD", "true").lower() == "true"
+DATA_RELOAD_INTERVAL = float(os.getenv("DATA_RELOAD_INTERVAL", "2.0"))
+
+# Keep each user's search state across restarts in a SQLite database, written every STATE_FLUSH_INTERVAL
+# seconds. States idle for more than STATE_TTL seconds are forgotten
+PERSIST_STATE = os.getenv("PERSIST_STATE", "true").lower() == "true"
+STATE_FILE = os.getenv("STATE_FILE", os.path.join(DATA_DIR, "state.db"))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "1.0"))
+STATE_TTL = float(os.getenv("STATE_TTL", str(24 * 60 * 60)))
+
+# Outbound rate limits, in requests per second, following the Telegram flood limits: about 30 messages per
+# second overall, one per second in a private chat and 20 per minute in a group, with short bursts allowed.
+# New messages with more than BULK_KEYBOARD_ROWS rows of buttons wait behind the other replies
+RATE_LIMIT = os.getenv("RATE_LIMIT", "true").lower() == "true"
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", "30"))
+RATE_LIMIT_CHAT = float(os.getenv("RATE_LIMIT_CHAT", "1"))
+RATE_LIMIT_CHAT_BURST = float(os.getenv("RATE_LIMIT_CHAT_BURST", "3"))
+RATE_LIMIT_GROUP = float(os.getenv("RATE_LIMIT_GROUP", str(20 / 60)))
+RATE_LIMIT_GROUP_BURST = float(os.getenv("RATE_LIMIT_GROUP_BURST", "5"))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "2"))
+BULK_KEYBOARD_ROWS = 8
+
+# Show menus, lists, prompts and details by editing the message whose button was pressed, sending a new
+# message only when it can't be edited
+EDIT_IN_PLACE = os.getenv("EDIT_IN_PLACE", "true").lower() == "true"
+
+# Updates handled at once (1 handles them one after the other). The updates of one user or chat are still
+# handled one at a time and in order; up to MAX_PENDING_UPDATES updates are admitted, running or waiting
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", str(4 * CONCURRENT_UPDATES)))
+
+# Cache settings
+KEYBOARD_CACHE_SIZE = 256
+DETAIL_CACHE_SIZE = 512
+
+# Number of items per page in the listing keyboards
+KEYBOARD_PAGE_SIZE = 20
+
+# Maximum number of results of a rule or power search, the most relevant ones
+SEARCH_RESULT_LIMIT = 20
+
+# Maximum number of "did you mean" suggestions shown when a search finds nothing
+SUGGESTION_LIMIT = 5
+
+# Inline mode: maximum results per query, cached queries on the server and seconds Telegram may cache an answer
+INLINE_RESULT_LIMIT = 200
+INLINE_CACHE_SIZE = 256
+INLINE_CACHE_TIME = 300
+
+# Prometheus metrics endpoint, served on METRICS_HOST:METRICS_PORT/metrics when a port is set
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Profiling of a sampled fraction of updates (0 disables it), also controlled with the /profile admin command.
+# At most PROFILE_MAX_SAMPLES updates are profiled per PROFILE_DUMP_INTERVAL seconds, then dumped to PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "100"))
+PROFILE_DUMP_INTERVAL = float(os.getenv("PROFILE_DUMP_INTERVAL", "60"))
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "true").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "profiles"))
+
+# Telegram user ids allowed to use admin commands such as /profile, comma-separated
+ADMIN_USER_IDS = frozenset(int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip())
+
 # Logging settings
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
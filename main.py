@@ -1,13 +1,14 @@
 import os
 
 from telegram import Update
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-
-from config.settings import BOT_TOKEN, SPELLS_FILE, RULES_FILE, CLASS_POWERS_FILE, RACE_POWERS_FILE, ORIGIN_POWERS_FILE, TORMENTA_POWERS_FILE, COMBAT_POWERS_FILE, DESTINY_POWERS_FILE, MAGIC_POWERS_FILE, GRANTED_POWERS_FILE, GROUP_POWERS_FILE
-from src.data.data_loader import load_json_data
-from src.data.repositories import SpellRepository, RuleRepository, PowerRepository
-from src.domain.services import SpellService, RuleService, PowerService
-from src.bot.handlers import CommandHandlers, CallbackHandlers, MessageHandlers
+from telegram.ext import Application
+
+from config.settings import (
+    SPELLS_FILE, RULES_FILE, CLASS_POWERS_FILE, BOT_MODE, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+    WEBHOOK_URL, WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONNECTIONS, WORKERS,
+)
+from src.bot.application import create_application
+from src.bot.workers import run_sharded
 from src.utils.logging_config import setup_logging
 
 # Setup logging
@@ -18,58 +19,32 @@ os.makedirs(os.path.dirname(SPELLS_FILE), exist_ok=True)
 os.makedirs(os.path.dirname(RULES_FILE), exist_ok=True)
 os.makedirs(os.path.dirname(CLASS_POWERS_FILE), exist_ok=True)
 
+def run(application: Application) -> None:
+    """Receive the updates of an application by webhook or polling, as set by BOT_MODE."""
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise ValueError("WEBHOOK_URL must be set when BOT_MODE is 'webhook'")
+        logger.info(f"Starting bot in webhook mode on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}...")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        logger.info("Starting bot...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
 def main() -> None:
     """Start the bot."""
-    # Load data
-    spells_data = load_json_data(SPELLS_FILE)
-    rules_data = load_json_data(RULES_FILE)
-    class_powers_data = load_json_data(CLASS_POWERS_FILE)
-    race_powers_data = load_json_data(RACE_POWERS_FILE)
-    origin_powers_data = load_json_data(ORIGIN_POWERS_FILE)
-    tormenta_powers_data = load_json_data(TORMENTA_POWERS_FILE)
-    combat_powers_data = load_json_data(COMBAT_POWERS_FILE)
-    destiny_powers_data = load_json_data(DESTINY_POWERS_FILE)
-    magic_powers_data = load_json_data(MAGIC_POWERS_FILE)
-    granted_powers_data = load_json_data(GRANTED_POWERS_FILE)
-    group_powers_data = load_json_data(GROUP_POWERS_FILE)
-
-    # Initialize repositories
-    spell_repo = SpellRepository(spells_data)
-    rule_repo = RuleRepository(rules_data)
-    power_repo = PowerRepository(
-        class_powers_data, 
-        race_powers_data, 
-        origin_powers_data, 
-        tormenta_powers_data,
-        combat_powers_data,
-        destiny_powers_data,
-        magic_powers_data,
-        granted_powers_data,
-        group_powers_data
-    )
-
-    # Initialize services
-    spell_service = SpellService(spell_repo)
-    rule_service = RuleService(rule_repo)
-    power_service = PowerService(power_repo)
-
-    # Initialize handlers
-    command_handlers = CommandHandlers(spell_service, rule_service, power_service)
-    callback_handlers = CallbackHandlers(spell_service, rule_service, power_service)
-    message_handlers = MessageHandlers(spell_service, rule_service, power_service)
-
-    # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
-
-    # Add handlers
-    application.add_handler(CommandHandler("start", command_handlers.start))
-    application.add_handler(CommandHandler("help", command_handlers.help_command))
-    application.add_handler(CallbackQueryHandler(callback_handlers.handle_callback))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handlers.handle_message))
-
-    # Run the bot
-    logger.info("Starting bot...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WORKERS > 1:
+        # This process only receives the updates, the handlers run in the worker processes
+        run_sharded(WORKERS, run)
+    else:
+        run(create_application())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,126 @@
+import asyncio
+from typing import Optional, Union
+
+from telegram.ext import (
+    Application, BaseUpdateProcessor, CommandHandler, CallbackQueryHandler, InlineQueryHandler, MessageHandler, filters,
+)
+from telegram.request import BaseRequest, HTTPXRequest
+
+from config.settings import (
+    BOT_TOKEN, BOT_API_URL, LAZY_POWER_LOADING, WARM_UP_POWERS, HOT_RELOAD, METRICS_HOST, METRICS_PORT,
+    PROFILE_SAMPLE_RATE, PERSIST_STATE, STATE_FILE, RATE_LIMIT, RATE_LIMIT_GLOBAL, EDIT_IN_PLACE,
+    CONCURRENT_UPDATES,
+)
+from ..data.snapshot import Repositories, load_repositories
+from ..data.reloader import DataReloader
+from ..domain.services import SpellService, RuleService, PowerService
+from ..utils.metrics import MetricsServer
+from ..utils.profiling import PROFILER
+from .handlers import CommandHandlers, CallbackHandlers, MessageHandlers, InlineQueryHandlers
+from .instrumentation import InstrumentedRequest
+from .persistence import SQLiteStatePersistence
+from .rate_limiter import OutboundRateLimiter
+from .update_processor import KeyedUpdateProcessor
+from .keyboards import build_static_keyboards, clear_keyboard_cache
+from .messages import clear_render_cache
+
+def create_application(token: str = BOT_TOKEN, base_url: str = BOT_API_URL, hot_reload: bool = HOT_RELOAD,
+                       request: Optional[BaseRequest] = None, metrics_port: int = METRICS_PORT,
+                       persist_state: bool = PERSIST_STATE, state_file: str = STATE_FILE,
+                       rate_limit: bool = RATE_LIMIT, edit_in_place: bool = EDIT_IN_PLACE,
+                       repositories: Optional[Repositories] = None, workers: int = 1,
+                       concurrent_updates: Union[int, BaseUpdateProcessor] = CONCURRENT_UPDATES) -> Application:
+    """Load the data and build the Application with every handler registered.
+
+    A custom request replaces the HTTP transport of the bot, e.g. to answer from a fake Bot API.
+    Metrics are served on metrics_port when it is not 0, and the users' search state is kept in
+    state_file when persist_state is set. rate_limit paces the replies to the Telegram flood limits.
+    With edit_in_place, button presses edit the pressed message instead of sending new ones.
+    Already loaded repositories can be passed in, and workers is the number of processes running
+    an application for the same bot, which share its global rate limit. Up to concurrent_updates
+    updates are handled at once, one at a time per user and per chat, unless another update processor
+    is given.
+    """
+    # Load data and initialize repositories (from the snapshot when it is up to date)
+    if repositories is None:
+        repositories = load_repositories(lazy_powers=LAZY_POWER_LOADING)
+    spell_repo, rule_repo, power_repo = repositories
+
+    # Initialize services
+    spell_service = SpellService(spell_repo)
+    rule_service = RuleService(rule_repo)
+    power_service = PowerService(power_repo)
+
+    # Initialize handlers
+    command_handlers = CommandHandlers(spell_service, rule_service, power_service)
+    callback_handlers = CallbackHandlers(spell_service, rule_service, power_service, edit_in_place)
+    message_handlers = MessageHandlers(spell_service, rule_service, power_service)
+    inline_handlers = InlineQueryHandlers(spell_service, rule_service, power_service)
+
+    # Build the static menus once, before the first update arrives
+    build_static_keyboards()
+
+    def on_reload() -> None:
+        # Keyboards and rendered messages refer to entity ids of the old data
+        clear_keyboard_cache()
+        clear_render_cache()
+        inline_handlers.clear_cache()
+
+    reloader = DataReloader(spell_service, rule_service, power_service, on_reload=on_reload)
+    metrics_server = MetricsServer()
+
+    async def post_init(application: Application) -> None:
+        # Preload the remaining power types in a worker thread while the bot is already answering
+        if LAZY_POWER_LOADING and WARM_UP_POWERS:
+            application.create_task(asyncio.to_thread(power_repo.warm_up))
+        if hot_reload:
+            reloader.start()
+        if metrics_port:
+            await metrics_server.start(METRICS_HOST, metrics_port)
+        if PROFILE_SAMPLE_RATE:
+            PROFILER.enable(PROFILE_SAMPLE_RATE)
+
+    async def post_stop(application: Application) -> None:
+        if isinstance(application.update_processor, KeyedUpdateProcessor):
+            await application.update_processor.join()
+        await reloader.stop()
+        await metrics_server.stop()
+        await PROFILER.disable()
+
+    # Create the Application
+    builder = (
+        Application.builder()
+        .token(token)
+        .base_url(base_url)
+        .post_init(post_init)
+        .post_stop(post_stop)
+    )
+    if persist_state:
+        builder = builder.persistence(SQLiteStatePersistence(state_file))
+    if isinstance(concurrent_updates, BaseUpdateProcessor):
+        builder = builder.concurrent_updates(concurrent_updates)
+    elif concurrent_updates > 1:
+        builder = builder.concurrent_updates(KeyedUpdateProcessor(concurrent_updates))
+    if rate_limit:
+        builder = builder.rate_limiter(OutboundRateLimiter(global_rate=RATE_LIMIT_GLOBAL / workers))
+    # Time every Bot API call; getUpdates keeps its own single-connection pool, as by default
+    if request is None:
+        builder = builder.request(InstrumentedRequest(HTTPXRequest(connection_pool_size=256)))
+        builder = builder.get_updates_request(InstrumentedRequest(HTTPXRequest(connection_pool_size=1)))
+    else:
+        request = InstrumentedRequest(request)
+        builder = builder.request(request).get_updates_request(request)
+    application = builder.build()
+    if persist_state:
+        # Drop the user data of the states that expired in the database
+        application.persistence.on_expire = application.drop_user_data
+
+    # Add handlers
+    application.add_handler(CommandHandler("start", command_handlers.start))
+    application.add_handler(CommandHandler("help", command_handlers.help_command))
+    application.add_handler(CommandHandler("profile", command_handlers.profile_command))
+    application.add_handler(CallbackQueryHandler(callback_handlers.handle_callback))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handlers.handle_message))
+    application.add_handler(InlineQueryHandler(inline_handlers.handle_inline_query))
+
+    return application
@@ -0,0 +1,33 @@
+from typing import Optional, Tuple
+
+# Entity kind bytes, upper case so they never clash with the lower case menu callbacks
+SPELL = "S"
+RULE = "R"
+POWER = "P"
+ENTITY_KINDS = frozenset((SPELL, RULE, POWER))
+
+BASE36_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+def to_base36(number: int) -> str:
+    """Encode a non-negative integer in base 36."""
+    if number < 0:
+        raise ValueError(f"Cannot encode negative number {number}")
+    digits = []
+    while True:
+        number, remainder = divmod(number, 36)
+        digits.append(BASE36_DIGITS[remainder])
+        if number == 0:
+            return "".join(reversed(digits))
+
+def encode_entity(kind: str, entity_id: int) -> str:
+    """Build the callback data that opens the details of a spell, rule or power."""
+    return f"{kind}{to_base36(entity_id)}"
+
+def decode_entity(data: str) -> Optional[Tuple[str, int]]:
+    """Get the entity kind and id from callback data, or None if it is not an entity payload."""
+    if len(data) < 2 or data[0] not in ENTITY_KINDS:
+        return None
+    encoded_id = data[1:]
+    if not all(char in BASE36_DIGITS for char in encoded_id):
+        return None
+    return data[0], int(encoded_id, 36)
@@ -1,6 +1,16 @@
-from telegram import Update, Message, InlineKeyboardButton, InlineKeyboardMarkup
+import logging
+from typing import Any, List, Optional, Sequence, Tuple
+
+from telegram import (
+    Update, Message, MaybeInaccessibleMessage, CallbackQuery, InlineKeyboardMarkup, InlineQueryResultArticle,
+    InputTextMessageContent
+)
+from telegram.constants import InlineQueryLimit, ParseMode
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
+from config.settings import ADMIN_USER_IDS, EDIT_IN_PLACE, INLINE_CACHE_SIZE, INLINE_CACHE_TIME, INLINE_RESULT_LIMIT
+
 from .keyboards import (
     create_main_menu_keyboard,
     create_magias_menu_keyboard,
@@ -19,12 +29,40 @@ from .keyboards import (
     create_spell_types_keyboard,
     create_spells_by_type_keyboard,
     create_race_list_keyboard,
-    create_class_list_keyboard, create_power_results_class_keyboard, create_power_results_race_keyboard,
-    create_power_results_keyboard
+    create_class_list_keyboard, create_class_powers_keyboard, create_race_powers_keyboard,
+    create_power_results_keyboard,
+    create_spell_details_keyboard,
+    create_rule_details_keyboard,
+    create_power_details_keyboard,
+    create_suggestions_keyboard
 )
-from .messages import format_spell_details, format_rule_details, format_power_details
+from .callback_data import SPELL, RULE, POWER, decode_entity, encode_entity
+from .router import CallbackRouter
+from .instrumentation import instrumented, label_update, MISS
+from .messages import render_spell_details, render_rule_details, render_power_details, format_search_results
+from ..data.repositories import POWER_TYPES
+from ..data.text_index import fold_text
+from ..domain.constants import POWER_TYPE_NAMES
+from ..domain.models import Spell, Rule, Power
 from ..domain.services import SpellService, RuleService, PowerService
+from ..utils.cache import LRUCache
+from ..utils.profiling import PROFILER
+
+logger = logging.getLogger(__name__)
+
+# chat_data key of the message currently showing the navigation of a chat
+NAV_MESSAGE_KEY = "nav_message_id"
+
+# Search states that are route labels of typed messages. The state comes from callback data, which clients
+# can forge, so any other one shares a single label instead of adding a metric series per value
+SEARCH_ROUTES = frozenset(["searching_spells", "searching_rules"] + [f"searching_powers_{t}" for t in POWER_TYPES])
+OTHER_ROUTE = "other"
 
+def get_search_route(state: Optional[str]) -> str:
+    """Get the route label of a message typed in a search state."""
+    if not state:
+        return "no_state"
+    return state if state in SEARCH_ROUTES else OTHER_ROUTE
 
 class CommandHandlers:
     def __init__(self, spell_service: SpellService, rule_service: RuleService, power_service: PowerService):
@@ -32,6 +70,7 @@ class CommandHandlers:
         self.rule_service = rule_service
         self.power_service = power_service
 
+    @instrumented("command", route="start")
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Send a message when the command /start is issued."""
         keyboard = create_main_menu_keyboard()
@@ -40,6 +79,7 @@ class CommandHandlers:
             reply_markup=keyboard,
         )
 
+    @instrumented("command", route="help")
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Send a message when the command /help is issued."""
         await update.message.reply_text(
@@ -49,204 +89,263 @@ class CommandHandlers:
             "/help - Mostrar esta mensagem de ajuda\n"
         )
 
+    @instrumented("command", route="profile")
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Control the update profiler: /profile on [rate], /profile off, /profile dump or /profile status."""
+        user = update.effective_user
+        if user is None or user.id not in ADMIN_USER_IDS:
+            return
+
+        action = context.args[0].lower() if context.args else "status"
+        if action == "on":
+            try:
+                PROFILER.enable(float(context.args[1]) if len(context.args) > 1 else 0.01)
+            except ValueError:
+                await update.message.reply_text("Taxa inválida, use um número entre 0 e 1, por exemplo /profile on 0.05")
+                return
+        elif action == "off":
+            await PROFILER.disable()
+        elif action == "dump":
+            PROFILER.dump()
+        elif action != "status":
+            await update.message.reply_text("Uso: /profile on [taxa], /profile off, /profile dump ou /profile status")
+            return
+
+        status = PROFILER.get_status()
+        state = f"ativo para {status['rate']:.1%} das atualizações" if status["rate"] else "desativado"
+        await update.message.reply_text(
+            f"Profiling {state}.\n"
+            f"Atualizações amostradas neste intervalo: {status['samples']}\n"
+            f"Rotas com perfil: {', '.join(status['tags']) or 'nenhuma'}\n"
+            f"Arquivos em: {PROFILER.directory}"
+        )
+
 class CallbackHandlers:
-    def __init__(self, spell_service: SpellService, rule_service: RuleService, power_service: PowerService):
+    def __init__(self, spell_service: SpellService, rule_service: RuleService, power_service: PowerService,
+                 edit_in_place: bool = EDIT_IN_PLACE):
         self.spell_service = spell_service
         self.rule_service = rule_service
         self.power_service = power_service
+        # Show lists, details and prompts in place of the pressed message instead of in new messages
+        self.edit_in_place = edit_in_place
+        self.router = self._create_router()
 
-    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle button presses."""
-        query = update.callback_query
-        await query.answer()
+    def _create_router(self) -> CallbackRouter:
+        """Register the handler of every callback data key and prefix."""
+        router = CallbackRouter(on_route=lambda name: label_update(route=name))
 
-        # Main menu options
-        if query.data == "magias_menu":
-            keyboard = create_magias_menu_keyboard()
-            await query.message.edit_text(
-                " 🧙‍♂️ Menu de Magias:🧙‍♂️ ",
-                reply_markup=keyboard,
-            )
+        # Spell, rule and power details
+        router.add_prefix(SPELL, self._on_spell_id)
+        router.add_prefix(RULE, self._on_rule_id)
+        router.add_prefix(POWER, self._on_power_id)
 
-        elif query.data == "regras_menu":
-            keyboard = create_regras_menu_keyboard()
-            await query.message.edit_text(
-                "📖 Menu de Regras: 📖",
-                reply_markup=keyboard,
-            )
-
-        elif query.data == "poderes_menu":
-            keyboard = create_poderes_menu_keyboard()
-            await query.message.edit_text(
-                "⚡ Menu de Poderes: ⚡",
-                reply_markup=keyboard,
-            )
+        # Main menu options
+        router.add_exact("magias_menu", self._on_magias_menu)
+        router.add_exact("regras_menu", self._on_regras_menu)
+        router.add_exact("poderes_menu", self._on_poderes_menu)
+        router.add_exact("back_to_main", self._on_back_to_main)
 
         # Magias submenu options
-        elif query.data == "search_spells":
-            await query.message.reply_text(
-                "✨ Digite o nome da magia que deseja buscar: ✨"
-            )
-            context.user_data["state"] = "searching_spells"
-
-        elif query.data == "list_magias_options":
-            keyboard = create_list_magias_options_keyboard()
-            await query.message.reply_text(
-                "🎇 Como deseja listar as magias?",
-                reply_markup=keyboard,
-            )
-
-        elif query.data == "list_spells":
-            await self.list_all_spells(query.message, context)
-
-        elif query.data == "list_spells_by_type":
-            keyboard = create_spell_types_keyboard()
-            await query.message.reply_text(
-                "✨ Escolha o tipo de magia:✨",
-                reply_markup=keyboard,
-            )
-
-        elif query.data.startswith("spell_type_"):
-            spell_type = query.data[11:]  # Remove "spell_type_" prefix
-            await self.list_spells_by_type(query.message, context, spell_type)
-
-        elif query.data.startswith("level_"):
-            level = int(query.data[6:])  # Remove "level_" prefix
-            await self.list_spells_for_level(query.message, context, level)
+        router.add_exact("search_spells", self._on_search_spells)
+        router.add_exact("list_magias_options", self._on_list_magias_options)
+        router.add_exact("list_spells", self._on_list_spells)
+        router.add_exact("list_spells_by_type", self._on_list_spells_by_type)
+        router.add_prefix("spell_type_", self._on_spell_type)
+        router.add_prefix("level_", self._on_level)
 
         # Regras submenu options
-        elif query.data == "list_rules":
-            await self.list_all_rules(query.message, context)
-
-        elif query.data == "rules":
-            await query.message.reply_text(
-                "🔍 Digite o termo de regra que deseja buscar:"
-            )
-            context.user_data["state"] = "searching_rules"
+        router.add_exact("list_rules", self._on_list_rules)
+        router.add_exact("rules", self._on_search_rules)
 
         # Poderes submenu options
-        elif query.data == "list_powers":
-            keyboard = create_powers_list_keyboard()
-            await query.message.reply_text(
-                "📖 Escolha o tipo de poderes para listar:",
-                reply_markup=keyboard,
-            )
+        router.add_exact("list_powers", self._on_list_powers)
+        router.add_prefix("list_powers_", self._on_list_powers_type)
+        router.add_exact("powers_race_list", self._on_race_list)
+        router.add_exact("powers_class_list", self._on_class_list)
+        router.add_prefix("powers_race_", self._on_race_powers)
+        router.add_prefix("powers_class_", self._on_class_powers)
+        router.add_prefix("powers_", self._on_powers_type)
+
+        router.add_prefix("page_", self._on_page)
+        router.add_exact("noop", self._on_noop)
+        # Title buttons of messages sent before they used "noop"
+        router.add_exact("header", self._on_noop)
+        router.add_prefix("search_again_", self._on_search_again)
+
+        # Name-based details from buttons sent before the compact entity payloads
+        router.add_prefix("spell_", self._on_spell_name)
+        router.add_prefix("rule_", self._on_rule_name)
+        router.add_prefix("power_", self._on_power_name)
+        return router
+
+    @instrumented("callback")
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle button presses."""
+        query = update.callback_query
+        await query.answer()
+        if not await self.router.dispatch(query.data, query, context):
+            label_update(outcome=MISS)
 
-        elif query.data.startswith("list_powers_"):
-            power_type = query.data.split("_")[2]
-            await self.list_powers_by_type(query.message, context, power_type)
+    async def _on_spell_id(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        entity = decode_entity(SPELL + payload)
+        if entity is not None:
+            await self.show_spell_details(query.message, context, self.spell_service.get_spell_by_id(entity[1]))
 
-        elif query.data == "powers_race_list":
-            keyboard = create_race_list_keyboard()
-            await query.message.edit_text(
-                "🧌 Escolha uma raça:🧌",
-                reply_markup=keyboard,
-            )
+    async def _on_rule_id(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        entity = decode_entity(RULE + payload)
+        if entity is not None:
+            await self.show_rule_details(query.message, context, self.rule_service.get_rule_by_id(entity[1]))
 
-        elif query.data == "powers_class_list":
-            keyboard = create_class_list_keyboard()
-            await query.message.edit_text(
-                "🧙 Escolha uma classe:🏹",
-                reply_markup=keyboard,
-            )
+    async def _on_power_id(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        entity = decode_entity(POWER + payload)
+        if entity is not None:
+            await self.show_power_details(query.message, context, self.power_service.get_power_by_id(entity[1]))
 
-        elif query.data.startswith("powers_"):
-            parts = query.data.split("_")
-            power_type = parts[1]
-
-            # Handle race and class specific selections
-            if power_type == "race" and len(parts) > 2:
-                race_name = parts[2]
-                await query.message.edit_text(
-                    f"Poderes da raça {race_name}:",
-                    reply_markup=create_power_results_race_keyboard(
-                        self.power_service.get_powers_by_race(race_name), "race"
-                    ),
-                )
-            elif power_type == "class" and len(parts) > 2:
-                class_name = parts[2]
-                await query.message.edit_text(
-                    f"Poderes da classe {class_name}:",
-                    reply_markup=create_power_results_class_keyboard(
-                        self.power_service.get_powers_by_class(class_name), "class"
-                    ),
-                )
-            else:
-                # Handle other power types
-                await self.list_powers_by_type(query.message, context, power_type)
-
-        elif query.data.startswith("search_again_"):
-            search_state = query.data[12:]  # Remove "search_again_" prefix
-            context.user_data["state"] = search_state
-
-            if search_state == "searching_spells":
-                await query.message.reply_text("✨ Digite o nome da magia que deseja buscar:")
-            elif search_state == "searching_rules":
-                await query.message.reply_text("📖 Digite o termo de regra que deseja buscar:")
-            elif search_state.startswith("searching_powers_"):
-                power_type = search_state.split("_")[2]
-                type_name = {
-                    "class": "classe",
-                    "race": "raça",
-                    "origin": "origem",
-                    "tormenta": "tormenta",
-                    "combate": "combate",
-                    "destino": "destino",
-                    "magia": "magia",
-                    "concedidas": "concedidas",
-                    "grupo": "grupo"
-                }.get(power_type, power_type)
-                await query.message.reply_text(f"Digite o nome do poder de {type_name} que deseja buscar:")
-
-        elif query.data == "back_to_main":
-            keyboard = create_main_menu_keyboard()
-            await query.message.edit_text(
-                "🎲 Bem-vindo ao Bot de Tormenta 20! Escolha uma opção:🎲",
-                reply_markup=keyboard,
-            )
+    async def _on_magias_menu(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_magias_menu_keyboard()
+        await self.show(query.message, context, " 🧙‍♂️ Menu de Magias:🧙‍♂️ ", keyboard, edit=True)
 
-        elif query.data.startswith("spell_"):
-            spell_name = query.data[6:]  # Remove "spell_" prefix
-            await self.show_spell_details(query.message, spell_name)
+    async def _on_regras_menu(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_regras_menu_keyboard()
+        await self.show(query.message, context, "📖 Menu de Regras: 📖", keyboard, edit=True)
 
-        elif query.data.startswith("rule_"):
-            rule_name = query.data[5:]  # Remove "rule_" prefix
-            await self.show_rule_details(query.message, rule_name)
+    async def _on_poderes_menu(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_poderes_menu_keyboard()
+        await self.show(query.message, context, "⚡ Menu de Poderes: ⚡", keyboard, edit=True)
 
-        elif query.data.startswith("power_"):
-            # Format: power_type_name
-            parts = query.data.split("_", 2)
-            if len(parts) == 3:
-                power_type = parts[1]
-                power_name = parts[2]
-                await self.show_power_details(query.message, power_type, power_name)
+    async def _on_back_to_main(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_main_menu_keyboard()
+        await self.show(
+            query.message, context, "🎲 Bem-vindo ao Bot de Tormenta 20! Escolha uma opção:🎲", keyboard, edit=True
+        )
+
+    async def _on_search_spells(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.show(query.message, context, "✨ Digite o nome da magia que deseja buscar: ✨")
+        context.user_data["state"] = "searching_spells"
+
+    async def _on_list_magias_options(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_list_magias_options_keyboard()
+        await self.show(query.message, context, "🎇 Como deseja listar as magias?", keyboard)
+
+    async def _on_list_spells(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.list_all_spells(query.message, context)
+
+    async def _on_list_spells_by_type(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_spell_types_keyboard()
+        await self.show(query.message, context, "✨ Escolha o tipo de magia:✨", keyboard)
+
+    async def _on_spell_type(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.list_spells_by_type(query.message, context, payload)
+
+    async def _on_level(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        if payload.isdigit():
+            await self.list_spells_for_level(query.message, context, int(payload))
+
+    async def _on_list_rules(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.list_all_rules(query.message, context)
+
+    async def _on_search_rules(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.show(query.message, context, "🔍 Digite o termo de regra que deseja buscar:")
+        context.user_data["state"] = "searching_rules"
+
+    async def _on_list_powers(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_powers_list_keyboard()
+        await self.show(query.message, context, "📖 Escolha o tipo de poderes para listar:", keyboard)
+
+    async def _on_list_powers_type(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.list_powers_by_type(query.message, context, payload)
+
+    async def _on_race_list(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_race_list_keyboard()
+        await self.show(query.message, context, "🧌 Escolha uma raça:🧌", keyboard, edit=True)
+
+    async def _on_class_list(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_class_list_keyboard()
+        await self.show(query.message, context, "🧙 Escolha uma classe:🏹", keyboard, edit=True)
+
+    async def _on_race_powers(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_race_powers_keyboard(self.power_service.get_powers_by_race(payload), payload)
+        await self.show(query.message, context, f"Poderes da raça {payload}:", keyboard, edit=True)
+
+    async def _on_class_powers(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        keyboard = create_class_powers_keyboard(self.power_service.get_powers_by_class(payload), payload)
+        await self.show(query.message, context, f"Poderes da classe {payload}:", keyboard, edit=True)
+
+    async def _on_powers_type(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.list_powers_by_type(query.message, context, payload)
+
+    async def _on_page(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        # Format: list_number_argument
+        parts = payload.split("_", 2)
+        if len(parts) == 3 and parts[1].isdigit():
+            await self.change_page(query.message, parts[0], parts[2], int(parts[1]))
+
+    async def _on_noop(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        # The page counter between the navigation buttons and the title buttons of spell lists; answering the
+        # query already stopped the spinner
+        pass
+
+    async def _on_search_again(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        search_state = payload
+        context.user_data["state"] = search_state
+
+        if search_state == "searching_spells":
+            await self.show(query.message, context, "✨ Digite o nome da magia que deseja buscar:")
+        elif search_state == "searching_rules":
+            await self.show(query.message, context, "📖 Digite o termo de regra que deseja buscar:")
+        elif search_state.startswith("searching_powers_"):
+            power_type = search_state.split("_")[2]
+            type_name = POWER_TYPE_NAMES.get(power_type, power_type)
+            await self.show(query.message, context, f"Digite o nome do poder de {type_name} que deseja buscar:")
+
+    async def _on_spell_name(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.show_spell_details(query.message, context, self.spell_service.get_spell_details(payload))
+
+    async def _on_rule_name(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        await self.show_rule_details(query.message, context, self.rule_service.get_rule_details(payload))
+
+    async def _on_power_name(self, query: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, payload: str) -> None:
+        # Format: type_name
+        parts = payload.split("_", 1)
+        if len(parts) == 2:
+            power = self.power_service.get_power_details(parts[0], parts[1])
+            await self.show_power_details(query.message, context, power)
+
+    async def change_page(self, message: Message, list_name: str, arg: str, page: int) -> None:
+        """Show another page of a paginated list in place."""
+        if list_name == "powers":
+            keyboard = create_powers_by_type_keyboard(self.power_service.get_sorted_powers_by_type(arg), arg, page)
+        elif list_name == "class":
+            keyboard = create_class_powers_keyboard(self.power_service.get_powers_by_class(arg), arg, page)
+        elif list_name == "race":
+            keyboard = create_race_powers_keyboard(self.power_service.get_powers_by_race(arg), arg, page)
+        elif list_name == "spelltype":
+            keyboard = create_spells_by_type_keyboard(self.spell_service.get_sorted_spells_by_type(arg), arg, page)
+        elif list_name == "level" and arg.isdigit():
+            level = int(arg)
+            keyboard = create_spells_for_level_keyboard(self.spell_service.get_sorted_spells_by_level(level), level, page)
+        elif list_name == "rules":
+            keyboard = create_rules_keyboard(self.rule_service.get_sorted_rules(), page)
+        else:
+            return
+
+        await message.edit_reply_markup(reply_markup=keyboard)
 
     async def list_all_spells(self, message: Message, context: ContextTypes.DEFAULT_TYPE) -> None:
         """List all spells with their names and levels."""
-        spells = self.spell_service.get_all_spells()
+        spells_by_level = self.spell_service.get_spells_grouped_by_level()
 
-        if not spells:
+        if not spells_by_level:
             await message.reply_text("Desculpe, não foi possível carregar a lista de magias.")
             return
 
-        # Group spells by level
-        spells_by_level = {}
-        for spell in spells:
-            level = spell.level
-            if level not in spells_by_level:
-                spells_by_level[level] = []
-            spells_by_level[level].append(spell.name)
-
         keyboard = create_spells_by_level_keyboard(spells_by_level)
 
-        await message.reply_text(
-            "Lista de Magias por Nível:",
-            reply_markup=keyboard,
-        )
+        await self.show(message, context, "Lista de Magias por Nível:", keyboard)
 
     async def list_spells_by_type(self, message: Message, context: ContextTypes.DEFAULT_TYPE, spell_type: str) -> None:
         """List all spells of a specific type."""
-        spells = self.spell_service.get_spells_by_type(spell_type)
+        spells = self.spell_service.get_sorted_spells_by_type(spell_type)
 
         if not spells:
             await message.reply_text(f"Desculpe, não foi possível encontrar magias do tipo {spell_type}.")
@@ -254,30 +353,23 @@ class CallbackHandlers:
 
         keyboard = create_spells_by_type_keyboard(spells, spell_type)
 
-        await message.reply_text(
-            f"Lista de Magias do tipo {spell_type}:",
-            reply_markup=keyboard,
-        )
+        await self.show(message, context, f"Lista de Magias do tipo {spell_type}:", keyboard)
 
     async def list_spells_for_level(self, message: Message, context: ContextTypes.DEFAULT_TYPE, level: int) -> None:
         """List all spells of a specific level."""
-        spells = self.spell_service.get_spells_by_level(level)
+        spells = self.spell_service.get_sorted_spells_by_level(level)
 
         if not spells:
             await message.reply_text(f"Desculpe, não foi possível encontrar magias de nível {level}.")
             return
 
-        spell_names = [spell.name for spell in spells]
-        keyboard = create_spells_for_level_keyboard(spell_names, level)
+        keyboard = create_spells_for_level_keyboard(spells, level)
 
-        await message.reply_text(
-            f"Lista de Magias de Nível {level}:",
-            reply_markup=keyboard,
-        )
+        await self.show(message, context, f"Lista de Magias de Nível {level}:", keyboard)
 
     async def list_all_rules(self, message: Message, context: ContextTypes.DEFAULT_TYPE) -> None:
         """List all rules."""
-        rules = self.rule_service.get_all_rules()
+        rules = self.rule_service.get_sorted_rules()
 
         if not rules:
             await message.reply_text("Desculpe, não foi possível carregar a lista de regras.")
@@ -285,101 +377,106 @@ class CallbackHandlers:
 
         keyboard = create_rules_keyboard(rules)
 
-        await message.reply_text(
-            "Lista de Regras:",
-            reply_markup=keyboard,
-        )
+        await self.show(message, context, "Lista de Regras:", keyboard)
 
     async def list_powers_by_type(self, message: Message, context: ContextTypes.DEFAULT_TYPE, power_type: str) -> None:
         """List all powers of a specific type."""
-        powers = self.power_service.get_all_powers_by_type(power_type)
+        powers = self.power_service.get_sorted_powers_by_type(power_type)
 
         if not powers:
-            type_name = {
-                "class": "classe",
-                "race": "raça",
-                "origin": "origem",
-                "tormenta": "tormenta",
-                "combate": "combate",
-                "destino": "destino",
-                "magia": "magia",
-                "concedidas": "concedidas",
-                "grupo": "grupo"
-            }.get(power_type, power_type)
+            type_name = POWER_TYPE_NAMES.get(power_type, power_type)
             await message.reply_text(f"Desculpe, não foi possível carregar a lista de poderes de {type_name}.")
             return
 
         keyboard = create_powers_by_type_keyboard(powers, power_type)
 
-        type_name = {
-            "class": "Classe",
-            "race": "Raça",
-            "origin": "Origem",
-            "tormenta": "Tormenta",
-            "combate": "Combate",
-            "destino": "Destino",
-            "magia": "Magia",
-            "concedidas": "Concedidas",
-            "grupo": "Grupo"
-        }.get(power_type, power_type.capitalize())
-
-        await message.reply_text(
-            f"Lista de Poderes de {type_name}:",
-            reply_markup=keyboard,
-        )
+        type_name = POWER_TYPE_NAMES.get(power_type, power_type).capitalize()
 
-    async def show_spell_details(self, message: Message, spell_name: str) -> None:
-        """Show details for a specific spell."""
-        spell = self.spell_service.get_spell_details(spell_name)
+        await self.show(message, context, f"Lista de Poderes de {type_name}:", keyboard)
 
+    async def show_spell_details(self, message: Message, context: ContextTypes.DEFAULT_TYPE,
+                                 spell: Optional[Spell]) -> None:
+        """Show details for a specific spell."""
+        label_update(entity="spell")
         if spell:
-            formatted_message = format_spell_details(spell)
-            keyboard = [
-                [InlineKeyboardButton("🔙 Voltar", callback_data="magias_menu")],
-                [InlineKeyboardButton("🔙 Voltar ao Menu Principal", callback_data="back_to_main")]
-            ]
-            await message.reply_text(formatted_message, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(keyboard))
+            await self.send_details(message, context, render_spell_details(spell), create_spell_details_keyboard())
         else:
-            await message.reply_text(f"Desculpe, não encontrei detalhes para a magia '{spell_name}'.")
+            label_update(outcome=MISS)
+            await message.reply_text("Desculpe, não encontrei detalhes para esta magia.")
 
-    async def show_rule_details(self, message: Message, rule_name: str) -> None:
+    async def show_rule_details(self, message: Message, context: ContextTypes.DEFAULT_TYPE,
+                                rule: Optional[Rule]) -> None:
         """Show details for a specific rule."""
-        rule = self.rule_service.get_rule_details(rule_name)
-
+        label_update(entity="rule")
         if rule:
-            formatted_message = format_rule_details(rule)
-            keyboard = [
-                [InlineKeyboardButton("🔙 Voltar", callback_data="regras_menu")],
-                [InlineKeyboardButton("🔙 Voltar ao Menu Principal", callback_data="back_to_main")]
-            ]
-            await message.reply_text(formatted_message, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(keyboard))
+            await self.send_details(message, context, render_rule_details(rule), create_rule_details_keyboard())
         else:
-            await message.reply_text(f"Desculpe, não encontrei detalhes para a regra '{rule_name}'.")
+            label_update(outcome=MISS)
+            await message.reply_text("Desculpe, não encontrei detalhes para esta regra.")
 
-    async def show_power_details(self, message: Message, power_type: str, power_name: str) -> None:
+    async def show_power_details(self, message: Message, context: ContextTypes.DEFAULT_TYPE,
+                                 power: Optional[Power]) -> None:
         """Show details for a specific power."""
-        power = self.power_service.get_power_details(power_type, power_name)
-
+        label_update(entity="power")
         if power:
-            formatted_message = format_power_details(power)
-            keyboard = [
-                [InlineKeyboardButton("🔙 Voltar", callback_data="poderes_menu")],
-                [InlineKeyboardButton("🔙 Voltar ao Menu Principal", callback_data="back_to_main")]
-            ]
-            await message.reply_text(formatted_message, parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(keyboard))
+            await self.send_details(message, context, render_power_details(power), create_power_details_keyboard())
         else:
-            type_name = {
-                "class": "classe",
-                "race": "raça",
-                "origin": "origem",
-                "tormenta": "tormenta",
-                "combate": "combate",
-                "destino": "destino",
-                "magia": "magia",
-                "concedidas": "concedidas",
-                "grupo": "grupo"
-            }.get(power_type, power_type)
-            await message.reply_text(f"Desculpe, não encontrei detalhes para o poder de {type_name} '{power_name}'.")
+            label_update(outcome=MISS)
+            await message.reply_text("Desculpe, não encontrei detalhes para este poder.")
+
+    async def send_details(self, message: MaybeInaccessibleMessage, context: ContextTypes.DEFAULT_TYPE,
+                           chunks: Sequence[str], keyboard: InlineKeyboardMarkup) -> None:
+        """Show pre-rendered detail chunks, the first one in place, with the keyboard under the last one."""
+        if len(chunks) == 1:
+            await self.show(message, context, chunks[0], keyboard, ParseMode.MARKDOWN_V2)
+            return
+        await self.show(message, context, chunks[0], parse_mode=ParseMode.MARKDOWN_V2)
+        for chunk in chunks[1:-1]:
+            await self.send(message, context, chunk, parse_mode=ParseMode.MARKDOWN_V2)
+        await self.send(message, context, chunks[-1], keyboard, ParseMode.MARKDOWN_V2)
+
+    async def show(self, message: MaybeInaccessibleMessage, context: ContextTypes.DEFAULT_TYPE, text: str,
+                   reply_markup: Optional[InlineKeyboardMarkup] = None, parse_mode: Optional[str] = None,
+                   edit: Optional[bool] = None) -> None:
+        """Show a screen in place of the pressed message, sending a new message only when it can't be edited.
+
+        edit defaults to the edit_in_place setting. The buttons of a message the
+        bot can no longer read edit the last message shown in the chat instead.
+        """
+        if edit is None:
+            edit = self.edit_in_place
+        if edit:
+            message_id = message.message_id if message.is_accessible else context.chat_data.get(NAV_MESSAGE_KEY)
+            if message_id is not None:
+                try:
+                    if message.is_accessible:
+                        await message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+                    else:
+                        await context.bot.edit_message_text(
+                            text, chat_id=message.chat.id, message_id=message_id,
+                            parse_mode=parse_mode, reply_markup=reply_markup,
+                        )
+                    context.chat_data[NAV_MESSAGE_KEY] = message_id
+                    return
+                except BadRequest as e:
+                    # Pressing the button of the screen already shown changes nothing
+                    if "not modified" in e.message:
+                        context.chat_data[NAV_MESSAGE_KEY] = message_id
+                        return
+                    # Deleted, too old or not a text message
+                    logger.debug(f"Can't edit message {message_id} in chat {message.chat.id}, sending instead: {e}")
+        await self.send(message, context, text, reply_markup, parse_mode)
+
+    async def send(self, message: MaybeInaccessibleMessage, context: ContextTypes.DEFAULT_TYPE, text: str,
+                   reply_markup: Optional[InlineKeyboardMarkup] = None, parse_mode: Optional[str] = None) -> None:
+        """Send a screen as a new message, which becomes the one shown in the chat."""
+        if message.is_accessible:
+            sent = await message.reply_text(text, parse_mode=parse_mode, reply_markup=reply_markup)
+        else:
+            sent = await context.bot.send_message(
+                message.chat.id, text, parse_mode=parse_mode, reply_markup=reply_markup
+            )
+        context.chat_data[NAV_MESSAGE_KEY] = sent.message_id
 
 class MessageHandlers:
     def __init__(self, spell_service: SpellService, rule_service: RuleService, power_service: PowerService):
@@ -387,6 +484,7 @@ class MessageHandlers:
         self.rule_service = rule_service
         self.power_service = power_service
 
+    @instrumented("message", route="no_state")
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle user messages based on the current state."""
         if "state" not in context.user_data:
@@ -396,72 +494,148 @@ class MessageHandlers:
 
         state = context.user_data["state"]
         text = update.message.text.lower()
+        label_update(route=get_search_route(state))
 
         if state == "searching_spells":
+            label_update(entity="spell")
             matching_spells = self.spell_service.search_spells(text)
 
             if matching_spells:
-                keyboard = create_spell_results_keyboard([spell.name for spell in matching_spells])
+                keyboard = create_spell_results_keyboard(matching_spells)
 
                 await update.message.reply_text(
                     f"Resultados para '{text}':",
                     reply_markup=keyboard,
                 )
             else:
-                keyboard = create_search_again_keyboard("searching_spells")
-                await update.message.reply_text(
-                    f"Nenhuma magia encontrada para '{text}'.",
-                    reply_markup=keyboard
+                suggestions = self.spell_service.suggest_spells(text)
+                await self.reply_no_results(
+                    update.message, f"Nenhuma magia encontrada para '{text}'.", suggestions, SPELL, state
                 )
                 return  # Don't reset state yet
 
         elif state == "searching_rules":
+            label_update(entity="rule")
             matching_rules = self.rule_service.search_rules(text)
 
             if matching_rules:
                 keyboard = create_rule_results_keyboard(matching_rules)
 
                 await update.message.reply_text(
-                    f"Resultados para '{text}':",
+                    format_search_results(text, matching_rules),
+                    parse_mode=ParseMode.MARKDOWN_V2,
                     reply_markup=keyboard,
                 )
             else:
-                keyboard = create_search_again_keyboard("searching_rules")
-                await update.message.reply_text(
-                    f"Nenhuma regra encontrada para '{text}'.",
-                    reply_markup=keyboard
+                suggestions = self.rule_service.suggest_rules(text)
+                await self.reply_no_results(
+                    update.message, f"Nenhuma regra encontrada para '{text}'.", suggestions, RULE, state
                 )
                 return  # Don't reset state yet
 
         elif state.startswith("searching_powers_"):
             power_type = state.split("_")[2]
+            label_update(entity="power")
             matching_powers = self.power_service.search_powers(power_type, text)
 
             if matching_powers:
                 keyboard = create_power_results_keyboard(matching_powers, power_type)
 
                 await update.message.reply_text(
-                    f"Resultados para '{text}':",
+                    format_search_results(text, matching_powers),
+                    parse_mode=ParseMode.MARKDOWN_V2,
                     reply_markup=keyboard,
                 )
             else:
-                type_name = {
-                    "class": "classe",
-                    "race": "raça",
-                    "origin": "origem",
-                    "tormenta": "tormenta",
-                    "combate": "combate",
-                    "destino": "destino",
-                    "magia": "magia",
-                    "concedidas": "concedidas",
-                    "grupo": "grupo"
-                }.get(power_type, power_type)
-                keyboard = create_search_again_keyboard(state)
-                await update.message.reply_text(
-                    f"Nenhum poder de {type_name} encontrado para '{text}'.",
-                    reply_markup=keyboard
+                type_name = POWER_TYPE_NAMES.get(power_type, power_type)
+                suggestions = self.power_service.suggest_powers(power_type, text)
+                await self.reply_no_results(
+                    update.message, f"Nenhum poder de {type_name} encontrado para '{text}'.", suggestions, POWER, state
                 )
                 return  # Don't reset state yet
 
         # Reset state only if we found results
         context.user_data["state"] = None
+
+    async def reply_no_results(self, message: Message, text: str, suggestions: List[Any], kind: str,
+                               search_state: str) -> None:
+        """Tell the user a search found nothing, offering similar names when there are any."""
+        label_update(outcome=MISS)
+        if suggestions:
+            keyboard = create_suggestions_keyboard(suggestions, kind, search_state)
+            await message.reply_text(f"{text} Você quis dizer:", reply_markup=keyboard)
+        else:
+            keyboard = create_search_again_keyboard(search_state)
+            await message.reply_text(text, reply_markup=keyboard)
+
+class InlineQueryHandlers:
+    def __init__(self, spell_service: SpellService, rule_service: RuleService, power_service: PowerService):
+        self.spell_service = spell_service
+        self.rule_service = rule_service
+        self.power_service = power_service
+        # Result pages by normalized query
+        self.cache = LRUCache(maxsize=INLINE_CACHE_SIZE)
+
+    @instrumented("inline", route="inline")
+    async def handle_inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Answer an inline query with one page of matching spells, rules and powers."""
+        inline_query = update.inline_query
+        query = " ".join(fold_text(inline_query.query).split())
+        pages = self.cache.get(query)
+        if pages is None:
+            pages = self.build_pages(query)
+            self.cache.put(query, pages)
+
+        page = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+        results = pages[page] if page < len(pages) else ()
+        next_offset = str(page + 1) if page + 1 < len(pages) else ""
+        if not results:
+            label_update(outcome=MISS)
+        await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, next_offset=next_offset)
+
+    def build_pages(self, query: str) -> Tuple[Tuple[InlineQueryResultArticle, ...], ...]:
+        """Search every repository and split the results into pages of articles."""
+        if not query:
+            return ()
+
+        results = [self.spell_article(spell) for spell in self.spell_service.search_spells(query)]
+        results.extend(self.rule_article(rule) for rule in self.rule_service.search_rules(query, INLINE_RESULT_LIMIT))
+        for power_type in POWER_TYPE_NAMES:
+            if len(results) >= INLINE_RESULT_LIMIT:
+                break
+            powers = self.power_service.search_powers(power_type, query, INLINE_RESULT_LIMIT)
+            results.extend(self.power_article(power) for power in powers)
+        results = results[:INLINE_RESULT_LIMIT]
+
+        return tuple(
+            tuple(results[start:start + InlineQueryLimit.RESULTS])
+            for start in range(0, len(results), InlineQueryLimit.RESULTS)
+        )
+
+    @staticmethod
+    def _article(kind: str, entity, description: str, chunks: Sequence[str]) -> InlineQueryResultArticle:
+        # Long details are cut to their first chunk, the full text is one tap away in the bot
+        return InlineQueryResultArticle(
+            id=encode_entity(kind, entity.id),
+            title=entity.name,
+            description=description,
+            input_message_content=InputTextMessageContent(chunks[0], parse_mode=ParseMode.MARKDOWN_V2),
+        )
+
+    def spell_article(self, spell: Spell) -> InlineQueryResultArticle:
+        """Create the inline result of a spell."""
+        return self._article(SPELL, spell, f"Magia {spell.type} de {spell.level}º círculo · {spell.school}",
+                             render_spell_details(spell))
+
+    def rule_article(self, rule: Rule) -> InlineQueryResultArticle:
+        """Create the inline result of a rule."""
+        return self._article(RULE, rule, f"Regra · {rule.category}", render_rule_details(rule))
+
+    def power_article(self, power: Power) -> InlineQueryResultArticle:
+        """Create the inline result of a power."""
+        type_name = POWER_TYPE_NAMES.get(power.power_type, power.power_type)
+        return self._article(POWER, power, f"Poder de {type_name}", render_power_details(power))
+
+    def clear_cache(self) -> None:
+        """Drop the cached result pages, e.g. after the data changes."""
+        self.cache.clear()
@@ -0,0 +1,91 @@
+"""Handler and Bot API metrics collection."""
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+from ..utils.metrics import HANDLER_UPDATES, HANDLER_DURATION, BOT_API_REQUESTS, BOT_API_DURATION
+from ..utils.profiling import PROFILER
+
+# Outcomes of a handled update
+HIT = "hit"
+MISS = "miss"
+ERROR = "error"
+
+# Labels of the update being handled in the current task, None outside an instrumented handler
+_labels: ContextVar[Optional[Dict[str, str]]] = ContextVar("update_labels", default=None)
+
+def instrumented(handler: str, route: str = "") -> Callable:
+    """Count and time every call of an update handler, profiling it when the profiler samples it.
+
+    The outcome is a hit unless the handler raises or changes it with
+    label_update, which also sets the route and entity type as they are known.
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _labels.get() is not None:
+                # Called by another instrumented handler, which already records this update
+                return await func(*args, **kwargs)
+
+            labels = {"route": route, "entity": "none", "outcome": HIT}
+            token = _labels.set(labels)
+            profile = PROFILER.begin()
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                labels["outcome"] = ERROR
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                _labels.reset(token)
+                values = (handler, labels["route"], labels["entity"], labels["outcome"])
+                HANDLER_UPDATES.inc(*values)
+                HANDLER_DURATION.observe(elapsed, *values)
+                if profile is not None:
+                    PROFILER.end(profile, f"{handler}:{labels['route']}")
+        return wrapper
+    return decorator
+
+def label_update(**labels: str) -> None:
+    """Set the route, entity or outcome label of the update being handled, if any."""
+    current = _labels.get()
+    if current is not None:
+        current.update(labels)
+
+class InstrumentedRequest(BaseRequest):
+    """Bot transport that times every Bot API request of another transport."""
+
+    def __init__(self, request: BaseRequest):
+        self.request = request
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.request.read_timeout
+
+    async def initialize(self) -> None:
+        await self.request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.request.shutdown()
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=BaseRequest.DEFAULT_NONE, write_timeout=BaseRequest.DEFAULT_NONE,
+                         connect_timeout=BaseRequest.DEFAULT_NONE, pool_timeout=BaseRequest.DEFAULT_NONE
+                         ) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            code, payload = await self.request.do_request(
+                url, method, request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+                connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+            )
+            outcome = "ok" if code == 200 else "error"
+            return code, payload
+        finally:
+            BOT_API_REQUESTS.inc(api_method, outcome)
+            BOT_API_DURATION.observe(time.perf_counter() - start, api_method)
@@ -1,8 +1,113 @@
+import functools
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from typing import List, Dict, Any
-from ..domain.models import Spell
-
-
+from typing import List, Dict, Any, Callable, Hashable, Optional, Sequence, Tuple
+from config.settings import KEYBOARD_CACHE_SIZE, KEYBOARD_PAGE_SIZE
+from ..domain.models import Spell, Rule, Power
+from ..domain.constants import RACE_NAMES, CLASS_NAMES
+from .callback_data import SPELL, RULE, POWER, encode_entity
+from ..utils.cache import LRUCache
+
+_static_keyboards: List[Callable[[], InlineKeyboardMarkup]] = []
+_cached_keyboards: List[Callable[..., InlineKeyboardMarkup]] = []
+
+def _cache_key(value: Any) -> Hashable:
+    """Turn a keyboard argument into a hashable cache key."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, _cache_key(item)) for key, item in value.items())
+    if hasattr(value, "id"):
+        # Spells, rules and powers are identified by their id
+        return type(value).__name__, value.id
+    return value
+
+def static_keyboard(function: Callable[[], InlineKeyboardMarkup]) -> Callable[[], InlineKeyboardMarkup]:
+    """Build a keyboard without arguments once and reuse it on every call."""
+    cache = LRUCache(maxsize=1)
+
+    @functools.wraps(function)
+    def wrapper() -> InlineKeyboardMarkup:
+        keyboard = cache.get(None)
+        if keyboard is None:
+            keyboard = function()
+            cache.put(None, keyboard)
+        return keyboard
+
+    wrapper.cache = cache
+    _static_keyboards.append(wrapper)
+    return wrapper
+
+def cached_keyboard(key: Optional[Callable[..., Hashable]] = None):
+    """Memoize a data-driven keyboard by its arguments.
+
+    A custom key function may be given when fewer arguments are enough to
+    identify the keyboard for the loaded data, e.g. the power type of a full
+    power listing. The cache must be cleared when the data changes.
+    """
+    def decorator(function: Callable[..., InlineKeyboardMarkup]) -> Callable[..., InlineKeyboardMarkup]:
+        cache = LRUCache(maxsize=KEYBOARD_CACHE_SIZE)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs) -> InlineKeyboardMarkup:
+            if key is not None:
+                cache_key = key(*args, **kwargs)
+            else:
+                cache_key = (_cache_key(args), _cache_key(tuple(sorted(kwargs.items()))))
+            keyboard = cache.get(cache_key)
+            if keyboard is None:
+                keyboard = function(*args, **kwargs)
+                cache.put(cache_key, keyboard)
+            return keyboard
+
+        wrapper.cache = cache
+        _cached_keyboards.append(wrapper)
+        return wrapper
+
+    return decorator
+
+def _get_page(items: Sequence[Any], page: int) -> Tuple[Sequence[Any], int, int]:
+    """Get the items of a page, the page number clamped to range and the page count."""
+    page_count = max(1, -(-len(items) // KEYBOARD_PAGE_SIZE))
+    page = min(max(page, 0), page_count - 1)
+    start = page * KEYBOARD_PAGE_SIZE
+    return items[start:start + KEYBOARD_PAGE_SIZE], page, page_count
+
+def _create_page_navigation(list_name: str, arg: Any, page: int, page_count: int) -> List[InlineKeyboardButton]:
+    """Create the first/previous/next/last buttons of a paginated list."""
+    if page_count <= 1:
+        return []
+
+    def page_button(text: str, target: int) -> InlineKeyboardButton:
+        return InlineKeyboardButton(text, callback_data=f"page_{list_name}_{target}_{arg}")
+
+    row = []
+    if page > 0:
+        row.append(page_button("⏮", 0))
+        row.append(page_button("◀️", page - 1))
+    row.append(InlineKeyboardButton(f"{page + 1}/{page_count}", callback_data="noop"))
+    if page < page_count - 1:
+        row.append(page_button("▶️", page + 1))
+        row.append(page_button("⏭", page_count - 1))
+    return row
+
+def build_static_keyboards() -> None:
+    """Build every static menu keyboard ahead of the first button press."""
+    for create_keyboard in _static_keyboards:
+        create_keyboard()
+
+def clear_keyboard_cache() -> None:
+    """Drop the memoized data-driven keyboards, e.g. after the data changes."""
+    for create_keyboard in _cached_keyboards:
+        create_keyboard.cache.clear()
+
+def get_keyboard_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Get the cache hit and miss counters of every keyboard function."""
+    return {
+        create_keyboard.__name__: create_keyboard.cache.stats()
+        for create_keyboard in _static_keyboards + _cached_keyboards
+    }
+
+@static_keyboard
 def create_main_menu_keyboard() -> InlineKeyboardMarkup:
     """Create the main menu keyboard with centered buttons and emojis."""
     keyboard = [
@@ -12,6 +117,7 @@ def create_main_menu_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_magias_menu_keyboard() -> InlineKeyboardMarkup:
     """Create the magias (spells) menu keyboard."""
     keyboard = [
@@ -21,6 +127,7 @@ def create_magias_menu_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_regras_menu_keyboard() -> InlineKeyboardMarkup:
     """Create the regras (rules) menu keyboard."""
     keyboard = [
@@ -30,6 +137,7 @@ def create_regras_menu_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_poderes_menu_keyboard() -> InlineKeyboardMarkup:
     """Create the poderes (powers) menu keyboard."""
     keyboard = [
@@ -45,6 +153,7 @@ def create_poderes_menu_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_list_magias_options_keyboard() -> InlineKeyboardMarkup:
     """Create a keyboard for selecting how to list spells."""
     keyboard = [
@@ -55,6 +164,7 @@ def create_list_magias_options_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_powers_menu_keyboard() -> InlineKeyboardMarkup:
     """Create the powers search menu keyboard."""
     keyboard = [
@@ -66,52 +176,66 @@ def create_powers_menu_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_spell_results_keyboard(spells: List[str]) -> InlineKeyboardMarkup:
+@cached_keyboard()
+def create_spell_results_keyboard(spells: List[Spell]) -> InlineKeyboardMarkup:
     """Create a keyboard with spell results."""
     keyboard = []
     for spell in spells:
-        keyboard.append([InlineKeyboardButton(spell, callback_data=f"spell_{spell}")])
+        keyboard.append([InlineKeyboardButton(spell.name, callback_data=encode_entity(SPELL, spell.id))])
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="magias_menu")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def create_rule_results_keyboard(rules: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
+@cached_keyboard()
+def create_rule_results_keyboard(rules: List[Rule]) -> InlineKeyboardMarkup:
     """Create a keyboard with rule results."""
     keyboard = []
     for rule in rules:
-        keyboard.append([InlineKeyboardButton(rule.name, callback_data=f"rule_{rule.name}")])
+        keyboard.append([InlineKeyboardButton(rule.name, callback_data=encode_entity(RULE, rule.id))])
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="regras_menu")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def create_power_results_keyboard(powers: List[Dict[str, Any]], power_type: str) -> InlineKeyboardMarkup:
+@cached_keyboard()
+def create_power_results_keyboard(powers: List[Power], power_type: str) -> InlineKeyboardMarkup:
     """Create a keyboard with power results."""
     keyboard = []
     for power in powers:
-        keyboard.append([InlineKeyboardButton(power.name, callback_data=f"power_{power_type}_{power.name}")])
+        keyboard.append([InlineKeyboardButton(power.name, callback_data=encode_entity(POWER, power.id))])
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="powers_menu")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def create_power_results_class_keyboard(powers: List[Dict[str, Any]], power_type: str) -> InlineKeyboardMarkup:
-    """Create a keyboard with power results."""
+@cached_keyboard(key=lambda powers, class_name, page=0: (class_name, page))
+def create_class_powers_keyboard(powers: List[Power], class_name: str, page: int = 0) -> InlineKeyboardMarkup:
+    """Create a keyboard with one page of the powers of a class."""
     keyboard = []
-    for power in powers:
-        keyboard.append([InlineKeyboardButton(power.name, callback_data=f"power_{power_type}_{power.name}")])
+    page_powers, page, page_count = _get_page(powers, page)
+    for power in page_powers:
+        keyboard.append([InlineKeyboardButton(power.name, callback_data=encode_entity(POWER, power.id))])
+    navigation = _create_page_navigation("class", class_name, page, page_count)
+    if navigation:
+        keyboard.append(navigation)
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="powers_class_list")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def create_power_results_race_keyboard(powers: List[Dict[str, Any]], power_type: str) -> InlineKeyboardMarkup:
-    """Create a keyboard with power results."""
+@cached_keyboard(key=lambda powers, race_name, page=0: (race_name, page))
+def create_race_powers_keyboard(powers: List[Power], race_name: str, page: int = 0) -> InlineKeyboardMarkup:
+    """Create a keyboard with one page of the powers of a race."""
     keyboard = []
-    for power in powers:
-        keyboard.append([InlineKeyboardButton(power.name, callback_data=f"power_{power_type}_{power.name}")])
+    page_powers, page, page_count = _get_page(powers, page)
+    for power in page_powers:
+        keyboard.append([InlineKeyboardButton(power.name, callback_data=encode_entity(POWER, power.id))])
+    navigation = _create_page_navigation("race", race_name, page, page_count)
+    if navigation:
+        keyboard.append(navigation)
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="powers_race_list")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def create_spells_by_level_keyboard(spells_by_level: Dict[int, List[str]]) -> InlineKeyboardMarkup:
+@cached_keyboard(key=lambda spells_by_level: ())
+def create_spells_by_level_keyboard(spells_by_level: Dict[int, List[Spell]]) -> InlineKeyboardMarkup:
     """Create a keyboard with spell levels."""
     keyboard = []
     # Only show levels 1-5
@@ -123,28 +247,39 @@ def create_spells_by_level_keyboard(spells_by_level: Dict[int, List[str]]) -> In
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def create_spells_for_level_keyboard(spells: List[str], level: int) -> InlineKeyboardMarkup:
-    """Create a keyboard with spells of a specific level."""
+@cached_keyboard(key=lambda spells, level, page=0: (level, page))
+def create_spells_for_level_keyboard(spells: List[Spell], level: int, page: int = 0) -> InlineKeyboardMarkup:
+    """Create a keyboard with one page of the spells of a level (already sorted by name)."""
     keyboard = []
-    keyboard.append([InlineKeyboardButton(f"Magias de Nível {level}", callback_data="header")])
+    keyboard.append([InlineKeyboardButton(f"Magias de Nível {level}", callback_data="noop")])
 
-    for spell_name in sorted(spells):
-        keyboard.append([InlineKeyboardButton(spell_name, callback_data=f"spell_{spell_name}")])
+    page_spells, page, page_count = _get_page(spells, page)
+    for spell in page_spells:
+        keyboard.append([InlineKeyboardButton(spell.name, callback_data=encode_entity(SPELL, spell.id))])
+    navigation = _create_page_navigation("level", level, page, page_count)
+    if navigation:
+        keyboard.append(navigation)
 
     keyboard.append([InlineKeyboardButton("↩️ Voltar para Níveis", callback_data="list_spells")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
-def create_rules_keyboard(rules: List[Dict[str, Any]]) -> InlineKeyboardMarkup:
-    """Create a keyboard with all rules."""
+@cached_keyboard(key=lambda rules, page=0: page)
+def create_rules_keyboard(rules: List[Rule], page: int = 0) -> InlineKeyboardMarkup:
+    """Create a keyboard with one page of all rules (already sorted by name)."""
     keyboard = []
-    for rule in sorted(rules, key=lambda x: x.name):
-        keyboard.append([InlineKeyboardButton(rule.name, callback_data=f"rule_{rule.name}")])
+    page_rules, page, page_count = _get_page(rules, page)
+    for rule in page_rules:
+        keyboard.append([InlineKeyboardButton(rule.name, callback_data=encode_entity(RULE, rule.id))])
+    navigation = _create_page_navigation("rules", "", page, page_count)
+    if navigation:
+        keyboard.append(navigation)
 
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="regras_menu")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_powers_list_keyboard() -> InlineKeyboardMarkup:
     """Create a keyboard for selecting power types to list."""
     keyboard = [
@@ -162,16 +297,22 @@ def create_powers_list_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_powers_by_type_keyboard(powers: List[Dict[str, Any]], power_type: str) -> InlineKeyboardMarkup:
-    """Create a keyboard with all powers of a specific type."""
+@cached_keyboard(key=lambda powers, power_type, page=0: (power_type, page))
+def create_powers_by_type_keyboard(powers: List[Power], power_type: str, page: int = 0) -> InlineKeyboardMarkup:
+    """Create a keyboard with one page of the powers of a type (already sorted by name)."""
     keyboard = []
-    for power in sorted(powers, key=lambda x: x.name):
-        keyboard.append([InlineKeyboardButton(power.name, callback_data=f"power_{power_type}_{power.name}")])
+    page_powers, page, page_count = _get_page(powers, page)
+    for power in page_powers:
+        keyboard.append([InlineKeyboardButton(power.name, callback_data=encode_entity(POWER, power.id))])
+    navigation = _create_page_navigation("powers", power_type, page, page_count)
+    if navigation:
+        keyboard.append(navigation)
 
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="poderes_menu")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_spell_types_keyboard() -> InlineKeyboardMarkup:
     """Create a keyboard with spell types."""
     keyboard = [
@@ -183,18 +324,24 @@ def create_spell_types_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_spells_by_type_keyboard(spells: List[Spell], spell_type: str) -> InlineKeyboardMarkup:
-    """Create a keyboard with spells of a specific type."""
+@cached_keyboard(key=lambda spells, spell_type, page=0: (spell_type, page))
+def create_spells_by_type_keyboard(spells: List[Spell], spell_type: str, page: int = 0) -> InlineKeyboardMarkup:
+    """Create a keyboard with one page of the spells of a type (already sorted by name)."""
     keyboard = []
-    keyboard.append([InlineKeyboardButton(f"Magias do tipo {spell_type}", callback_data="header")])
+    keyboard.append([InlineKeyboardButton(f"Magias do tipo {spell_type}", callback_data="noop")])
 
-    for spell in sorted(spells, key=lambda x: x.name):
-        keyboard.append([InlineKeyboardButton(f"{spell.name} (Nv {spell.level})", callback_data=f"spell_{spell.name}")])
+    page_spells, page, page_count = _get_page(spells, page)
+    for spell in page_spells:
+        keyboard.append([InlineKeyboardButton(f"{spell.name} (Nv {spell.level})", callback_data=encode_entity(SPELL, spell.id))])
+    navigation = _create_page_navigation("spelltype", spell_type, page, page_count)
+    if navigation:
+        keyboard.append(navigation)
 
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="list_spells_by_type")])
     keyboard.append([InlineKeyboardButton("📋 Voltar ao Menu Principal", callback_data="back_to_main")])
     return InlineKeyboardMarkup(keyboard)
 
+@cached_keyboard()
 def create_search_again_keyboard(search_state: str) -> InlineKeyboardMarkup:
     """Create a keyboard with options to search again or return to main menu."""
     keyboard = [
@@ -203,16 +350,48 @@ def create_search_again_keyboard(search_state: str) -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_race_list_keyboard() -> InlineKeyboardMarkup:
-    """Create a keyboard with a list of races from Tormenta 20."""
-    races = [
-        "Humano", "Anão", "Dahllan", "Elfo", "Goblin", "Lefou", 
-        "Minotauro", "Qareen", "Golem", "Hynne", "Kliren", "Medusa",
-        "Osteon", "Sereia", "Sílfide", "Suraggel", "Trog"
+@cached_keyboard()
+def create_suggestions_keyboard(entities: List[Any], kind: str, search_state: str) -> InlineKeyboardMarkup:
+    """Create a keyboard with "did you mean" suggestions and options to search again or return to main menu."""
+    keyboard = []
+    for entity in entities:
+        keyboard.append([InlineKeyboardButton(entity.name, callback_data=encode_entity(kind, entity.id))])
+    keyboard.append([InlineKeyboardButton("🔍 Pesquisar novamente", callback_data=f"search_again_{search_state}")])
+    keyboard.append([InlineKeyboardButton("📋 Voltar ao menu principal", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(keyboard)
+
+@static_keyboard
+def create_spell_details_keyboard() -> InlineKeyboardMarkup:
+    """Create the keyboard shown under spell details."""
+    keyboard = [
+        [InlineKeyboardButton("🔙 Voltar", callback_data="magias_menu")],
+        [InlineKeyboardButton("🔙 Voltar ao Menu Principal", callback_data="back_to_main")]
     ]
+    return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
+def create_rule_details_keyboard() -> InlineKeyboardMarkup:
+    """Create the keyboard shown under rule details."""
+    keyboard = [
+        [InlineKeyboardButton("🔙 Voltar", callback_data="regras_menu")],
+        [InlineKeyboardButton("🔙 Voltar ao Menu Principal", callback_data="back_to_main")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@static_keyboard
+def create_power_details_keyboard() -> InlineKeyboardMarkup:
+    """Create the keyboard shown under power details."""
+    keyboard = [
+        [InlineKeyboardButton("🔙 Voltar", callback_data="poderes_menu")],
+        [InlineKeyboardButton("🔙 Voltar ao Menu Principal", callback_data="back_to_main")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+@static_keyboard
+def create_race_list_keyboard() -> InlineKeyboardMarkup:
+    """Create a keyboard with a list of races from Tormenta 20."""
     keyboard = []
-    for race in races:
+    for race in RACE_NAMES:
         keyboard.append([InlineKeyboardButton(race, callback_data=f"powers_race_{race}")])
 
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="poderes_menu")])
@@ -220,16 +399,11 @@ def create_race_list_keyboard() -> InlineKeyboardMarkup:
 
     return InlineKeyboardMarkup(keyboard)
 
+@static_keyboard
 def create_class_list_keyboard() -> InlineKeyboardMarkup:
     """Create a keyboard with a list of classes from Tormenta 20."""
-    classes = [
-        "Arcanista", "Bárbaro", "Bardo", "Bucaneiro", "Caçador", 
-        "Cavaleiro", "Clérigo", "Druida", "Guerreiro", "Inventor",
-        "Ladino", "Lutador", "Nobre", "Paladino"
-    ]
-
     keyboard = []
-    for class_name in classes:
+    for class_name in CLASS_NAMES:
         keyboard.append([InlineKeyboardButton(class_name, callback_data=f"powers_class_{class_name}")])
 
     keyboard.append([InlineKeyboardButton("↩️ Voltar", callback_data="poderes_menu")])
@@ -1,62 +1,138 @@
+from typing import Dict, Hashable, Sequence, Tuple, Union
+
+from telegram.constants import MessageLimit
+from telegram.helpers import escape_markdown
+
+from config.settings import DETAIL_CACHE_SIZE
+from ..data.relevance import make_snippet
 from ..domain.models import Spell, Rule, Power
+from ..utils.cache import LRUCache
+from .callback_data import SPELL, RULE, POWER
+
+# Rendered detail messages, keyed by entity kind and id
+_detail_cache = LRUCache(maxsize=DETAIL_CACHE_SIZE)
+
+def escape(text) -> str:
+    """Escape a value for MarkdownV2."""
+    return escape_markdown(str(text), version=2)
 
 def format_spell_details(spell: Spell) -> str:
-    """Format spell details for display."""
+    """Format spell details for display (MarkdownV2)."""
     # Start with basic spell information
     formatted_text = (
-        f"*{spell.name}*\n"
-        f"*Nível:* {spell.level}\n"
-        f"*Escola:* {spell.school}\n"
-        f"*Tempo de Conjuração:* {spell.casting_time}\n"
-        f"*Alcance:* {spell.range}\n"
-        f"*Alvo:* {spell.target}\n"
-        f"*Duração:* {spell.duration}\n"
-        f"*Resistência:* {spell.resistance}\n\n"
-        f"*Descrição:* {spell.description}"
+        f"*{escape(spell.name)}*\n"
+        f"*Nível:* {escape(spell.level)}\n"
+        f"*Escola:* {escape(spell.school)}\n"
+        f"*Tempo de Conjuração:* {escape(spell.casting_time)}\n"
+        f"*Alcance:* {escape(spell.range)}\n"
+        f"*Alvo:* {escape(spell.target)}\n"
+        f"*Duração:* {escape(spell.duration)}\n"
+        f"*Resistência:* {escape(spell.resistance)}\n\n"
+        f"*Descrição:* {escape(spell.description)}"
     )
 
     # Add enhancements if they exist
     if spell.enhancements and len(spell.enhancements) > 0:
         formatted_text += "\n\n*Aprimoramentos:*"
         for enhancement in spell.enhancements:
-            formatted_text += f"\n• *{enhancement.cost}:* {enhancement.description}"
+            formatted_text += f"\n• *{escape(enhancement.cost)}:* {escape(enhancement.description)}"
 
     return formatted_text
 
 def format_rule_details(rule: Rule) -> str:
-    """Format rule details for display."""
+    """Format rule details for display (MarkdownV2)."""
     return (
-        f"*{rule.name}*\n"
-        f"*Categoria:* {rule.category}\n\n"
-        f"*Descrição:* {rule.description}"
+        f"*{escape(rule.name)}*\n"
+        f"*Categoria:* {escape(rule.category)}\n\n"
+        f"*Descrição:* {escape(rule.description)}"
     )
 
 def format_power_details(power: Power) -> str:
-    """Format power details for display based on power type."""
+    """Format power details for display based on power type (MarkdownV2)."""
     if power.power_type == "class":
         return (
-            f"*{power.name}*\n"
-            f"*Classe:* {power.class_name}\n"
-            f"*Requisitos:* {power.requirements}\n\n"
-            f"*Descrição:* {power.description}"
+            f"*{escape(power.name)}*\n"
+            f"*Classe:* {escape(power.class_name)}\n"
+            f"*Requisitos:* {escape(power.requirements)}\n\n"
+            f"*Descrição:* {escape(power.description)}"
         )
     elif power.power_type == "race":
         return (
-            f"*{power.name}*\n"
-            f"*Raça:* {power.race}\n"
-            f"*Requisitos:* {power.requirements}\n\n"
-            f"*Descrição:* {power.description}"
+            f"*{escape(power.name)}*\n"
+            f"*Raça:* {escape(power.race)}\n"
+            f"*Requisitos:* {escape(power.requirements)}\n\n"
+            f"*Descrição:* {escape(power.description)}"
         )
     elif power.power_type == "origin":
         return (
-            f"*{power.name}*\n"
-            f"*Origem:* {power.origin}\n"
-            f"*Requisitos:* {power.requirements}\n\n"
-            f"*Descrição:* {power.description}"
+            f"*{escape(power.name)}*\n"
+            f"*Origem:* {escape(power.origin)}\n"
+            f"*Requisitos:* {escape(power.requirements)}\n\n"
+            f"*Descrição:* {escape(power.description)}"
         )
     else:  # tormenta
         return (
-            f"*{power.name}*\n"
-            f"*Requisitos:* {power.requirements}\n\n"
-            f"*Descrição:* {power.description}"
+            f"*{escape(power.name)}*\n"
+            f"*Requisitos:* {escape(power.requirements)}\n\n"
+            f"*Descrição:* {escape(power.description)}"
         )
+
+def format_search_results(query: str, results: Sequence[Union[Rule, Power]]) -> str:
+    """Format the search results header, with the part of each description that matched (MarkdownV2)."""
+    formatted_text = f"Resultados para '{escape(query)}':"
+    for entity in results:
+        snippet = make_snippet(entity.description, query)
+        if not snippet:
+            continue
+        line = f"\n\n• *{escape(entity.name)}*: {escape(snippet)}"
+        if len(formatted_text) + len(line) > MessageLimit.MAX_TEXT_LENGTH:
+            break
+        formatted_text += line
+    return formatted_text
+
+def split_message(text: str, limit: int = MessageLimit.MAX_TEXT_LENGTH) -> Tuple[str, ...]:
+    """Split MarkdownV2 text into chunks Telegram accepts, preferring line and word breaks."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, limit)
+        if cut <= 0:
+            cut = limit
+        # Never separate an escape backslash from the character it escapes
+        backslashes = 0
+        while backslashes < cut and text[cut - 1 - backslashes] == "\\":
+            backslashes += 1
+        if backslashes % 2:
+            cut -= 1
+        chunks.append(text[:cut])
+        text = text[cut:].lstrip("\n ")
+    chunks.append(text)
+    return tuple(chunks)
+
+def _render(key: Hashable, entity, format_details) -> Tuple[str, ...]:
+    chunks = _detail_cache.get(key)
+    if chunks is None:
+        chunks = split_message(format_details(entity))
+        _detail_cache.put(key, chunks)
+    return chunks
+
+def render_spell_details(spell: Spell) -> Tuple[str, ...]:
+    """Get the spell details as ready-to-send MarkdownV2 chunks."""
+    return _render((SPELL, spell.id), spell, format_spell_details)
+
+def render_rule_details(rule: Rule) -> Tuple[str, ...]:
+    """Get the rule details as ready-to-send MarkdownV2 chunks."""
+    return _render((RULE, rule.id), rule, format_rule_details)
+
+def render_power_details(power: Power) -> Tuple[str, ...]:
+    """Get the power details as ready-to-send MarkdownV2 chunks."""
+    return _render((POWER, power.id), power, format_power_details)
+
+def clear_render_cache() -> None:
+    """Drop the rendered detail messages, e.g. after the data changes."""
+    _detail_cache.clear()
+
+def get_render_cache_stats() -> Dict[str, int]:
+    """Get the hit and miss counters of the rendered detail cache."""
+    return _detail_cache.stats()
@@ -0,0 +1,183 @@
+"""Durable per-user search state in SQLite.
+
+Only the "state" entry of user_data is stored, one small row per user. The
+Application already hands over the users that changed once per update
+interval; their rows are written in a single transaction in a worker thread,
+so the event loop never waits on the disk. States idle for longer than the TTL
+are dropped from the database, and after each write the persistence forgets
+them and hands the users to on_expire, so the Application can drop their data
+from memory too.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config.settings import STATE_FILE, STATE_TTL, STATE_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# user_data entries that are persisted
+STATE_KEY = "state"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_state (
+    user_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS user_state_updated_at ON user_state (updated_at);
+"""
+
+class SQLiteStatePersistence(BasePersistence):
+    """Persist the search state of every user in a SQLite database in WAL mode."""
+
+    def __init__(self, path: str = STATE_FILE, ttl: float = STATE_TTL, update_interval: float = STATE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.ttl = ttl
+        self._connection: Optional[sqlite3.Connection] = None
+        # Writes waiting for the next flush, by user: (state or None to delete, time of the last update)
+        self._pending: Dict[int, Tuple[Optional[str], float]] = {}
+        # Persisted state and time of the last update of every known user
+        self._known: Dict[int, Tuple[Optional[str], float]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Called with every user whose state expired, e.g. Application.drop_user_data
+        self.on_expire: Optional[Callable[[int], None]] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Only one worker thread uses the connection at a time, see _flush_pending
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def _load(self) -> Dict[int, Dict[str, Any]]:
+        connection = self._connect()
+        expired_before = time.time() - self.ttl
+        connection.execute("DELETE FROM user_state WHERE updated_at < ?", (expired_before,))
+        rows = connection.execute("SELECT user_id, state, updated_at FROM user_state").fetchall()
+        self._known = {user_id: (state, updated_at) for user_id, state, updated_at in rows}
+        return {user_id: {STATE_KEY: state} for user_id, state, _ in rows}
+
+    def _write(self, batch: Dict[int, Tuple[Optional[str], float]]) -> None:
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT INTO user_state (user_id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                [(user_id, state, updated_at) for user_id, (state, updated_at) in batch.items() if state is not None],
+            )
+            connection.executemany(
+                "DELETE FROM user_state WHERE user_id = ?",
+                [(user_id,) for user_id, (state, _) in batch.items() if state is None],
+            )
+            connection.execute("DELETE FROM user_state WHERE updated_at < ?", (time.time() - self.ttl,))
+
+    def _schedule(self, user_id: int, state: Optional[str]) -> None:
+        now = time.time()
+        known = self._known.get(user_id)
+        # Rewrite an unchanged state only to keep it from expiring
+        if known is not None and known[0] == state and now - known[1] < self.ttl / 2:
+            return
+        if known is None and state is None:
+            return
+        self._known[user_id] = (state, now)
+        self._pending[user_id] = (state, now)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_pending())
+
+    async def _flush_pending(self) -> None:
+        # Let the other users of this persistence update queue up first, then write them together
+        await asyncio.sleep(0)
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except sqlite3.Error as e:
+                logger.error(f"Error saving the state of {len(batch)} users: {e}")
+        self._forget_expired()
+
+    def _forget_expired(self) -> None:
+        """Forget the users whose rows were deleted or expired, so the known users don't grow forever."""
+        expired_before = time.time() - self.ttl
+        forgotten = [
+            user_id for user_id, (state, updated_at) in self._known.items()
+            if state is None or updated_at < expired_before
+        ]
+        for user_id in forgotten:
+            state, _ = self._known.pop(user_id)
+            if state is not None and self.on_expire is not None:
+                self.on_expire(user_id)
+
+    async def get_user_data(self) -> Dict[int, Dict[str, Any]]:
+        user_data = await asyncio.to_thread(self._load)
+        logger.info(f"Restored the search state of {len(user_data)} users")
+        return user_data
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        self._schedule(user_id, data.get(STATE_KEY))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._schedule(user_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[str, Any]) -> None:
+        # Forget a search the user started too long ago, as after a restart
+        known = self._known.get(user_id)
+        if known is not None and known[0] is not None and time.time() - known[1] > self.ttl:
+            user_data.pop(STATE_KEY, None)
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._pending:
+            await self._flush_pending()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # Chat data, bot data, callback data and conversations are not used by the bot
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Any, Any]:
+        return {}
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        pass
+
+    async def update_bot_data(self, data: Any) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        pass
@@ -0,0 +1,300 @@
+"""Outbound rate limiting that follows the Telegram flood limits.
+
+Every Bot API request sent to a chat takes a token from the bucket of the chat
+and one from a global bucket. When a bucket is empty, requests wait and are
+served by priority: interactive replies go before bulk lists. A flood control
+error pauses only the chat it came from, so the other chats keep getting
+replies. A queued edit of a message is dropped when a newer edit of the same
+message arrives, and both callers get the result of the newer one.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import warnings
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config.settings import (
+    RATE_LIMIT_GLOBAL, RATE_LIMIT_CHAT, RATE_LIMIT_CHAT_BURST, RATE_LIMIT_GROUP, RATE_LIMIT_GROUP_BURST,
+    RATE_LIMIT_MAX_RETRIES, BULK_KEYBOARD_ROWS,
+)
+from ..utils.metrics import SEND_QUEUE_DEPTH, SEND_WAIT, SEND_RETRY_AFTER, SEND_COALESCED_EDITS
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lower first. rate_limit_args can also pass one of them explicitly
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = ("interactive", "bulk")
+
+# Endpoints that edit a message in place, an edit replaces the queued edits of the endpoints listed with it
+_REPLACED_EDITS = {
+    "editMessageText": ("editMessageText", "editMessageReplyMarkup"),
+    "editMessageReplyMarkup": ("editMessageReplyMarkup",),
+}
+
+# Idle chat buckets are dropped when there are more than this many
+_MIN_SWEEP_SIZE = 1024
+
+class TokenBucket:
+    """Token bucket whose waiters are served by priority, then in arrival order."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._loop = asyncio.get_running_loop()
+        self._updated = self._loop.time()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available and nobody is waiting."""
+        now = self._loop.time()
+        self._refill(now)
+        if self._waiters or now < self._paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait(self, priority: int) -> asyncio.Future:
+        """Get a future resolved when a token is taken for the caller, who may cancel it."""
+        future = self._loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._schedule()
+        return future
+
+    def release(self) -> None:
+        """Give back a token that was taken but not used."""
+        self.tokens = min(self.capacity, self.tokens + 1)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._wake()
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for a while, e.g. after a flood control error."""
+        self._paused_until = max(self._paused_until, self._loop.time() + seconds)
+        self.tokens = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule()
+
+    def is_idle(self) -> bool:
+        """Check whether the bucket is full and unused, as good as a new one."""
+        now = self._loop.time()
+        self._refill(now)
+        return not self._waiters and now >= self._paused_until and self.tokens >= self.capacity
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    def _wake(self) -> None:
+        self._timer = None
+        now = self._loop.time()
+        self._refill(now)
+        while self._waiters and now >= self._paused_until and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+        self._schedule()
+
+    def _schedule(self) -> None:
+        # Forget the waiters that gave up, then wake up when the next token is due
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._waiters and self._timer is None:
+            now = self._loop.time()
+            delay = max(self._paused_until - now, (1 - self.tokens) / self.rate, 0)
+            self._timer = self._loop.call_later(delay, self._wake)
+
+class _PendingEdit:
+    """An edit waiting for tokens, which a newer edit of the same message may replace."""
+
+    __slots__ = ("endpoint", "replaced", "result", "has_waiter")
+
+    def __init__(self, endpoint: str):
+        loop = asyncio.get_running_loop()
+        self.endpoint = endpoint
+        # Resolved with the newer edit when one replaces this one
+        self.replaced: asyncio.Future = loop.create_future()
+        # The result of this edit, only set when an older edit waits for it
+        self.result: asyncio.Future = loop.create_future()
+        self.has_waiter = False
+
+def _count_rows(reply_markup: Any) -> int:
+    if reply_markup is None:
+        return 0
+    if isinstance(reply_markup, dict):
+        return len(reply_markup.get("inline_keyboard", ()))
+    return len(getattr(reply_markup, "inline_keyboard", ()))
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    """Get the wait of a flood control error in seconds, an int before PTB 22.2 and an int or timedelta since."""
+    with warnings.catch_warnings():
+        # Since 22.2 reading the int warns that it will become a timedelta, which is handled below
+        warnings.simplefilter("ignore", DeprecationWarning)
+        retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class OutboundRateLimiter(BaseRateLimiter[int]):
+    """Rate limiter with per-chat and global token buckets, priorities and edit coalescing.
+
+    Requests without a chat, such as answers to callback and inline queries,
+    are never delayed, only retried after a flood control error.
+    """
+
+    def __init__(self, global_rate: float = RATE_LIMIT_GLOBAL, chat_rate: float = RATE_LIMIT_CHAT,
+                 chat_burst: float = RATE_LIMIT_CHAT_BURST, group_rate: float = RATE_LIMIT_GROUP,
+                 group_burst: float = RATE_LIMIT_GROUP_BURST, max_retries: int = RATE_LIMIT_MAX_RETRIES):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._sweep_size = _MIN_SWEEP_SIZE
+        self._pending_edits: Dict[Tuple[Union[int, str], int], _PendingEdit] = {}
+
+    async def initialize(self) -> None:
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+        self._pending_edits.clear()
+
+    def _get_chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._sweep_size:
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle()}
+                self._sweep_size = max(_MIN_SWEEP_SIZE, 2 * len(self._chats))
+            # Private chats have positive ids, groups and channels negative ones or a @username
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    @staticmethod
+    def get_priority(endpoint: str, data: Dict[str, Any], rate_limit_args: Optional[int]) -> int:
+        """Get the priority of a request, bulk for new messages with a long list of buttons."""
+        if rate_limit_args in (INTERACTIVE, BULK):
+            return rate_limit_args
+        if endpoint == "sendMessage" and _count_rows(data.get("reply_markup")) > BULK_KEYBOARD_ROWS:
+            return BULK
+        return INTERACTIVE
+
+    async def _wait_for_tokens(self, chat_id: Union[int, str], priority: int, edit: Optional[_PendingEdit]) -> bool:
+        """Take a chat token and a global token, returning False if a newer edit replaced this one."""
+        loop = asyncio.get_running_loop()
+        label = PRIORITY_NAMES[priority]
+        start = loop.time()
+        SEND_QUEUE_DEPTH.inc(label)
+        acquired: List[TokenBucket] = []
+        try:
+            for bucket in (self._get_chat_bucket(chat_id), self._global):
+                if not bucket.try_acquire():
+                    token = bucket.wait(priority)
+                    if edit is None:
+                        await token
+                    else:
+                        await asyncio.wait((token, edit.replaced), return_when=asyncio.FIRST_COMPLETED)
+                        if edit.replaced.done():
+                            # Give the tokens taken so far to the next requests
+                            if token.done() and not token.cancelled():
+                                acquired.append(bucket)
+                            token.cancel()
+                            for taken in acquired:
+                                taken.release()
+                            return False
+                acquired.append(bucket)
+        finally:
+            SEND_QUEUE_DEPTH.dec(label)
+            SEND_WAIT.observe(loop.time() - start, label)
+        return True
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._send(callback, args, kwargs, endpoint, None, INTERACTIVE)
+
+        priority = self.get_priority(endpoint, data, rate_limit_args)
+        message_id = data.get("message_id")
+        if endpoint not in _REPLACED_EDITS or message_id is None:
+            await self._wait_for_tokens(chat_id, priority, None)
+            return await self._send(callback, args, kwargs, endpoint, chat_id, priority)
+
+        key = (chat_id, message_id)
+        edit = _PendingEdit(endpoint)
+        previous = self._pending_edits.get(key)
+        if previous is not None and previous.endpoint in _REPLACED_EDITS[endpoint]:
+            edit.has_waiter = True
+            previous.replaced.set_result(edit)
+        self._pending_edits[key] = edit
+
+        try:
+            if not await self._wait_for_tokens(chat_id, priority, edit):
+                SEND_COALESCED_EDITS.inc()
+                result = await asyncio.shield(edit.replaced.result().result)
+                if edit.has_waiter:
+                    edit.result.set_result(result)
+                return result
+            if self._pending_edits.get(key) is edit:
+                del self._pending_edits[key]
+            result = await self._send(callback, args, kwargs, endpoint, chat_id, priority)
+        except Exception as e:
+            if edit.has_waiter and not edit.result.done():
+                edit.result.set_exception(e)
+            raise
+        finally:
+            if self._pending_edits.get(key) is edit:
+                del self._pending_edits[key]
+        if edit.has_waiter:
+            edit.result.set_result(result)
+        return result
+
+    async def _send(self, callback: Callable[..., Coroutine[Any, Any, Any]], args: Any, kwargs: Dict[str, Any],
+                    endpoint: str, chat_id: Optional[Union[int, str]], priority: int) -> Any:
+        """Make the request, waiting and retrying after flood control errors."""
+        retries = 0
+        while True:
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                SEND_RETRY_AFTER.inc(endpoint)
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                seconds = _retry_after_seconds(e) + 0.1
+                logger.warning(f"Flood control on {endpoint} for chat {chat_id}, retrying in {seconds:.1f}s")
+                if chat_id is None:
+                    await asyncio.sleep(seconds)
+                else:
+                    self._get_chat_bucket(chat_id).pause(seconds)
+                    await self._wait_for_tokens(chat_id, priority, None)
@@ -0,0 +1,92 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Route handlers receive the callback query, the context and the payload after the matched key
+RouteHandler = Callable[[Any, Any, str], Awaitable[None]]
+
+class _TrieNode:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.route: Optional[Tuple[str, RouteHandler]] = None
+
+class CallbackRouter:
+    """Dispatch callback data to handlers registered by exact key or by prefix.
+
+    Exact keys are looked up in a dict first. Otherwise the longest registered
+    prefix wins, so "spell_type_" takes precedence over "spell_" regardless of
+    the registration order. The payload handed to the handler is the callback
+    data with the matched key removed.
+    """
+
+    def __init__(self, on_route: Optional[Callable[[str], None]] = None):
+        self._exact: Dict[str, Tuple[str, RouteHandler]] = {}
+        self._prefixes = _TrieNode()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        # Called with the route name ("unmatched" when none matches) before the handler runs
+        self._on_route = on_route
+
+    def add_exact(self, key: str, handler: RouteHandler) -> None:
+        """Route callback data equal to key."""
+        self._exact[key] = (key, handler)
+
+    def add_prefix(self, prefix: str, handler: RouteHandler) -> None:
+        """Route callback data starting with prefix, unless a longer prefix matches."""
+        node = self._prefixes
+        for char in prefix:
+            node = node.children.setdefault(char, _TrieNode())
+        node.route = (f"{prefix}*", handler)
+
+    def resolve(self, data: str) -> Optional[Tuple[str, RouteHandler, str]]:
+        """Get the route name, handler and payload for callback data."""
+        route = self._exact.get(data)
+        if route is not None:
+            return route[0], route[1], ""
+
+        match = None
+        match_length = length = 0
+        node = self._prefixes
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            length += 1
+            if node.route is not None:
+                match = node.route
+                match_length = length
+        if match is None:
+            return None
+        return match[0], match[1], data[match_length:]
+
+    async def dispatch(self, data: str, query: Any, context: Any) -> bool:
+        """Run the handler for callback data, returning False when no route matches."""
+        resolved = self.resolve(data)
+        if resolved is None:
+            if self._on_route is not None:
+                self._on_route("unmatched")
+            self._record("unmatched", 0.0)
+            return False
+
+        name, handler, payload = resolved
+        if self._on_route is not None:
+            self._on_route(name)
+        start = time.perf_counter()
+        try:
+            await handler(query, context, payload)
+        finally:
+            self._record(name, time.perf_counter() - start)
+        return True
+
+    def _record(self, name: str, elapsed: float) -> None:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        stats["count"] += 1
+        stats["total_seconds"] += elapsed
+        if elapsed > stats["max_seconds"]:
+            stats["max_seconds"] = elapsed
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get the call count and latency totals of every route that ran."""
+        return {name: dict(stats) for name, stats in self._stats.items()}
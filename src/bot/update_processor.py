@@ -0,0 +1,111 @@
+"""Concurrent update processing that keeps each user's and chat's updates in order.
+
+Updates of different users run concurrently, so a slow reply no longer holds
+up everyone else, but the updates of one user, or of one chat, still run one
+at a time and in arrival order. A button press that sets the search state is
+therefore always handled before the message typed right after it.
+
+Each update takes a lock per user and per chat it belongs to, always in the
+same order so two updates can't wait on each other. Locks only exist while
+some update holds or waits for them.
+"""
+import asyncio
+from typing import Awaitable, Any, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config.settings import CONCURRENT_UPDATES, MAX_PENDING_UPDATES
+from ..utils.metrics import UPDATES_RUNNING, UPDATE_WAIT
+
+class _KeyLock:
+    """A lock and the number of updates holding or waiting for it."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Run up to max_concurrent_updates handlers at once, one at a time per user and per chat.
+
+    Updates waiting for an earlier update of their user or chat don't take a
+    handler slot, so one busy user can't hold up the others. Up to
+    max_pending_updates updates are admitted at once, running or waiting.
+    """
+
+    def __init__(self, max_concurrent_updates: int = CONCURRENT_UPDATES,
+                 max_pending_updates: int = MAX_PENDING_UPDATES):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.max_running_updates = max_concurrent_updates
+        self._running: Optional[asyncio.Semaphore] = None
+        self._locks: Dict[int, _KeyLock] = {}
+        self._finished = asyncio.Event()
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self.max_running_updates)
+
+    async def shutdown(self) -> None:
+        self._locks.clear()
+
+    async def join(self) -> None:
+        """Wait until every update handed to the processor was handled.
+
+        Application.stop starts the updates still queued without awaiting them,
+        so they are waited for here before the bot shuts down.
+        """
+        while self.current_concurrent_updates:
+            self._finished.clear()
+            await self._finished.wait()
+
+    @staticmethod
+    def get_keys(update: object) -> List[int]:
+        """Get the ids of the user and chat of an update, in lock order.
+
+        User ids are positive and group and channel ids negative, while a private
+        chat has the id of its user, so a private chat takes a single lock.
+        """
+        if not isinstance(update, Update):
+            return []
+        keys = set()
+        if update.effective_user is not None:
+            keys.add(update.effective_user.id)
+        if update.effective_chat is not None:
+            keys.add(update.effective_chat.id)
+        return sorted(keys)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        keys = self.get_keys(update)
+        # Join the queues of every key before the first await, so updates keep their arrival order
+        key_locks = []
+        for key in keys:
+            key_lock = self._locks.get(key)
+            if key_lock is None:
+                key_lock = self._locks[key] = _KeyLock()
+            key_lock.users += 1
+            key_locks.append(key_lock)
+
+        acquired = 0
+        try:
+            for key_lock in key_locks:
+                await key_lock.lock.acquire()
+                acquired += 1
+            async with self._running:
+                UPDATE_WAIT.observe(loop.time() - start)
+                UPDATES_RUNNING.inc()
+                try:
+                    await coroutine
+                finally:
+                    UPDATES_RUNNING.dec()
+        finally:
+            for key, key_lock in zip(keys, key_locks):
+                if acquired > 0:
+                    key_lock.lock.release()
+                    acquired -= 1
+                key_lock.users -= 1
+                if key_lock.users == 0:
+                    del self._locks[key]
+            self._finished.set()
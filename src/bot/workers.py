@@ -0,0 +1,267 @@
+"""Sharded multi-process mode.
+
+One ingress process receives the updates, by polling or webhook, and hands
+each one over a pipe to the worker process that owns its chat, so a chat and
+the search state of its users always live on the same worker. Each worker runs
+the usual Application, with every handler, on its own core.
+
+The data is loaded once before forking, with the garbage collector disabled
+and the loaded objects then frozen out of it, so the workers share its memory
+pages copy-on-write instead of each holding a copy. Forking is Unix only, and
+done from the main thread: a fork only copies the thread calling it, and a lock
+held by another thread at that moment would stay locked forever in the worker.
+
+The workers don't watch the data files, which would have each of them rebuild
+its own copy of the data. The ingress watches them instead and, when they
+change, lets the workers finish their updates and forks new ones from the new
+data. Each worker keeps the search state of its users in its own database.
+"""
+import asyncio
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from config.settings import BOT_TOKEN, BOT_API_URL, HOT_RELOAD, METRICS_PORT, PROFILE_DIR, STATE_FILE
+from ..data.reloader import DataReloader, build_spell_repository, build_rule_repository, build_power_repository
+from ..data.snapshot import Repositories, load_repositories
+from ..utils.profiling import PROFILER
+from .application import create_application
+
+logger = logging.getLogger(__name__)
+
+# Updates a worker takes from its pipe before letting the event loop run the handlers
+RECEIVE_BATCH = 64
+
+def get_shard(update: Update, workers: int) -> int:
+    """Get the worker of an update: by chat, or by user for updates without one such as inline queries."""
+    if update.effective_chat is not None:
+        key = update.effective_chat.id
+    elif update.effective_user is not None:
+        key = update.effective_user.id
+    else:
+        key = 0
+    return key % workers
+
+def get_shard_state_file(index: int, count: int, state_file: str = STATE_FILE) -> str:
+    """Get the database of the search state of a worker, e.g. data/state.1-of-4.db.
+
+    The count is part of the name, since the users of a worker change with it.
+    """
+    root, extension = os.path.splitext(state_file)
+    return f"{root}.{index}-of-{count}{extension}"
+
+def send_update(connections: List[Connection], update: Update) -> None:
+    """Hand an update to the worker that owns its chat."""
+    connections[get_shard(update, len(connections))].send_bytes(json.dumps(update.to_dict()).encode())
+
+def stop_workers(processes: List[multiprocessing.Process], connections: List[Connection]) -> None:
+    """Close the pipes of the workers and wait until they handled every update they got."""
+    for connection in connections:
+        connection.close()
+    for process in processes:
+        process.join()
+
+def start_workers(count: int, repositories: Repositories, on_ready: Optional[Callable[[int], None]] = None,
+                  **options: Any) -> Tuple[List[multiprocessing.Process], List[Connection]]:
+    """Fork the worker processes, returning them and the connections to send them updates.
+
+    options are passed to create_application in every worker. on_ready is
+    called in a worker once it is ready to handle updates. Must be called from
+    the main thread, which may be running an event loop.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError("Workers can only be forked from the main thread")
+    context = multiprocessing.get_context("fork")
+    processes: List[multiprocessing.Process] = []
+    connections: List[Connection] = []
+    # Keep the objects loaded so far out of the collections of the workers, which would touch and copy them
+    gc.freeze()
+    for index in range(count):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_run_worker, args=(index, count, receiver, connections + [sender], repositories, on_ready, options),
+            name=f"worker-{index}", daemon=True,
+        )
+        process.start()
+        receiver.close()
+        processes.append(process)
+        connections.append(sender)
+    # The workers got their own copy of the frozen objects, the ones of this process can be collected again
+    gc.unfreeze()
+    return processes, connections
+
+def _run_worker(index: int, count: int, connection: Connection, inherited: List[Connection],
+                repositories: Repositories, on_ready: Optional[Callable[[int], None]], options: Dict[str, Any]) -> None:
+    # Workers stop when the ingress closes their pipe, not on the signals sent to the whole process group,
+    # and don't wake up the event loop of the ingress, forked along with them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.set_wakeup_fd(-1)
+    # Forked from inside the event loop of the ingress when the data changes
+    asyncio._set_running_loop(None)
+    gc.enable()
+    # Close the sending ends this process got with the fork, of its own pipe and of the pipes of the workers
+    # forked before it, or the pipes would never reach the end of their input
+    for other in inherited:
+        other.close()
+    if PROFILER.directory == PROFILE_DIR:
+        PROFILER.directory = os.path.join(PROFILE_DIR, f"worker-{index}")
+    asyncio.run(_serve(index, count, connection, repositories, on_ready, options))
+
+async def _serve(index: int, count: int, connection: Connection, repositories: Repositories,
+                 on_ready: Optional[Callable[[int], None]], options: Dict[str, Any]) -> None:
+    options = dict(options)
+    # Every worker serves its own metrics, on consecutive ports, and keeps the state of its own users
+    options.setdefault("metrics_port", METRICS_PORT + index if METRICS_PORT else 0)
+    options.setdefault("state_file", get_shard_state_file(index, count))
+    # The ingress reloads the data and forks new workers instead
+    options.setdefault("hot_reload", False)
+    application = create_application(repositories=repositories, workers=count, **options)
+
+    # As run_polling does, without fetching updates
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    loop = asyncio.get_running_loop()
+    closed = loop.create_future()
+
+    def receive() -> None:
+        try:
+            for _ in range(RECEIVE_BATCH):
+                if not connection.poll():
+                    break
+                data = json.loads(connection.recv_bytes())
+                application.update_queue.put_nowait(Update.de_json(data, application.bot))
+        except EOFError:
+            loop.remove_reader(connection.fileno())
+            closed.set_result(None)
+
+    loop.add_reader(connection.fileno(), receive)
+    logger.info(f"Worker {index} ready (pid {os.getpid()})")
+    if on_ready is not None:
+        on_ready(index)
+
+    await closed
+    # Handles the updates still queued before stopping
+    await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    connection.close()
+    logger.info(f"Worker {index} stopped")
+
+class WorkerPool:
+    """The worker processes and their pipes, replaced all at once when the data changes."""
+
+    def __init__(self, count: int, **options: Any):
+        self.count = count
+        self.options = options
+        self.processes: List[multiprocessing.Process] = []
+        self.connections: List[Connection] = []
+        # Held while the workers are replaced, so no update goes to the old or the new ones out of order
+        self._lock = asyncio.Lock()
+
+    def start(self, repositories: Repositories) -> None:
+        """Fork the workers with the given data."""
+        self.processes, self.connections = start_workers(self.count, repositories, **self.options)
+        logger.info(f"Started {self.count} workers")
+
+    def stop(self) -> None:
+        """Stop the workers once they handled every update they got."""
+        stop_workers(self.processes, self.connections)
+        self.processes, self.connections = [], []
+
+    async def send(self, update: Update) -> None:
+        """Hand an update to the worker that owns its chat."""
+        async with self._lock:
+            send_update(self.connections, update)
+
+    async def restart(self) -> bool:
+        """Load the data files again and replace the workers with ones forked from the new data.
+
+        The old workers handle their updates and save the search state before the new ones
+        load it, while the updates that arrive meanwhile wait in the ingress. Returns whether
+        the workers were replaced; on invalid data the current ones keep running.
+        """
+        try:
+            repositories = await asyncio.to_thread(_build_repositories)
+        except Exception as e:
+            logger.error(f"Keeping the current workers, reloading failed: {e}")
+            return False
+        async with self._lock:
+            await asyncio.to_thread(self.stop)
+            # Blocks the event loop of the ingress while forking, a few milliseconds per worker
+            self.start(repositories)
+        return True
+
+def _build_repositories() -> Repositories:
+    # Validated like the data reloaded by a single process, and with collections off as in run_sharded
+    gc.disable()
+    try:
+        return build_spell_repository(), build_rule_repository(), build_power_repository()
+    finally:
+        gc.enable()
+
+class WorkerReloader(DataReloader):
+    """Watch the data files and replace the workers when they change."""
+
+    def __init__(self, pool: WorkerPool):
+        super().__init__(None, None, None)
+        self.pool = pool
+
+    async def reload(self, changed_files: List[str]) -> None:
+        if await self.pool.restart():
+            changed = ", ".join(os.path.relpath(path) for path in changed_files)
+            logger.info(f"Restarted the workers with data from {changed}")
+
+def create_ingress(pool: WorkerPool, token: str = BOT_TOKEN, base_url: str = BOT_API_URL,
+                   hot_reload: bool = HOT_RELOAD) -> Application:
+    """Build an Application that only hands every update to its worker, and restarts them on data changes."""
+    async def forward(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await pool.send(update)
+
+    reloader = WorkerReloader(pool)
+
+    async def post_init(application: Application) -> None:
+        if hot_reload:
+            reloader.start()
+
+    async def post_stop(application: Application) -> None:
+        await reloader.stop()
+
+    application = (
+        Application.builder()
+        .token(token)
+        .base_url(base_url)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
+    application.add_handler(TypeHandler(Update, forward))
+    return application
+
+def run_sharded(count: int, run: Callable[[Application], None]) -> None:
+    """Load the data, fork the workers and receive the updates with run until it returns."""
+    # Collections during loading would leave freed holes in the pages the workers share
+    gc.disable()
+    # Everything is loaded now, lazily loaded powers would be loaded again by every worker
+    repositories = load_repositories(lazy_powers=False)
+    pool = WorkerPool(count)
+    pool.start(repositories)
+    del repositories
+    gc.enable()
+    try:
+        run(create_ingress(pool))
+    finally:
+        pool.stop()
@@ -1,9 +1,22 @@
+import functools
 import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+from config.settings import SPELLS_FILE, RULES_FILE, CLASS_POWERS_FILE, RACE_POWERS_FILE, ORIGIN_POWERS_FILE, TORMENTA_POWERS_FILE, COMBAT_POWERS_FILE, DESTINY_POWERS_FILE, MAGIC_POWERS_FILE, GRANTED_POWERS_FILE, GROUP_POWERS_FILE
+from .repositories import SpellRepository, RuleRepository, PowerRepository, POWER_TYPES
 
 logger = logging.getLogger(__name__)
 
+# Power data files in the order of POWER_TYPES
+POWER_FILES = (
+    CLASS_POWERS_FILE, RACE_POWERS_FILE, ORIGIN_POWERS_FILE, TORMENTA_POWERS_FILE, COMBAT_POWERS_FILE,
+    DESTINY_POWERS_FILE, MAGIC_POWERS_FILE, GRANTED_POWERS_FILE, GROUP_POWERS_FILE
+)
+
+# Every data file the repositories are built from
+DATA_FILES = (SPELLS_FILE, RULES_FILE) + POWER_FILES
+
 def load_json_data(file_path: str) -> Optional[Dict[str, Any]]:
     """Load data from a JSON file."""
     try:
@@ -11,4 +24,21 @@ def load_json_data(file_path: str) -> Optional[Dict[str, Any]]:
             return json.load(file)
     except (FileNotFoundError, json.JSONDecodeError) as e:
         logger.error(f"Error loading {file_path}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def build_repositories(lazy_powers: bool = False) -> Tuple[SpellRepository, RuleRepository, PowerRepository]:
+    """Load the JSON data files and build the repositories.
+
+    With lazy_powers, each power file is only read when its power type is first used.
+    """
+    spell_repo = SpellRepository(load_json_data(SPELLS_FILE))
+    rule_repo = RuleRepository(load_json_data(RULES_FILE))
+
+    if lazy_powers:
+        power_repo = PowerRepository.lazy({
+            power_type: functools.partial(load_json_data, file_path)
+            for power_type, file_path in zip(POWER_TYPES, POWER_FILES)
+        })
+    else:
+        power_repo = PowerRepository(*(load_json_data(file_path) for file_path in POWER_FILES))
+    return spell_repo, rule_repo, power_repo
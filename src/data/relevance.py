@@ -0,0 +1,141 @@
+"""BM25 relevance ranking over names and descriptions.
+
+Term weights are fully precomputed when the index is built: with the document
+lengths fixed, the BM25 contribution of a term to a document only depends on
+the term, so a query just sums the postings of its terms and keeps the best
+documents with a heap. Names are weighted above descriptions, and documents
+matching a query term in their name always rank above the others.
+"""
+import heapq
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .text_index import fold_text
+
+# Words too common in Portuguese to say anything about relevance (already folded)
+STOPWORDS = frozenset("""
+    a o as os um uma uns umas de do da dos das em no na nos nas num numa por pelo pela pelos pelas para pra
+    com sem e ou que se ao aos seu sua seus suas ele ela eles elas lhe lhes isso isto este esta estes estas
+    esse essa esses essas aquele aquela mas como mais ja ate entre sobre quando onde cada todo toda todos
+    todas ser sao foi era tem ter voce qual quais outro outra outros outras mesmo mesma
+""".split())
+
+# Plural endings and their singular replacement, checked in order
+_PLURAL_SUFFIXES = (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("res", "r"), ("zes", "z"),
+                    ("ns", "m"), ("s", ""))
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# BM25 parameters and the weight of a name term relative to a description term
+K1 = 1.2
+B = 0.75
+NAME_WEIGHT = 3.0
+
+def normalize_term(word: str) -> str:
+    """Reduce a folded word to its singular form, so "danos" matches "dano"."""
+    if len(word) > 3:
+        for suffix, replacement in _PLURAL_SUFFIXES:
+            if word.endswith(suffix):
+                return word[:-len(suffix)] + replacement
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized search terms, dropping stopwords."""
+    return [normalize_term(word) for word in _WORD.findall(fold_text(text or "")) if word not in STOPWORDS]
+
+class BM25Index:
+    """BM25F index of documents made of a name and a description.
+
+    Documents are identified by their position in the sequence the index is
+    built from.
+    """
+
+    def __init__(self, documents: Sequence[Tuple[str, str]]):
+        name_terms = [tokenize(name) for name, _ in documents]
+        description_terms = [tokenize(description) for _, description in documents]
+        average_name = sum(map(len, name_terms)) / len(documents) if documents else 0
+        average_description = sum(map(len, description_terms)) / len(documents) if documents else 0
+
+        # Length-normalized, name-weighted term frequencies per document
+        frequencies: Dict[str, Dict[int, float]] = {}
+        in_name: Dict[str, List[int]] = {}
+        for doc_id, (names, descriptions) in enumerate(zip(name_terms, description_terms)):
+            name_norm = 1 - B + B * len(names) / average_name if average_name else 1
+            description_norm = 1 - B + B * len(descriptions) / average_description if average_description else 1
+            for term in names:
+                postings = frequencies.setdefault(term, {})
+                postings[doc_id] = postings.get(doc_id, 0.0) + NAME_WEIGHT / name_norm
+            for term in descriptions:
+                postings = frequencies.setdefault(term, {})
+                postings[doc_id] = postings.get(doc_id, 0.0) + 1 / description_norm
+            for term in set(names):
+                in_name.setdefault(term, []).append(doc_id)
+
+        count = len(documents)
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        for term, postings in frequencies.items():
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            self._postings[term] = [(doc_id, idf * tf * (K1 + 1) / (tf + K1)) for doc_id, tf in postings.items()]
+        self._in_name: Dict[str, List[int]] = in_name
+
+    def rank(self, query: str, candidates: Iterable[int], limit: Optional[int] = None) -> List[int]:
+        """Order the candidates by relevance to a query, best first.
+
+        Candidates come from another matcher (e.g. partial words) and make up
+        the whole result: the index only orders them, and the ones matching no
+        query term keep their id order after the rest.
+        """
+        scores: Dict[int, float] = {doc_id: 0.0 for doc_id in candidates}
+        name_hits: Dict[int, int] = {}
+        for term in set(tokenize(query)):
+            for doc_id, weight in self._postings.get(term, ()):
+                if doc_id in scores:
+                    scores[doc_id] += weight
+            for doc_id in self._in_name.get(term, ()):
+                if doc_id in scores:
+                    name_hits[doc_id] = name_hits.get(doc_id, 0) + 1
+
+        def key(doc_id: int) -> Tuple[int, float, int]:
+            return name_hits.get(doc_id, 0), scores[doc_id], -doc_id
+
+        if limit is None:
+            return sorted(scores, key=key, reverse=True)
+        return heapq.nlargest(limit, scores, key=key)
+
+def _fold_aligned(text: str) -> str:
+    """Fold text keeping every position aligned with the original."""
+    folded = fold_text(text)
+    if len(folded) == len(text):
+        # Precomposed accented letters fold to one character each, the usual case
+        return folded
+    return "".join((fold_text(char) or " ")[0] for char in text)
+
+def make_snippet(text: str, query: str, width: int = 80) -> str:
+    """Get the part of a text around the first match of a query term, or an empty string."""
+    if not text:
+        return ""
+    folded = _fold_aligned(text)
+    terms = set(tokenize(query))
+    start = -1
+    for match in _WORD.finditer(folded):
+        if normalize_term(match.group()) in terms:
+            start = match.start()
+            break
+    if start < 0:
+        # Partial words only match as a substring
+        start = folded.find(fold_text(query).strip())
+    if start < 0:
+        return ""
+
+    begin = max(0, start - width // 3)
+    if begin > 0:
+        # Start at a word boundary
+        space = text.find(" ", begin, start)
+        begin = space + 1 if space >= 0 else begin
+    end = min(len(text), begin + width)
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+    snippet = " ".join(text[begin:end].split())
+    return f"{'…' if begin > 0 else ''}{snippet}{'…' if end < len(text) else ''}"
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.settings import SPELLS_FILE, RULES_FILE, DATA_RELOAD_INTERVAL
+from .data_loader import POWER_FILES, DATA_FILES, load_json_data
+from .repositories import SpellRepository, RuleRepository, PowerRepository, POWER_TYPES
+from ..domain.services import SpellService, RuleService, PowerService
+
+logger = logging.getLogger(__name__)
+
+FileSignature = Optional[Tuple[int, int]]
+
+class DataValidationError(Exception):
+    """Raised when rebuilt data is not fit to replace the data in use."""
+
+def _get_signature(file_path: str) -> FileSignature:
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def _load_required(file_path: str) -> dict:
+    data = load_json_data(file_path)
+    if data is None:
+        raise DataValidationError(f"{file_path} could not be read")
+    return data
+
+def build_spell_repository() -> SpellRepository:
+    """Rebuild the spell repository, refusing data without spells."""
+    repository = SpellRepository(_load_required(SPELLS_FILE))
+    if not repository.get_all():
+        raise DataValidationError(f"{SPELLS_FILE} has no spells")
+    return repository
+
+def build_rule_repository() -> RuleRepository:
+    """Rebuild the rule repository, refusing data without rules."""
+    repository = RuleRepository(_load_required(RULES_FILE))
+    if not repository.get_all():
+        raise DataValidationError(f"{RULES_FILE} has no rules")
+    return repository
+
+def build_power_repository() -> PowerRepository:
+    """Rebuild the power repository, refusing data where a power file lost all its powers."""
+    repository = PowerRepository(*(_load_required(file_path) for file_path in POWER_FILES))
+    for power_type, file_path in zip(POWER_TYPES, POWER_FILES):
+        if not repository.get_all_by_type(power_type):
+            raise DataValidationError(f"{file_path} has no powers")
+    return repository
+
+class DataReloader:
+    """Watch the data files and swap rebuilt repositories into the services.
+
+    Repositories are rebuilt in a worker thread and replace the old ones with a
+    single attribute assignment on the event loop, so handlers see either the
+    old or the new repository, never a partially built one. When rebuilding or
+    validation fails, the old repository stays in use.
+    """
+
+    def __init__(self, spell_service: SpellService, rule_service: RuleService, power_service: PowerService,
+                 on_reload: Optional[Callable[[], None]] = None, interval: float = DATA_RELOAD_INTERVAL):
+        self.spell_service = spell_service
+        self.rule_service = rule_service
+        self.power_service = power_service
+        self.on_reload = on_reload
+        self.interval = interval
+        self._signatures = self._get_signatures()
+        self._pending: Dict[str, FileSignature] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _get_signatures() -> Dict[str, FileSignature]:
+        return {file_path: _get_signature(file_path) for file_path in DATA_FILES}
+
+    def start(self) -> None:
+        """Start watching the data files in the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._watch())
+
+    async def stop(self) -> None:
+        """Stop watching the data files."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Error while reloading data files")
+
+    async def check(self) -> None:
+        """Reload the repositories whose files changed and then stayed unchanged for one interval."""
+        signatures = self._get_signatures()
+        changed = [file_path for file_path, signature in signatures.items() if signature != self._signatures[file_path]]
+
+        # Wait for editors to finish writing before reading a changed file
+        settled = [file_path for file_path in changed if self._pending.get(file_path) == signatures[file_path]]
+        self._pending = {file_path: signatures[file_path] for file_path in changed}
+        if not settled or len(settled) != len(changed):
+            return
+
+        await self.reload(changed)
+        # Failed reloads are not retried until the files change again
+        self._signatures.update({file_path: signatures[file_path] for file_path in changed})
+        self._pending = {}
+
+    async def reload(self, changed_files: List[str]) -> None:
+        """Rebuild the repositories of the changed files and swap them in."""
+        rebuilds = []
+        if SPELLS_FILE in changed_files:
+            rebuilds.append((self.spell_service, build_spell_repository))
+        if RULES_FILE in changed_files:
+            rebuilds.append((self.rule_service, build_rule_repository))
+        if any(file_path in POWER_FILES for file_path in changed_files):
+            rebuilds.append((self.power_service, build_power_repository))
+
+        repositories = []
+        for service, build_repository in rebuilds:
+            try:
+                repositories.append((service, await asyncio.to_thread(build_repository)))
+            except Exception as e:
+                logger.error(f"Keeping the current data, reloading failed: {e}")
+
+        if not repositories:
+            return
+
+        # Swap the repositories and drop the caches without yielding to other handlers
+        for service, repository in repositories:
+            service.repository = repository
+        if self.on_reload is not None:
+            self.on_reload()
+        logger.info(f"Reloaded data from {', '.join(os.path.relpath(path) for path in changed_files)}")
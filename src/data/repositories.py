@@ -1,5 +1,32 @@
-from typing import List, Dict, Any, Optional
+import logging
+import threading
+import zlib
+from typing import List, Dict, Any, Callable, Iterable, Optional
 from ..domain.models import Spell, SpellEnhancement, Rule, Power
+from ..domain.constants import RACE_NAMES, WILDCARD_RACE
+from .text_index import TrigramIndex, SimilarityIndex, fold_text
+from .relevance import BM25Index
+
+logger = logging.getLogger(__name__)
+
+# Entity ids are a hash of the folded name of this many bits, so the buttons already sent keep
+# pointing to the same entity when a data reload adds, removes or reorders entries
+ENTITY_ID_BITS = 32
+
+def assign_ids(names: Iterable[str], first_id: int = 0) -> List[int]:
+    """Get the ids of the entities with these names, in order.
+
+    An id already taken, by a duplicate name or a hash collision, moves to the next free one.
+    """
+    ids = []
+    taken = set()
+    for name in names:
+        entity_id = zlib.crc32(fold_text(name).encode())
+        while entity_id in taken:
+            entity_id = (entity_id + 1) % (1 << ENTITY_ID_BITS)
+        taken.add(entity_id)
+        ids.append(first_id + entity_id)
+    return ids
 
 class SpellRepository:
     def __init__(self, data: Dict[str, Any]):
@@ -8,13 +35,15 @@ class SpellRepository:
         for spell in data.get('magias', []):
             if spell:
                 # Process enhancements if they exist
-                enhancements = []
+                enhancements = ()
                 if 'aprimoramentos' in spell and spell['aprimoramentos']:
-                    for enhancement in spell['aprimoramentos']:
-                        enhancements.append(SpellEnhancement(
+                    enhancements = tuple(
+                        SpellEnhancement(
                             cost=enhancement.get('custo', ''),
                             description=enhancement.get('descrição', '')
-                        ))
+                        )
+                        for enhancement in spell['aprimoramentos']
+                    )
 
                 spells_data.append({
                     'name': spell.get('nome', ''),
@@ -29,19 +58,49 @@ class SpellRepository:
                     'description': spell.get('descricao', '') or spell.get('descrição', ''),
                     'enhancements': enhancements
                 })
-        self.spells = [Spell(**spell) for spell in spells_data] if spells_data else []
+        spell_ids = assign_ids(spell['name'] for spell in spells_data)
+        self.spells = [Spell(**spell, id=spell_id) for spell_id, spell in zip(spell_ids, spells_data)]
+
+        # Build the text search and suggestion indexes
+        self._name_index = TrigramIndex()
+        self._similar_names = SimilarityIndex()
+        for spell in self.spells:
+            self._name_index.add(spell.name)
+            self._similar_names.add(spell.name)
+
+        # Build the lookup indexes (the first spell wins on duplicate names)
+        self._by_id: Dict[int, Spell] = {spell.id: spell for spell in self.spells}
+        self._by_name: Dict[str, Spell] = {}
+        self._by_type: Dict[str, List[Spell]] = {}
+        self._by_level: Dict[int, List[Spell]] = {}
+        for spell in self.spells:
+            self._by_name.setdefault(spell.name, spell)
+            self._by_type.setdefault(spell.type.lower(), []).append(spell)
+            self._by_level.setdefault(spell.level, []).append(spell)
+
+        # Build the name-sorted views used by the listing keyboards
+        self._sorted_by_type = {
+            spell_type: sorted(spells, key=lambda x: x.name) for spell_type, spells in self._by_type.items()
+        }
+        self._sorted_by_level = {
+            level: sorted(spells, key=lambda x: x.name) for level, spells in sorted(self._by_level.items())
+        }
 
     def find_by_name(self, name: str) -> List[Spell]:
-        """Find spells by name (case-insensitive partial match)."""
-        name = name.lower()
-        return [spell for spell in self.spells if name in spell.name.lower()]
+        """Find spells by name (case and accent-insensitive partial match)."""
+        return [self.spells[i] for i in self._name_index.search(name)]
+
+    def suggest_by_name(self, name: str, limit: int) -> List[Spell]:
+        """Find the spells with the names most similar to a possibly misspelled name."""
+        return [self.spells[i] for i in self._similar_names.search(name, limit)]
 
     def get_by_name(self, name: str) -> Optional[Spell]:
         """Get a spell by its exact name."""
-        for spell in self.spells:
-            if spell.name == name:
-                return spell
-        return None
+        return self._by_name.get(name)
+
+    def get_by_id(self, spell_id: int) -> Optional[Spell]:
+        """Get a spell by its id."""
+        return self._by_id.get(spell_id)
 
     def get_all(self) -> List[Spell]:
         """Get all spells."""
@@ -49,175 +108,264 @@ class SpellRepository:
 
     def get_by_type(self, spell_type: str) -> List[Spell]:
         """Get all spells of a specific type."""
-        return [spell for spell in self.spells if spell.type.lower() == spell_type.lower()]
+        return self._by_type.get(spell_type.lower(), [])
 
     def get_by_level(self, level: int) -> List[Spell]:
         """Get all spells of a specific level."""
-        return [spell for spell in self.spells if spell.level == level]
+        return self._by_level.get(level, [])
+
+    def get_by_type_sorted(self, spell_type: str) -> List[Spell]:
+        """Get all spells of a specific type sorted by name."""
+        return self._sorted_by_type.get(spell_type.lower(), [])
+
+    def get_by_level_sorted(self, level: int) -> List[Spell]:
+        """Get all spells of a specific level sorted by name."""
+        return self._sorted_by_level.get(level, [])
+
+    def get_all_by_level(self) -> Dict[int, List[Spell]]:
+        """Get all spells grouped by level, sorted by name within each level."""
+        return self._sorted_by_level
 
 class RuleRepository:
     def __init__(self, data: Dict[str, Any]):
-        self.rules = [Rule(**rule) for rule in data.get('rules', [])] if data else []
+        rules_data = data.get('rules', []) if data else []
+        rule_ids = assign_ids(rule['name'] for rule in rules_data)
+        self.rules = [Rule(**rule, id=rule_id) for rule_id, rule in zip(rule_ids, rules_data)]
+
+        # Build the text search and suggestion indexes
+        self._text_index = TrigramIndex()
+        self._similar_names = SimilarityIndex()
+        for rule in self.rules:
+            self._text_index.add(rule.name, rule.description)
+            self._similar_names.add(rule.name)
+        self._relevance = BM25Index([(rule.name, rule.description) for rule in self.rules])
 
-    def find_by_name_or_description(self, text: str) -> List[Rule]:
-        """Find rules by name or description (case-insensitive partial match)."""
-        text = text.lower()
-        return [rule for rule in self.rules if text in rule.name.lower() or text in rule.description.lower()]
+        # Build the lookup indexes and the name-sorted view
+        self._by_id: Dict[int, Rule] = {rule.id: rule for rule in self.rules}
+        self._by_name: Dict[str, Rule] = {}
+        for rule in self.rules:
+            self._by_name.setdefault(rule.name, rule)
+        self._sorted = sorted(self.rules, key=lambda x: x.name)
+
+    def find_by_name_or_description(self, text: str, limit: Optional[int] = None) -> List[Rule]:
+        """Find rules by name or description (case and accent-insensitive), most relevant first."""
+        ranked = self._relevance.rank(text, self._text_index.search(text), limit)
+        return [self.rules[i] for i in ranked]
+
+    def suggest_by_name(self, name: str, limit: int) -> List[Rule]:
+        """Find the rules with the names most similar to a possibly misspelled name."""
+        return [self.rules[i] for i in self._similar_names.search(name, limit)]
 
     def get_by_name(self, name: str) -> Optional[Rule]:
         """Get a rule by its exact name."""
-        for rule in self.rules:
-            if rule.name == name:
-                return rule
-        return None
+        return self._by_name.get(name)
+
+    def get_by_id(self, rule_id: int) -> Optional[Rule]:
+        """Get a rule by its id."""
+        return self._by_id.get(rule_id)
 
     def get_all(self) -> List[Rule]:
         """Get all rules."""
         return self.rules
 
-class PowerRepository:
-    def __init__(self, class_data: Dict[str, Any], race_data: Dict[str, Any], 
-                 origin_data: Dict[str, Any], tormenta_data: Dict[str, Any],
-                 combat_data: Dict[str, Any] = None, destiny_data: Dict[str, Any] = None,
-                 magic_data: Dict[str, Any] = None, granted_data: Dict[str, Any] = None,
-                 group_data: Dict[str, Any] = None):
-        self.powers = []
+    def get_all_sorted(self) -> List[Rule]:
+        """Get all rules sorted by name."""
+        return self._sorted
 
-        # Load class powers
-        if class_data and 'powers' in class_data:
-            for power in class_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="class",
-                    class_name=power.get('class')
-                )
-                self.powers.append(power_obj)
+# Power types in id order, matching the PowerRepository constructor arguments
+POWER_TYPES = ("class", "race", "origin", "tormenta", "combate", "destino", "magia", "concedidas", "grupo")
 
-        # Load race powers
-        if race_data and 'powers' in race_data:
-            for power in race_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="race",
-                    race=power.get('race')
-                )
-                self.powers.append(power_obj)
+# Power ids are the type position times this stride plus the id of the power within its type
+POWER_ID_STRIDE = 1 << ENTITY_ID_BITS
 
-        # Load origin powers
-        if origin_data and 'powers' in origin_data:
-            for power in origin_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="origin",
-                    origin=power.get('origin')
-                )
-                self.powers.append(power_obj)
+class PowerCategory:
+    """The powers of one type and their indexes."""
 
-        # Load tormenta powers
-        if tormenta_data and 'powers' in tormenta_data:
-            for power in tormenta_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="tormenta"
-                )
-                self.powers.append(power_obj)
+    def __init__(self, power_type: str, data: Optional[Dict[str, Any]]):
+        self.power_type = power_type
+        self.powers: List[Power] = []
+        first_id = POWER_TYPES.index(power_type) * POWER_ID_STRIDE
 
-        # Load combat powers
-        if combat_data and 'powers' in combat_data:
-            for power in combat_data['powers']:
+        if data and 'powers' in data:
+            power_ids = assign_ids((power['name'] for power in data['powers']), first_id)
+            for power, power_id in zip(data['powers'], power_ids):
                 power_obj = Power(
                     name=power['name'],
                     description=power['description'],
                     requirements=power['requirements'],
-                    power_type="combate"
+                    power_type=power_type,
+                    class_name=power.get('class') if power_type == "class" else None,
+                    race=power.get('race') if power_type == "race" else None,
+                    origin=power.get('origin') if power_type == "origin" else None,
+                    id=power_id
                 )
                 self.powers.append(power_obj)
 
-        # Load destiny powers
-        if destiny_data and 'powers' in destiny_data:
-            for power in destiny_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="destino"
-                )
-                self.powers.append(power_obj)
+        # Build the text search and suggestion indexes
+        self.text_index = TrigramIndex()
+        self.similar_names = SimilarityIndex()
+        for power in self.powers:
+            self.text_index.add(power.name, power.description)
+            self.similar_names.add(power.name)
+        self.relevance = BM25Index([(power.name, power.description) for power in self.powers])
 
-        # Load magic powers
-        if magic_data and 'powers' in magic_data:
-            for power in magic_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="magia"
-                )
-                self.powers.append(power_obj)
+        # Build the lookup indexes (the first power wins on duplicate names)
+        self.by_id: Dict[int, Power] = {power.id: power for power in self.powers}
+        self.by_name: Dict[str, Power] = {}
+        self.by_class: Dict[str, List[Power]] = {}
+        for power in self.powers:
+            self.by_name.setdefault(power.name, power)
+            if power_type == "class":
+                self.by_class.setdefault(power.class_name, []).append(power)
 
-        # Load granted powers
-        if granted_data and 'powers' in granted_data:
-            for power in granted_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="concedidas"
-                )
-                self.powers.append(power_obj)
+        # Build the name-sorted view used by the listing keyboards
+        self.sorted = sorted(self.powers, key=lambda x: x.name)
 
-        # Load group powers
-        if group_data and 'powers' in group_data:
-            for power in group_data['powers']:
-                power_obj = Power(
-                    name=power['name'],
-                    description=power['description'],
-                    requirements=power['requirements'],
-                    power_type="grupo"
-                )
-                self.powers.append(power_obj)
+        self.by_race: Dict[str, List[Power]] = {}
+        if power_type == "race":
+            self._build_race_index()
+
+    def _build_race_index(self) -> None:
+        """Map each known race to its powers, including the ones available to every race."""
+        self.by_race = {race: [] for race in RACE_NAMES}
+        unmatched = []
+        for power in self.powers:
+            if power.race.strip().lower() == WILDCARD_RACE:
+                for powers in self.by_race.values():
+                    powers.append(power)
+                continue
+
+            # A power matches a race when one of its comma-separated races starts with the race name
+            races = [r.strip() for r in power.race.split(",")]
+            matched = False
+            for race_name, powers in self.by_race.items():
+                if any(r.startswith(race_name) for r in races):
+                    powers.append(power)
+                    matched = True
+            if not matched:
+                unmatched.append(power.race)
+
+        if unmatched:
+            logger.warning(
+                f"Race powers not listed under any known race: {'; '.join(sorted(set(unmatched)))}"
+            )
+
+class PowerRepository:
+    def __init__(self, class_data: Dict[str, Any], race_data: Dict[str, Any], 
+                 origin_data: Dict[str, Any], tormenta_data: Dict[str, Any],
+                 combat_data: Dict[str, Any] = None, destiny_data: Dict[str, Any] = None,
+                 magic_data: Dict[str, Any] = None, granted_data: Dict[str, Any] = None,
+                 group_data: Dict[str, Any] = None):
+        all_data = (class_data, race_data, origin_data, tormenta_data, combat_data,
+                    destiny_data, magic_data, granted_data, group_data)
+        self._loaders: Dict[str, Callable[[], Optional[Dict[str, Any]]]] = {}
+        self._categories: Dict[str, PowerCategory] = {
+            power_type: PowerCategory(power_type, data) for power_type, data in zip(POWER_TYPES, all_data)
+        }
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    @classmethod
+    def lazy(cls, loaders: Dict[str, Callable[[], Optional[Dict[str, Any]]]]) -> "PowerRepository":
+        """Create a repository that loads and indexes each power type the first time it is used."""
+        repository = cls.__new__(cls)
+        repository._loaders = dict(loaders)
+        repository._categories = {}
+        repository._load_locks = {power_type: threading.Lock() for power_type in loaders}
+        return repository
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Pending loaders and locks only make sense in the process that created them
+        self.warm_up()
+        return {"_categories": self._categories}
 
-    def find_by_type_and_text(self, power_type: str, text: str) -> List[Power]:
-        """Find powers by type and name/description (case-insensitive partial match)."""
-        text = text.lower()
-        return [
-            power for power in self.powers 
-            if power.power_type == power_type and 
-            (text in power.name.lower() or text in power.description.lower())
-        ]
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self._categories = state["_categories"]
+        self._loaders = {}
+        self._load_locks = {}
+
+    def _get_category(self, power_type: str) -> Optional[PowerCategory]:
+        """Get the powers of a type, loading them on first use in lazy mode."""
+        category = self._categories.get(power_type)
+        if category is not None or power_type not in self._loaders:
+            return category
+
+        with self._load_locks[power_type]:
+            # Another thread may have finished loading while we waited for the lock
+            category = self._categories.get(power_type)
+            if category is None:
+                category = PowerCategory(power_type, self._loaders[power_type]())
+                self._categories[power_type] = category
+        return category
+
+    def warm_up(self) -> None:
+        """Load every power type that was not loaded yet."""
+        for power_type in self._loaders:
+            self._get_category(power_type)
+
+    @property
+    def powers(self) -> List[Power]:
+        """All powers of every type (loads every type in lazy mode)."""
+        self.warm_up()
+        return [power for power_type in POWER_TYPES if power_type in self._categories
+                for power in self._categories[power_type].powers]
+
+    def find_by_type_and_text(self, power_type: str, text: str, limit: Optional[int] = None) -> List[Power]:
+        """Find powers by type and name/description (case and accent-insensitive), most relevant first."""
+        category = self._get_category(power_type)
+        if category is None:
+            return []
+        ranked = category.relevance.rank(text, category.text_index.search(text), limit)
+        return [category.powers[i] for i in ranked]
+
+    def suggest_by_type_and_name(self, power_type: str, name: str, limit: int) -> List[Power]:
+        """Find the powers of a type with the names most similar to a possibly misspelled name."""
+        category = self._get_category(power_type)
+        if category is None:
+            return []
+        return [category.powers[i] for i in category.similar_names.search(name, limit)]
 
     def get_by_type_and_name(self, power_type: str, name: str) -> Optional[Power]:
         """Get a power by its type and exact name."""
-        for power in self.powers:
-            if power.power_type == power_type and power.name == name:
-                return power
-        return None
+        category = self._get_category(power_type)
+        return category.by_name.get(name) if category else None
+
+    def get_by_id(self, power_id: int) -> Optional[Power]:
+        """Get a power by its id."""
+        type_position = power_id // POWER_ID_STRIDE
+        if not 0 <= type_position < len(POWER_TYPES):
+            return None
+        category = self._get_category(POWER_TYPES[type_position])
+        return category.by_id.get(power_id) if category else None
 
     def get_all_by_type(self, power_type: str) -> List[Power]:
         """Get all powers of a specific type."""
-        return [power for power in self.powers if power.power_type == power_type]
+        category = self._get_category(power_type)
+        return category.powers if category else []
+
+    def get_all_by_type_sorted(self, power_type: str) -> List[Power]:
+        """Get all powers of a specific type sorted by name."""
+        category = self._get_category(power_type)
+        return category.sorted if category else []
 
     def get_powers_by_class(self, class_name: str) -> List[Power]:
         """Get all powers for a specific class."""
-        return [power for power in self.powers if power.power_type == "class" and power.class_name == class_name]
+        category = self._get_category("class")
+        return category.by_class.get(class_name, []) if category else []
 
     def get_powers_by_race(self, race_name: str) -> List[Power]:
         """Get all powers for a specific race (including 'Vários' as wildcard)."""
-        result = []
-        for power in self.powers:
-            if power.power_type != "race":
-                continue
+        category = self._get_category("race")
+        if category is None:
+            return []
+        powers = category.by_race.get(race_name)
+        if powers is not None:
+            return powers
 
+        # Races outside the menu are not indexed, fall back to a scan
+        result = []
+        for power in category.powers:
             # Caso especial para "Vários"
-            if power.race.strip().lower() == "várias":
+            if power.race.strip().lower() == WILDCARD_RACE:
                 result.append(power)
                 continue
 
@@ -226,4 +374,4 @@ class PowerRepository:
                    for r in power.race.split(",")):
                 result.append(power)
 
-        return result
\ No newline at end of file
+        return result
@@ -0,0 +1,115 @@
+"""Compiled binary snapshot of the repositories.
+
+The snapshot holds the fully built repositories, including their indexes, so
+startup skips JSON parsing, field remapping and index construction. It also
+records the size, modification time and hash of every source file, and is
+ignored when any of them changed since it was built.
+
+Build it with ``python -m src.data.snapshot``.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from typing import Dict, Optional, Tuple
+
+from config.settings import DATA_DIR, SNAPSHOT_FILE
+from .data_loader import DATA_FILES, build_repositories
+from .repositories import SpellRepository, RuleRepository, PowerRepository
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"T20SNAP\n"
+
+# Bump whenever the repositories or models change shape
+SNAPSHOT_VERSION = 6
+
+Repositories = Tuple[SpellRepository, RuleRepository, PowerRepository]
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def _get_sources() -> Dict[str, Dict[str, object]]:
+    """Describe the current state of every source data file."""
+    sources = {}
+    for path in DATA_FILES:
+        stat = os.stat(path)
+        sources[os.path.relpath(path, DATA_DIR)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": _hash_file(path),
+        }
+    return sources
+
+def _is_fresh(sources: Dict[str, Dict[str, object]]) -> bool:
+    """Check that the recorded sources still match the data files."""
+    if set(sources) != {os.path.relpath(path, DATA_DIR) for path in DATA_FILES}:
+        return False
+    for relative_path, recorded in sources.items():
+        path = os.path.join(DATA_DIR, relative_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != recorded["size"]:
+            return False
+        # A touched file with the same content (e.g. after a checkout) is still fresh
+        if stat.st_mtime_ns != recorded["mtime_ns"] and _hash_file(path) != recorded["sha256"]:
+            return False
+    return True
+
+def build_snapshot(path: str = SNAPSHOT_FILE) -> Repositories:
+    """Build the repositories from JSON and write them to a snapshot file."""
+    sources = _get_sources()
+    repositories = build_repositories()
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(SNAPSHOT_VERSION.to_bytes(4, "big"))
+        # The sources come first so a stale snapshot is rejected before unpickling the data
+        pickle.dump(sources, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(repositories, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+    return repositories
+
+def load_snapshot(path: str = SNAPSHOT_FILE) -> Optional[Repositories]:
+    """Load the repositories from a snapshot file, or None if it is missing, outdated or stale."""
+    try:
+        with open(path, "rb") as file:
+            if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                logger.warning(f"Ignoring {path}: not a data snapshot")
+                return None
+            version = int.from_bytes(file.read(4), "big")
+            if version != SNAPSHOT_VERSION:
+                logger.info(f"Ignoring {path}: snapshot version {version}, expected {SNAPSHOT_VERSION}")
+                return None
+            if not _is_fresh(pickle.load(file)):
+                logger.info(f"Ignoring {path}: data files changed since the snapshot was built")
+                return None
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        logger.warning(f"Ignoring {path}: {e}")
+        return None
+
+def load_repositories(lazy_powers: bool = False) -> Repositories:
+    """Load the repositories from the snapshot, falling back to the JSON files.
+
+    lazy_powers only applies to the JSON fallback, a snapshot is always fully loaded.
+    """
+    repositories = load_snapshot()
+    if repositories is not None:
+        logger.info("Loaded data from snapshot")
+        return repositories
+    logger.info("Loading data from JSON files (run 'python -m src.data.snapshot' to build a snapshot)")
+    return build_repositories(lazy_powers)
+
+if __name__ == "__main__":
+    from src.utils.logging_config import setup_logging
+
+    setup_logging()
+    build_snapshot()
+    logger.info(f"Snapshot written to {SNAPSHOT_FILE}")
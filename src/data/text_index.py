@@ -0,0 +1,102 @@
+import heapq
+import unicodedata
+from typing import Dict, List, Set
+
+# Separates the fields of a document so a query never matches across them
+FIELD_SEPARATOR = "\x00"
+
+def fold_text(text: str) -> str:
+    """Lowercase text and strip accents, so "Ação" and "acao" compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def trigrams(text: str) -> Set[str]:
+    """Get the distinct character trigrams of an already folded text."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def padded_trigrams(text: str) -> Set[str]:
+    """Get the trigrams of an already folded text padded with spaces, so word edges count too."""
+    return trigrams(f"  {text} ")
+
+class TrigramIndex:
+    """Inverted index of character trigrams over accent-folded text.
+
+    Documents are identified by their insertion position, so search results
+    come back in the same order the documents were added.
+    """
+
+    def __init__(self):
+        self._texts: List[str] = []
+        self._postings: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def add(self, *fields: str) -> int:
+        """Index a document made of one or more text fields and return its id."""
+        doc_id = len(self._texts)
+        text = FIELD_SEPARATOR.join(fold_text(field or "") for field in fields)
+        self._texts.append(text)
+        for trigram in trigrams(text):
+            self._postings.setdefault(trigram, set()).add(doc_id)
+        return doc_id
+
+    def search(self, query: str) -> List[int]:
+        """Get the ids of documents containing the query in any field."""
+        query = fold_text(query)
+        if len(query) < 3:
+            # Too short to have trigrams, check every document
+            return [doc_id for doc_id, text in enumerate(self._texts) if query in text]
+
+        postings = []
+        for trigram in trigrams(query):
+            posting = self._postings.get(trigram)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return [doc_id for doc_id in sorted(candidates) if query in self._texts[doc_id]]
+
+class SimilarityIndex:
+    """Inverted index of padded trigrams for typo-tolerant lookups of short texts such as names.
+
+    Documents are ranked by the Dice coefficient of their trigram sets with the
+    query's, counted through the postings of the query trigrams, so only
+    documents sharing at least one trigram with the query are scored.
+    """
+
+    def __init__(self):
+        self._sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def add(self, text: str) -> int:
+        """Index a text and return its id."""
+        doc_id = len(self._sizes)
+        grams = padded_trigrams(fold_text(text or ""))
+        self._sizes.append(len(grams))
+        for trigram in grams:
+            self._postings.setdefault(trigram, []).append(doc_id)
+        return doc_id
+
+    def search(self, query: str, limit: int = 5, min_similarity: float = 0.3) -> List[int]:
+        """Get the ids of the documents most similar to the query, best first."""
+        grams = padded_trigrams(fold_text(query).strip())
+        shared: Dict[int, int] = {}
+        for trigram in grams:
+            for doc_id in self._postings.get(trigram, ()):
+                shared[doc_id] = shared.get(doc_id, 0) + 1
+
+        query_size = len(grams)
+        sizes = self._sizes
+        scored = []
+        for doc_id, count in shared.items():
+            similarity = 2 * count / (query_size + sizes[doc_id])
+            if similarity >= min_similarity:
+                # Ties go to the document added first
+                scored.append((similarity, -doc_id))
+        return [-negated_id for _, negated_id in heapq.nlargest(limit, scored)]
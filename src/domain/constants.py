@@ -0,0 +1,28 @@
+# Races and classes offered in the powers menus
+RACE_NAMES = [
+    "Humano", "Anão", "Dahllan", "Elfo", "Goblin", "Lefou",
+    "Minotauro", "Qareen", "Golem", "Hynne", "Kliren", "Medusa",
+    "Osteon", "Sereia", "Sílfide", "Suraggel", "Trog"
+]
+
+CLASS_NAMES = [
+    "Arcanista", "Bárbaro", "Bardo", "Bucaneiro", "Caçador",
+    "Cavaleiro", "Clérigo", "Druida", "Guerreiro", "Inventor",
+    "Ladino", "Lutador", "Nobre", "Paladino"
+]
+
+# Race field value of the race powers available to every race
+WILDCARD_RACE = "várias"
+
+# Display names of the power types
+POWER_TYPE_NAMES = {
+    "class": "classe",
+    "race": "raça",
+    "origin": "origem",
+    "tormenta": "tormenta",
+    "combate": "combate",
+    "destino": "destino",
+    "magia": "magia",
+    "concedidas": "concedidas",
+    "grupo": "grupo"
+}
@@ -1,12 +1,26 @@
+import sys
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import Optional, Tuple
 
-@dataclass
+# Models are immutable and slotted, and their fields with few distinct values are interned,
+# so the many entities loaded in each worker share one copy of every school, range, type...
+
+def _intern_fields(model: object, fields: Tuple[str, ...]) -> None:
+    for field in fields:
+        value = getattr(model, field)
+        if value is not None:
+            # Frozen dataclasses only allow setting fields through object.__setattr__
+            object.__setattr__(model, field, sys.intern(value))
+
+@dataclass(frozen=True, slots=True)
 class SpellEnhancement:
     cost: str
     description: str
 
-@dataclass
+    def __post_init__(self) -> None:
+        _intern_fields(self, ("cost",))
+
+@dataclass(frozen=True, slots=True)
 class Spell:
     name: str
     level: int
@@ -18,15 +32,23 @@ class Spell:
     resistance: str
     description: str
     type: str = ""  # Arcana, Divina, Universal
-    enhancements: List[SpellEnhancement] = None
+    enhancements: Tuple[SpellEnhancement, ...] = ()
+    id: int = 0  # CRC32 of the folded name, or the next free id on a collision; used in callback data
 
-@dataclass
+    def __post_init__(self) -> None:
+        _intern_fields(self, ("school", "casting_time", "range", "target", "duration", "resistance", "type"))
+
+@dataclass(frozen=True, slots=True)
 class Rule:
     name: str
     category: str
     description: str
+    id: int = 0  # CRC32 of the folded name, or the next free id on a collision; used in callback data
+
+    def __post_init__(self) -> None:
+        _intern_fields(self, ("category",))
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Power:
     name: str
     description: str
@@ -35,3 +57,7 @@ class Power:
     class_name: Optional[str] = None  # For class powers
     race: Optional[str] = None  # For race powers
     origin: Optional[str] = None  # For origin powers
+    id: int = 0  # Type offset plus the CRC32 of the folded name, or the next free one; used in callback data
+
+    def __post_init__(self) -> None:
+        _intern_fields(self, ("requirements", "power_type", "class_name", "race", "origin"))
@@ -1,4 +1,5 @@
-from typing import List, Optional
+from typing import List, Dict, Optional
+from config.settings import SEARCH_RESULT_LIMIT, SUGGESTION_LIMIT
 from ..data.repositories import SpellRepository, RuleRepository, PowerRepository
 from .models import Spell, Rule, Power
 
@@ -10,10 +11,18 @@ class SpellService:
         """Search for spells by name."""
         return self.repository.find_by_name(query)
 
+    def suggest_spells(self, query: str, limit: int = SUGGESTION_LIMIT) -> List[Spell]:
+        """Suggest spells with names similar to a query that found nothing."""
+        return self.repository.suggest_by_name(query, limit)
+
     def get_spell_details(self, name: str) -> Optional[Spell]:
         """Get details for a specific spell."""
         return self.repository.get_by_name(name)
 
+    def get_spell_by_id(self, spell_id: int) -> Optional[Spell]:
+        """Get a spell by its id."""
+        return self.repository.get_by_id(spell_id)
+
     def get_all_spells(self) -> List[Spell]:
         """Get all spells."""
         return self.repository.get_all()
@@ -26,38 +35,74 @@ class SpellService:
         """Get all spells of a specific level."""
         return self.repository.get_by_level(level)
 
+    def get_sorted_spells_by_type(self, spell_type: str) -> List[Spell]:
+        """Get all spells of a specific type sorted by name."""
+        return self.repository.get_by_type_sorted(spell_type)
+
+    def get_sorted_spells_by_level(self, level: int) -> List[Spell]:
+        """Get all spells of a specific level sorted by name."""
+        return self.repository.get_by_level_sorted(level)
+
+    def get_spells_grouped_by_level(self) -> Dict[int, List[Spell]]:
+        """Get all spells grouped by level, sorted by name within each level."""
+        return self.repository.get_all_by_level()
+
 class RuleService:
     def __init__(self, repository: RuleRepository):
         self.repository = repository
 
-    def search_rules(self, query: str) -> List[Rule]:
-        """Search for rules by name or description."""
-        return self.repository.find_by_name_or_description(query)
+    def search_rules(self, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Rule]:
+        """Search for rules by name or description, most relevant first."""
+        return self.repository.find_by_name_or_description(query, limit)
+
+    def suggest_rules(self, query: str, limit: int = SUGGESTION_LIMIT) -> List[Rule]:
+        """Suggest rules with names similar to a query that found nothing."""
+        return self.repository.suggest_by_name(query, limit)
 
     def get_rule_details(self, name: str) -> Optional[Rule]:
         """Get details for a specific rule."""
         return self.repository.get_by_name(name)
 
+    def get_rule_by_id(self, rule_id: int) -> Optional[Rule]:
+        """Get a rule by its id."""
+        return self.repository.get_by_id(rule_id)
+
     def get_all_rules(self) -> List[Rule]:
         """Get all rules."""
         return self.repository.get_all()
 
+    def get_sorted_rules(self) -> List[Rule]:
+        """Get all rules sorted by name."""
+        return self.repository.get_all_sorted()
+
 class PowerService:
     def __init__(self, repository: PowerRepository):
         self.repository = repository
 
-    def search_powers(self, power_type: str, query: str) -> List[Power]:
-        """Search for powers by type and name/description."""
-        return self.repository.find_by_type_and_text(power_type, query)
+    def search_powers(self, power_type: str, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Power]:
+        """Search for powers by type and name/description, most relevant first."""
+        return self.repository.find_by_type_and_text(power_type, query, limit)
+
+    def suggest_powers(self, power_type: str, query: str, limit: int = SUGGESTION_LIMIT) -> List[Power]:
+        """Suggest powers of a type with names similar to a query that found nothing."""
+        return self.repository.suggest_by_type_and_name(power_type, query, limit)
 
     def get_power_details(self, power_type: str, name: str) -> Optional[Power]:
         """Get details for a specific power."""
         return self.repository.get_by_type_and_name(power_type, name)
 
+    def get_power_by_id(self, power_id: int) -> Optional[Power]:
+        """Get a power by its id."""
+        return self.repository.get_by_id(power_id)
+
     def get_all_powers_by_type(self, power_type: str) -> List[Power]:
         """Get all powers of a specific type."""
         return self.repository.get_all_by_type(power_type)
 
+    def get_sorted_powers_by_type(self, power_type: str) -> List[Power]:
+        """Get all powers of a specific type sorted by name."""
+        return self.repository.get_all_by_type_sorted(power_type)
+
     def get_powers_by_class(self, class_name: str) -> List[Power]:
         """Get all powers for a specific class."""
         return self.repository.get_powers_by_class(class_name)
@@ -0,0 +1,221 @@
+"""In-process counters and histograms exposed in the Prometheus text format.
+
+A small stand-in for prometheus_client, so the bot keeps a single dependency.
+Updating a metric is a dict lookup and an addition, cheap enough to do on
+every update; the text is only rendered when the endpoint is scraped.
+"""
+import asyncio
+import bisect
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a cached keyboard to a slow Bot API call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        """Increase the value of a label combination."""
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def get(self, *labelvalues: str) -> float:
+        """Get the value of a label combination."""
+        return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Gauge:
+    """A value that goes up and down per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        """Increase the value of a label combination."""
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues: str, amount: float = 1.0) -> None:
+        """Decrease the value of a label combination."""
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) - amount
+
+    def get(self, *labelvalues: str) -> float:
+        """Get the value of a label combination."""
+        return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Bucketed observations, their sum and count per label combination."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: non-cumulative bucket counts (the last one is +Inf), then the sum
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        """Record an observation for a label combination."""
+        counts = self._values.get(labelvalues)
+        if counts is None:
+            counts = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def get_count(self, *labelvalues: str) -> int:
+        """Get the number of observations of a label combination."""
+        counts = self._values.get(labelvalues)
+        return sum(counts[:-1]) if counts else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, counts in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """The metrics to expose, in registration order."""
+
+    def __init__(self):
+        self._metrics: List[object] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        counter = Counter(name, documentation, labelnames)
+        self._metrics.append(counter)
+        return counter
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        gauge = Gauge(name, documentation, labelnames)
+        self._metrics.append(gauge)
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(histogram)
+        return histogram
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_UPDATES = REGISTRY.counter(
+    "bot_handler_updates_total", "Updates handled, by handler, route, entity type and outcome.",
+    ("handler", "route", "entity", "outcome"),
+)
+HANDLER_DURATION = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Time spent handling an update, including its Bot API calls.",
+    ("handler", "route", "entity", "outcome"),
+)
+BOT_API_REQUESTS = REGISTRY.counter(
+    "bot_api_requests_total", "Bot API requests, by method and outcome.", ("method", "outcome"),
+)
+BOT_API_DURATION = REGISTRY.histogram(
+    "bot_api_request_duration_seconds", "Bot API request latency, by method.", ("method",),
+)
+SEND_QUEUE_DEPTH = REGISTRY.gauge(
+    "bot_send_queue_depth", "Bot API requests waiting for the rate limiter, by priority.", ("priority",),
+)
+SEND_WAIT = REGISTRY.histogram(
+    "bot_send_wait_seconds", "Time Bot API requests waited for the rate limiter, by priority.", ("priority",),
+)
+SEND_RETRY_AFTER = REGISTRY.counter(
+    "bot_send_retry_after_total", "Flood control errors returned by Telegram, by method.", ("method",),
+)
+SEND_COALESCED_EDITS = REGISTRY.counter(
+    "bot_send_coalesced_edits_total", "Message edits dropped because a newer edit of the message replaced them.",
+)
+UPDATES_RUNNING = REGISTRY.gauge(
+    "bot_updates_running", "Updates being handled concurrently.",
+)
+UPDATE_WAIT = REGISTRY.histogram(
+    "bot_update_wait_seconds", "Time updates waited for an earlier update of their user or chat and for a free slot.",
+)
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics with the registry contents."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str, port: int) -> None:
+        """Start serving in the running event loop."""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            # Skip the headers, the request never has a body
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.registry.render()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", "Not Found\n"
+            content = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(content)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + content
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
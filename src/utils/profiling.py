@@ -0,0 +1,210 @@
+"""Opt-in sampling profiler for live updates.
+
+When enabled, a random fraction of the updates is profiled with cProfile, and
+with tracemalloc when memory profiling is on. Only one update is profiled at a
+time and at most max_samples per dump interval, so the overhead stays bounded
+whatever the traffic. cProfile follows the whole thread, so other updates
+running while the sampled one awaits the Bot API show up in its profile too.
+
+Profiles are aggregated per tag (the handler and route of the update) and
+written to disk every dump interval, overwriting the previous dump: a pstats
+file per tag, flamegraph-ready collapsed stacks of every tag in
+profile.collapsed and the allocation peaks and top allocation sites in
+memory.txt.
+"""
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import tracemalloc
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.settings import PROFILE_DIR, PROFILE_MAX_SAMPLES, PROFILE_DUMP_INTERVAL, PROFILE_MEMORY
+
+logger = logging.getLogger(__name__)
+
+# Paths of the collapsed stacks stop at this depth, and are dropped below this many seconds
+MAX_STACK_DEPTH = 64
+MIN_STACK_SECONDS = 1e-6
+
+# Allocation sites kept per sampled update
+TOP_ALLOCATIONS = 10
+
+# A pstats function key: (file name, line number, function name)
+Function = Tuple[str, int, str]
+
+def _frame_name(function: Function) -> str:
+    filename, lineno, name = function
+    if filename == "~":
+        # Built-in function, e.g. "<method 'join' of 'str' objects>"
+        return name.replace(";", ":")
+    return f"{os.path.basename(filename)}:{name}:{lineno}".replace(";", ":")
+
+def collapse_stacks(stats: pstats.Stats, root: str) -> Dict[str, float]:
+    """Rebuild approximate call stacks from a profile, with their own time in seconds.
+
+    cProfile only records caller-callee pairs, so the time of a function is
+    split among its call paths in proportion to the time of each caller.
+    """
+    entries = stats.stats
+    children: Dict[Function, List[Tuple[Function, float]]] = {}
+    roots = []
+    for function, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            roots.append(function)
+        for caller, (_, _, _, caller_time) in callers.items():
+            children.setdefault(caller, []).append((function, caller_time))
+
+    stacks: Dict[str, float] = {}
+
+    def walk(function: Function, seconds: float, path: List[str], on_path: Set[Function]) -> None:
+        _, _, own_time, total_time, _ = entries[function]
+        share = seconds / total_time if total_time else 0.0
+        path.append(_frame_name(function))
+        on_path.add(function)
+        if own_time * share >= MIN_STACK_SECONDS:
+            stack = ";".join(path)
+            stacks[stack] = stacks.get(stack, 0.0) + own_time * share
+        if len(path) < MAX_STACK_DEPTH:
+            for child, child_time in children.get(function, ()):
+                if child not in on_path and child_time * share >= MIN_STACK_SECONDS:
+                    walk(child, child_time * share, path, on_path)
+        path.pop()
+        on_path.discard(function)
+
+    for function in roots:
+        walk(function, entries[function][3], [root], set())
+    return stacks
+
+class UpdateProfiler:
+    """Profile a sampled fraction of the updates and dump the aggregated profiles on a schedule."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_samples: int = PROFILE_MAX_SAMPLES,
+                 dump_interval: float = PROFILE_DUMP_INTERVAL, memory: bool = PROFILE_MEMORY):
+        self.directory = directory
+        self.max_samples = max_samples
+        self.dump_interval = dump_interval
+        self.memory = memory
+        self.rate = 0.0
+        self._active = False
+        self._started_tracing = False
+        self._samples = 0
+        self._stats: Dict[str, pstats.Stats] = {}
+        # Per tag: sampled updates, sum and maximum of their allocation peaks in bytes
+        self._peaks: Dict[str, List[int]] = {}
+        # Bytes allocated per allocation site among the top sites of every sampled update
+        self._allocations: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def enable(self, rate: float) -> None:
+        """Start profiling a fraction of the updates, dumping on a schedule when an event loop runs."""
+        if not 0 < rate <= 1:
+            raise ValueError(f"Sample rate must be in (0, 1], got {rate}")
+        self.rate = rate
+        if self._task is None:
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._dump_periodically())
+            except RuntimeError:
+                pass
+        logger.info(f"Profiling {rate:.1%} of the updates, dumping to {self.directory}")
+
+    async def disable(self) -> None:
+        """Stop profiling and dump what was collected."""
+        self.rate = 0.0
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._stats:
+            self.dump()
+
+    def begin(self) -> Optional[cProfile.Profile]:
+        """Start profiling an update if it is sampled, returning the profile to pass to end."""
+        if not self.rate or self._active or self._samples >= self.max_samples or random.random() >= self.rate:
+            return None
+        self._active = True
+        self._samples += 1
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile: cProfile.Profile, tag: str) -> None:
+        """Stop profiling an update and add its profile to the ones of its tag."""
+        profile.disable()
+        self._active = False
+        if self._started_tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self._started_tracing = False
+            self._record_memory(tag, peak, snapshot)
+
+        stats = self._stats.get(tag)
+        if stats is None:
+            self._stats[tag] = pstats.Stats(profile)
+        else:
+            stats.add(profile)
+
+    def _record_memory(self, tag: str, peak: int, snapshot: tracemalloc.Snapshot) -> None:
+        peaks = self._peaks.setdefault(tag, [0, 0, 0])
+        peaks[0] += 1
+        peaks[1] += peak
+        peaks[2] = max(peaks[2], peak)
+        for statistic in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            frame = statistic.traceback[0]
+            site = f"{frame.filename}:{frame.lineno}"
+            self._allocations[site] = self._allocations.get(site, 0) + statistic.size
+
+    def get_status(self) -> Dict[str, object]:
+        """Get the sample rate, the updates profiled in this interval and the profiled tags."""
+        return {"rate": self.rate, "samples": self._samples, "tags": sorted(self._stats)}
+
+    def dump(self) -> None:
+        """Write the aggregated profiles to the profile directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        stacks: Dict[str, float] = {}
+        for tag, stats in self._stats.items():
+            stats.dump_stats(os.path.join(self.directory, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', tag)}.pstats"))
+            stacks.update(collapse_stacks(stats, tag))
+
+        # Collapsed stacks with integer microseconds, the input of flamegraph.pl and speedscope
+        with open(os.path.join(self.directory, "profile.collapsed"), "w", encoding="utf-8") as file:
+            for stack, seconds in sorted(stacks.items()):
+                if seconds >= 1e-6:
+                    file.write(f"{stack} {round(seconds * 1e6)}\n")
+
+        if self._peaks:
+            with open(os.path.join(self.directory, "memory.txt"), "w", encoding="utf-8") as file:
+                file.write("Allocation peak per update (samples, mean bytes, max bytes):\n")
+                for tag, (samples, total, largest) in sorted(self._peaks.items()):
+                    file.write(f"{tag}\t{samples}\t{total // samples}\t{largest}\n")
+                file.write("\nTop allocation sites (bytes summed over the samples):\n")
+                for site, size in sorted(self._allocations.items(), key=lambda item: -item[1])[:50]:
+                    file.write(f"{site}\t{size}\n")
+        logger.info(f"Dumped the profiles of {len(self._stats)} tags to {self.directory}")
+
+    async def _dump_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.dump_interval)
+            if self._stats:
+                try:
+                    self.dump()
+                except OSError as e:
+                    logger.error(f"Error dumping profiles: {e}")
+            # A new sample budget for the next interval
+            self._samples = 0
+
+PROFILER = UpdateProfiler()